@@ -2,3 +2,7 @@ pip install streamlit
 pip install plotly
 pip install folium
 pip install streamlit_folium
+pip install orjson
+pip install soundfile
+# Optionnel : lecture des fichiers MATLAB v7.3
+pip install h5py
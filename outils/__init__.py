@@ -0,0 +1 @@
+# Outils de traitement du signal partagés par les pages de l'application.
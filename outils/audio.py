@@ -0,0 +1,250 @@
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import soundfile as sf
+import streamlit as st
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.signal import get_window
+
+from outils.fourier import frequency_axis, real_fft
+
+
+# Clé de contenu d'un fichier audio : deux envois identiques partagent les mêmes résultats
+def audio_key(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+# Décodage en signal mono float32
+def decode_audio(data):
+    y, samplerate = sf.read(io.BytesIO(data), dtype="float32")
+    if y.ndim > 1:
+        y = y[:, 0].copy()
+    return y, samplerate
+
+
+# Durée (s) d'un fichier audio, lue dans l'en-tête sans décoder le signal
+def audio_duration(data):
+    return sf.info(io.BytesIO(data)).duration
+
+
+def _nbytes(value):
+    items = value if isinstance(value, tuple) else (value,)
+    return sum(np.asarray(item).nbytes for item in items)
+
+
+# Cache LRU (clé audio, artefact) -> valeur, borné en mémoire et
+# éventuellement persisté sur disque (un fichier .npz par artefact)
+class AudioCache:
+    def __init__(self, max_bytes=256 * 1024 * 1024, directory=None):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, key, name):
+        return os.path.join(self.directory, key, f"{name}.npz")
+
+    def _load(self, key, name):
+        if self.directory is None:
+            return None
+        path = self._path(key, name)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as archive:
+            # Fichier d'un ancien format (octets tronqués à leurs zéros finaux) : recalculé
+            if "is_bytes" not in archive.files:
+                return None
+            is_bytes = archive["is_bytes"]
+            items = [archive[f"a{i}"] for i in range(len(is_bytes))]
+            items = [item.tobytes() if flag else item.item() if item.ndim == 0 else item
+                     for item, flag in zip(items, is_bytes)]
+            return tuple(items) if archive["is_tuple"] else items[0]
+
+    def _save(self, key, name, value):
+        if self.directory is None:
+            return
+        items = value if isinstance(value, tuple) else (value,)
+        os.makedirs(os.path.join(self.directory, key), exist_ok=True)
+        # Octets (fichier WAV...) rangés en uint8 : un tableau 0-d de type S perdrait
+        # les octets nuls de fin, donc la fin silencieuse d'un WAV
+        is_bytes = [isinstance(item, bytes) for item in items]
+        arrays = {f"a{i}": np.frombuffer(item, dtype=np.uint8) if flag else np.asarray(item)
+                  for i, (item, flag) in enumerate(zip(items, is_bytes))}
+        tmp = self._path(key, name) + ".tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, is_tuple=isinstance(value, tuple), is_bytes=np.array(is_bytes, dtype=bool), **arrays)
+        os.replace(tmp, self._path(key, name))
+
+    def get(self, key, name):
+        with self._lock:
+            value = self._entries.get((key, name))
+            if value is not None:
+                self._entries.move_to_end((key, name))
+                return value
+        value = self._load(key, name)
+        if value is not None:
+            self._store(key, name, value)
+        return value
+
+    def _store(self, key, name, value):
+        size = _nbytes(value)
+        if size > self.max_bytes:
+            return
+        # Les tableaux sont partagés entre sessions : lecture seule
+        for item in value if isinstance(value, tuple) else (value,):
+            if isinstance(item, np.ndarray):
+                item.flags.writeable = False
+        with self._lock:
+            if (key, name) in self._entries:
+                self.size -= _nbytes(self._entries.pop((key, name)))
+            self._entries[(key, name)] = value
+            self.size += size
+            # Éviction des artefacts les moins récemment utilisés
+            while self.size > self.max_bytes:
+                _, old = self._entries.popitem(last=False)
+                self.size -= _nbytes(old)
+
+    def get_or_compute(self, key, name, compute):
+        value = self.get(key, name)
+        if value is None:
+            value = compute()
+            self._store(key, name, value)
+            self._save(key, name, value)
+        return value
+
+
+# Cache partagé entre toutes les sessions ; AUDIO_CACHE_DIR active la persistance sur disque
+@st.cache_resource
+def get_audio_cache():
+    return AudioCache(directory=os.environ.get("AUDIO_CACHE_DIR"))
+
+
+# Signal décodé d'un fichier audio : (clé, y, fréquence d'échantillonnage)
+def load_audio(data):
+    key = audio_key(data)
+    y, samplerate = get_audio_cache().get_or_compute(key, "signal", lambda: decode_audio(data))
+    return key, y, samplerate
+
+
+# Version des artefacts persistés, ajoutée à leur nom : à incrémenter quand un calcul
+# (pitch_track, note_activity, compute_spectrogram_db, estimate_peaks...) change, pour que
+# les résultats déjà sur disque ne soient plus servis. Les paramètres d'un calcul font
+# partie du nom donné par l'appelant.
+ARTIFACT_VERSION = 3
+
+
+# Artefact dérivé (spectre, fréquence dominante, spectrogramme...) d'un audio déjà chargé
+def audio_artifact(key, name, compute):
+    return get_audio_cache().get_or_compute(key, f"{name}_v{ARTIFACT_VERSION}", compute)
+
+
+# Conversion en WAV PCM 16 bits (comme st.audio, normalisé par défaut sur le maximum)
+def _pcm16_wav(y, samplerate, normalize):
+    y = np.asarray(y, dtype=np.float64)
+    peak = np.max(np.abs(y)) if len(y) else 0.0
+    if normalize and peak > 0:
+        y = y / peak
+    buf = io.BytesIO()
+    sf.write(buf, np.clip(y, -1.0, 1.0), int(samplerate), format="WAV", subtype="PCM_16")
+    return buf.getvalue()
+
+
+# WAV 16 bits encodé une seule fois par signal : à contenu identique, les mêmes
+# octets sont renvoyés et st.audio réutilise la même URL de média (servie avec
+# prise en charge des requêtes Range), sans ré-encodage ni ré-envoi
+def encode_wav(y, samplerate, normalize=True):
+    y = np.ascontiguousarray(y)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{y.dtype.str}{y.shape}{samplerate}{normalize}".encode())
+    h.update(y.data)
+    return get_audio_cache().get_or_compute(h.hexdigest(), "wav", lambda: _pcm16_wav(y, samplerate, normalize))
+
+
+# Spectre d'amplitude (rfft complétée jusqu'à une longueur rapide) : (fréquences, amplitudes)
+def magnitude_spectrum(y, samplerate):
+    f, spectrum = real_fft(y, 1 / samplerate)
+    return f, np.abs(spectrum)
+
+
+
+# Analyse en flux d'un long enregistrement, bloc par bloc (soundfile.blocks),
+# en mémoire constante : aperçu min/max de la forme d'onde, spectre moyen
+# (méthode de Welch) et spectrogramme moyenné sur n_cols colonnes.
+# Renvoie (t_apercu, y_min, y_max, f, dsp, t_spectro, spectro_db).
+def stream_analysis(data, nperseg=2048, noverlap=1024, f_max=3000, n_points=2000, n_cols=800,
+                    block_seconds=10, on_progress=None):
+    info = sf.info(io.BytesIO(data))
+    samplerate, total = info.samplerate, info.frames
+    step = nperseg - noverlap
+    window = get_window("hann", nperseg)
+    scale = 1.0 / (samplerate * np.sum(window ** 2))
+
+    f = frequency_axis(nperseg, 1 / samplerate)
+    n_spec = int(np.searchsorted(f, f_max, side="right"))
+
+    # Aperçu : min/max par paquet de `bucket` échantillons ; les blocs lus
+    # contiennent un nombre entier de paquets
+    bucket = max(1, -(-total // n_points))
+    blocksize = max(1, int(block_seconds * samplerate) // bucket) * bucket
+    y_min = np.empty(-(-total // bucket), dtype=np.float32)
+    y_max = np.empty_like(y_min)
+
+    n_frames = max(0, (total - nperseg) // step + 1)
+    n_cols = max(1, min(n_cols, n_frames))
+    psd_sum = np.zeros(len(f))
+    spec_sum = np.zeros((n_cols, n_spec))
+    spec_count = np.zeros(n_cols)
+
+    tail = np.empty(0, dtype=np.float32)
+    tail_start = 0  # position absolue du premier échantillon de tail
+    next_frame = 0
+    pos = 0
+    for block in sf.blocks(io.BytesIO(data), blocksize=blocksize, dtype="float32", always_2d=True):
+        y = block[:, 0]
+
+        first_bucket = pos // bucket
+        n_full = len(y) // bucket
+        paquets = y[:n_full * bucket].reshape(n_full, bucket)
+        y_min[first_bucket:first_bucket + n_full] = paquets.min(axis=1)
+        y_max[first_bucket:first_bucket + n_full] = paquets.max(axis=1)
+        if len(y) % bucket:
+            y_min[first_bucket + n_full] = y[n_full * bucket:].min()
+            y_max[first_bucket + n_full] = y[n_full * bucket:].max()
+        pos += len(y)
+
+        # Trames complètes disponibles dans le reste du bloc précédent + ce bloc
+        buf = np.concatenate([tail, y])
+        last_frame = min(n_frames, (pos - nperseg) // step + 1) if pos >= nperseg else 0
+        if last_frame > next_frame:
+            offset = next_frame * step - tail_start
+            frames = sliding_window_view(buf, nperseg)[offset::step][:last_frame - next_frame]
+            frames = (frames - frames.mean(axis=1, keepdims=True)) * window
+            power = np.abs(real_fft(frames, pad=False, axis=1)[1]) ** 2 * scale
+            psd_sum += power.sum(axis=0)
+            cols = np.arange(next_frame, last_frame) * n_cols // max(n_frames, 1)
+            np.add.at(spec_sum, cols, power[:, :n_spec])
+            np.add.at(spec_count, cols, 1)
+            next_frame = last_frame
+        keep_from = next_frame * step - tail_start
+        tail = buf[keep_from:].copy()
+        tail_start += keep_from
+
+        if on_progress is not None:
+            on_progress(min(1.0, pos / max(total, 1)))
+
+    # Spectre unilatéral : on double tout sauf la composante continue (et Nyquist)
+    last_doubled = nperseg // 2 if nperseg % 2 == 0 else nperseg // 2 + 1
+    psd = psd_sum / max(next_frame, 1)
+    psd[1:last_doubled] *= 2
+    spec_power = spec_sum / np.maximum(spec_count, 1)[:, None]
+    spec_power[:, 1:min(n_spec, last_doubled)] *= 2
+    spec_db = (10 * np.log10(spec_power.T + 1e-10)).astype(np.float32)
+
+    t_overview = (np.arange(len(y_min)) + 0.5) * bucket / samplerate
+    t_spec = ((np.arange(n_cols) + 0.5) * n_frames / n_cols * step + nperseg / 2) / samplerate
+    return t_overview, y_min, y_max, f, psd, t_spec, spec_db
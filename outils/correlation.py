@@ -0,0 +1,151 @@
+import numpy as np
+from scipy.signal import find_peaks
+
+from outils.fourier import fast_length, inverse_real_fft, real_fft
+
+
+# Gabarits découpés dans des données multivoies (voies, n) autour d'instants donnés (s) :
+# de before secondes avant à after secondes après. Renvoie (gabarits (gabarits, voies, longueur),
+# instants de début des gabarits (s)) ; les instants trop près des bords sont écartés.
+def cut_templates(data, fs, onsets, before=1.0, after=4.0):
+    data = np.atleast_2d(data)
+    length = int(round((before + after) * fs))
+    starts = [int(round((t - before) * fs)) for t in onsets]
+    starts = [s for s in starts if s >= 0 and s + length <= data.shape[-1]]
+    if not starts:
+        return np.empty((0, data.shape[0], length)), np.empty(0)
+    return np.stack([data[:, s:s + length] for s in starts]), np.array(starts) / fs
+
+
+# Sommes glissantes sur length échantillons de x et x² (le long du dernier axe)
+def _moving_sums(x, length):
+    x = x - x.mean(axis=-1, keepdims=True)
+    zeros = np.zeros(x.shape[:-1] + (1,))
+    c1 = np.concatenate([zeros, np.cumsum(x, axis=-1)], axis=-1)
+    c2 = np.concatenate([zeros, np.cumsum(x * x, axis=-1)], axis=-1)
+    return c1[..., length:] - c1[..., :-length], c2[..., length:] - c2[..., :-length]
+
+
+# Bloc de données préparé pour la corrélation : spectre (longueur nfft) et normes glissantes
+# de chaque voie sur length échantillons, calculés une fois pour tous les gabarits
+def _prepare_block(x, length, nfft):
+    s1, s2 = _moving_sums(x.astype(np.float64), length)
+    data_norms = np.sqrt(np.maximum(s2 - s1 * s1 / length, 0.0)).astype(np.float32)
+    return real_fft(x.astype(np.float32), n=nfft)[1], data_norms
+
+
+# Corrélation croisée normalisée (coefficient de Pearson glissant) d'un lot de gabarits avec
+# chaque voie d'un bloc préparé, par FFT : un produit par les spectres conjugués des gabarits
+# et une FFT inverse. Renvoie (gabarits, voies, len(x) - longueur + 1).
+def _block_correlation(block, spectra, template_norms, nfft):
+    x_spectrum, data_norms = block
+    numerator = inverse_real_fft(x_spectrum[None] * spectra, nfft)[..., :data_norms.shape[-1]]
+    denominator = template_norms[:, :, None] * data_norms[None]
+    return np.divide(numerator, denominator, out=np.zeros_like(numerator),
+                     where=denominator > 1e-6 * max(float(denominator.max(initial=0.0)), 1e-30))
+
+
+# Détection par filtrage adapté multi-gabarits sur des données continues (voies, n) : corrélation
+# croisée normalisée par FFT (overlap-save par blocs de block_size échantillons, gabarits traités
+# par lots), moyennée sur toutes les voies (stations × composantes) puis seuillée à threshold fois
+# l'écart absolu médian (MAD) de chaque bloc. Une détection par gabarit et par longueur de gabarit :
+# les lobes secondaires de la corrélation (à une période du signal du pic) ne sont pas comptés. Les FFT utilisent tous les cœurs (outils.fourier.WORKERS).
+# Renvoie (numéros de gabarit, instants (s), corrélations, corrélations / MAD).
+def match_templates(data, templates, fs, threshold=8.0, block_size=2 ** 16, batch=16):
+    data = np.atleast_2d(data)
+    templates = np.asarray(templates, dtype=np.float64)
+    n_templates, n_channels, length = templates.shape
+    nfft = max(block_size, 2 * length)
+    step = nfft - length + 1
+
+    centered = templates - templates.mean(axis=-1, keepdims=True)
+    template_norms = np.sqrt(np.sum(centered ** 2, axis=-1)).astype(np.float32)
+    spectra = np.conj(real_fft(centered.astype(np.float32), n=nfft)[1])
+    active = np.maximum((template_norms > 0).sum(axis=1), 1)
+
+    ids, positions, values, ratios = [], [], [], []
+    for start in range(0, data.shape[-1] - length + 1, step):
+        x = np.asarray(data[:, start:start + nfft])
+        if x.shape[-1] < length:
+            break
+        block = _prepare_block(x, length, nfft)
+        for first in range(0, n_templates, batch):
+            group = slice(first, first + batch)
+            cc = _block_correlation(block, spectra[group], template_norms[group], nfft)
+            stacked = cc.sum(axis=1) / active[group, None]
+            # MAD estimée sur ~8000 valeurs régulièrement espacées du bloc : même seuil
+            # statistiquement, pour une fraction du coût du tri complet
+            sample = stacked[:, ::max(1, stacked.shape[1] // 8192)]
+            median = np.median(sample, axis=1, keepdims=True)
+            mad = np.median(np.abs(sample - median), axis=1)
+            for i in np.flatnonzero((stacked > threshold * mad[:, None]).any(axis=1)):
+                peaks, props = find_peaks(stacked[i], height=threshold * mad[i], distance=length)
+                ids += [first + i] * len(peaks)
+                positions += list(start + peaks)
+                values += list(props["peak_heights"])
+                ratios += list(props["peak_heights"] / max(mad[i], 1e-12))
+
+    ids, positions = np.array(ids, dtype=np.int64), np.array(positions, dtype=np.int64)
+    values, ratios = np.array(values), np.array(ratios)
+    keep = _dedupe(ids, positions, values, length)
+    return ids[keep], positions[keep] / fs, values[keep], ratios[keep]
+
+
+# Détections d'un même gabarit à moins de gap échantillons (pics de part et d'autre
+# d'une frontière de bloc) : seule la plus forte est gardée
+def _dedupe(ids, positions, values, gap):
+    order = np.lexsort((positions, ids))
+    keep = []
+    for k in order:
+        if keep and ids[keep[-1]] == ids[k] and positions[k] - positions[keep[-1]] < gap:
+            if values[k] > values[keep[-1]]:
+                keep[-1] = k
+        else:
+            keep.append(k)
+    return np.array(keep, dtype=np.int64)
+
+
+# Écarts de temps d'arrivée entre toutes les paires de voies (voies, n) par corrélation croisée :
+# une FFT par voie, puis un produit et une FFT inverse par lot de paires. Le pic de corrélation
+# (|décalage| <= max_lag s) est affiné par interpolation parabolique (précision sous-échantillon).
+# Renvoie (i, j, dt, corrélation) avec dt = t_i - t_j (positif : l'onde arrive plus tard en i).
+def differential_times(traces, fs, max_lag=None, batch=64):
+    traces = np.atleast_2d(np.asarray(traces, dtype=np.float64))
+    n_traces, n = traces.shape
+    x = traces - traces.mean(axis=1, keepdims=True)
+    norms = np.sqrt(np.sum(x ** 2, axis=1))
+    x = np.divide(x, norms[:, None], out=np.zeros_like(x), where=norms[:, None] > 0)
+    nfft = fast_length(2 * n - 1)
+    spectra = real_fft(x, n=nfft)[1]
+    max_shift = n - 1 if max_lag is None else min(n - 1, int(max_lag * fs))
+    lags = np.arange(-max_shift, max_shift + 1)
+
+    i, j = np.triu_indices(n_traces, 1)
+    shifts, peaks = np.empty(len(i)), np.empty(len(i))
+    for first in range(0, len(i), batch):
+        pairs = slice(first, first + batch)
+        cc = inverse_real_fft(spectra[i[pairs]] * np.conj(spectra[j[pairs]]), nfft)
+        # Décalages négatifs en fin de tableau (corrélation circulaire) : remis dans l'ordre
+        cc = cc[:, lags % nfft]
+        k = np.argmax(cc, axis=1)
+        rows = np.arange(len(k))
+        inner = (k > 0) & (k < len(lags) - 1)
+        a = cc[rows, np.maximum(k - 1, 0)]
+        b = cc[rows, k]
+        c = cc[rows, np.minimum(k + 1, len(lags) - 1)]
+        curvature = a - 2 * b + c
+        delta = np.where(inner & (curvature < 0), 0.5 * (a - c) / np.where(curvature < 0, curvature, -1.0), 0.0)
+        shifts[pairs] = (lags[k] + delta) / fs
+        peaks[pairs] = b - 0.25 * (a - c) * delta
+    return i, j, shifts, peaks
+
+
+# Temps d'arrivée relatifs de chaque voie (moyenne nulle) ajustés aux moindres carrés sur les
+# écarts de toutes les paires, pondérés par leur corrélation : une mesure aberrante pèse peu
+def relative_arrivals(n_traces, i, j, dt, weights=None):
+    weights = np.ones(len(dt)) if weights is None else np.clip(weights, 0.0, None)
+    system = np.zeros((len(dt) + 1, n_traces))
+    system[np.arange(len(dt)), i] = weights
+    system[np.arange(len(dt)), j] = -weights
+    system[-1] = 1.0  # moyenne des temps nulle
+    return np.linalg.lstsq(system, np.append(weights * dt, 0.0), rcond=None)[0]
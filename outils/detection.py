@@ -0,0 +1,101 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from scipy.signal import sosfilt
+
+from outils.filtrage import design_butterworth
+
+
+# Moyenne exponentielle sur n échantillons, écrite comme une section du second ordre :
+# sosfilt libère le GIL, les blocs traités en parallèle avancent vraiment en même temps
+def _exponential_mean(x, n):
+    c = 1.0 / n
+    return sosfilt(np.array([[c, 0.0, 0.0, 1.0, c - 1.0, 0.0]]), x)
+
+
+# Fonction caractéristique STA/LTA récursive : rapport des moyennes courte (n_sta) et longue
+# (n_lta) de l'énergie ; nulle pendant les n_lta premiers échantillons, le temps que la LTA s'établisse
+def recursive_sta_lta(energy, n_sta, n_lta):
+    sta = _exponential_mean(energy, n_sta)
+    lta = _exponential_mean(energy, n_lta)
+    ratio = np.divide(sta, lta, out=np.zeros_like(sta), where=lta > 0)
+    ratio[:n_lta] = 0.0
+    return ratio
+
+
+# Déclenchements avec hystérésis : début quand cf dépasse on, fin quand elle repasse sous off.
+# Renvoie les indices (début, fin) de chaque déclenchement.
+def trigger_onsets(cf, on, off):
+    rising = np.flatnonzero((cf[1:] >= on) & (cf[:-1] < on)) + 1
+    if len(cf) and cf[0] >= on:
+        rising = np.concatenate([[0], rising])
+    below = np.flatnonzero(cf < off)
+    triggers = []
+    end = -1
+    for start in rising:
+        if start <= end:
+            continue
+        k = np.searchsorted(below, start)
+        end = int(below[k]) if k < len(below) else len(cf)
+        triggers.append((int(start), end))
+    return np.array(triggers, dtype=np.int64).reshape(-1, 2)
+
+
+# Détection sur un bloc [start, stop) lu avec warmup échantillons en amont (établissement du filtre
+# et de la LTA) et tail en aval (fin des déclenchements tardifs). Seuls les déclenchements commençant
+# dans [start, stop + tail) sont gardés ; ceux vus par deux blocs voisins sont fusionnés ensuite.
+def _detect_block(data, start, stop, warmup, tail, sos, n_sta, n_lta, on, off):
+    lo = max(0, start - warmup)
+    hi = min(data.shape[-1], stop + tail)
+    block = np.atleast_2d(np.asarray(data[..., lo:hi], dtype=np.float64))
+    energy = np.sum(sosfilt(sos, block, axis=-1) ** 2, axis=0)
+    cf = recursive_sta_lta(energy, n_sta, n_lta)
+    cf[:start - lo] = 0.0
+    events = []
+    for i0, i1 in trigger_onsets(cf, on, off):
+        events.append((lo + i0, lo + i1, float(cf[i0:max(i1, i0 + 1)].max())))
+    return events
+
+
+# Fusion des déclenchements qui se recouvrent ou se suivent à moins de gap échantillons
+# (doublons des zones de recouvrement entre blocs, redéclenchements d'un même évènement)
+def merge_events(events, gap):
+    merged = []
+    for start, end, peak in sorted(events):
+        if merged and start <= merged[-1][1] + gap:
+            previous = merged[-1]
+            merged[-1] = (previous[0], max(previous[1], end), max(previous[2], peak))
+        else:
+            merged.append((start, end, peak))
+    return merged
+
+
+# Détection en continu sur un long enregistrement (tableau ou np.memmap, une voie (n,) ou
+# plusieurs (voies, n) dont les énergies sont sommées) : filtre passe-bande → STA/LTA → déclenchement,
+# par blocs de chunk_seconds qui se recouvrent, traités en parallèle sur les cœurs disponibles.
+# Renvoie (débuts (s), fins (s), rapports STA/LTA maximaux, débit en échantillons par seconde).
+def detect_continuous(data, fs, band=(1.0, 20.0), sta=1.0, lta=30.0, on=4.0, off=1.5,
+                      chunk_seconds=600.0, merge_seconds=1.0, order=4, workers=None):
+    started = time.perf_counter()
+    n = data.shape[-1]
+    n_channels = int(np.prod(data.shape[:-1], dtype=np.int64))
+    sos = design_butterworth("bandpass", (float(band[0]), float(band[1])), fs, order)
+    n_sta, n_lta = max(1, int(sta * fs)), max(2, int(lta * fs))
+    chunk = max(int(chunk_seconds * fs), n_lta)
+    warmup = 3 * n_lta
+    tail = max(n_lta, int(merge_seconds * fs))
+
+    bounds = [(start, min(start + chunk, n)) for start in range(0, n, chunk)]
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        blocks = pool.map(
+            lambda b: _detect_block(data, b[0], b[1], warmup, tail, sos, n_sta, n_lta, on, off), bounds)
+        events = [event for block in blocks for event in block]
+    events = merge_events(events, int(merge_seconds * fs))
+
+    elapsed = time.perf_counter() - started
+    onsets = np.array([e[0] for e in events], dtype=np.float64) / fs
+    ends = np.array([e[1] for e in events], dtype=np.float64) / fs
+    peaks = np.array([e[2] for e in events], dtype=np.float64)
+    return onsets, ends, peaks, n * n_channels / max(elapsed, 1e-9)
@@ -0,0 +1,211 @@
+import hashlib
+import json
+import os
+import struct
+
+import numpy as np
+import scipy.io as sio
+import streamlit as st
+
+# Enregistrement sismique fourni avec le dépôt (stations K-NET, séisme du 7 avril 2011)
+RECORDING_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "recording1.mat")
+
+# Fréquence d'échantillonnage des stations K-NET (Hz), absente du fichier
+KNET_SAMPLING_RATE = 100.0
+
+# Types de données MAT v5 (miINT8...miUINT64) et classes numériques (mxDOUBLE_CLASS...)
+_MI_TYPES = {1: "i1", 2: "u1", 3: "i2", 4: "u2", 5: "i4", 6: "u4", 7: "f4", 9: "f8", 12: "i8", 13: "u8"}
+_MX_CLASSES = {6: "f8", 7: "f4", 8: "i1", 9: "u1", 10: "i2", 11: "u2", 12: "i4", 13: "u4", 14: "i8", 15: "u8"}
+_MI_MATRIX = 14
+
+
+# Fichier MATLAB v7.3 : un fichier HDF5 précédé d'un en-tête MATLAB de 512 octets
+def is_v73(path):
+    with open(path, "rb") as f:
+        header = f.read(520)
+    return header.startswith(b"MATLAB 7.3") or header[512:520] == b"\x89HDF\r\n\x1a\n"
+
+
+def _h5py():
+    try:
+        import h5py
+    except ImportError as exc:
+        raise ImportError("h5py est nécessaire pour lire les fichiers MATLAB v7.3 (pip install h5py)") from exc
+    return h5py
+
+
+# Lecture d'un sous-élément MAT v5 (format normal ou « petit élément » de 4 octets au plus)
+def _read_tag(buf, pos, endian):
+    mi_type, nbytes = struct.unpack_from(endian + "II", buf, pos)
+    if mi_type >> 16:
+        return mi_type & 0xFFFF, mi_type >> 16, pos + 4, pos + 8
+    return mi_type, nbytes, pos + 8, pos + 8 + nbytes + (-nbytes % 8)
+
+
+# Emplacement des variables numériques non compressées d'un fichier MAT v5 :
+# nom -> (position des données, dtype, forme), pour les projeter en mémoire sans les copier
+def _v5_layout(path):
+    layout = {}
+    with open(path, "rb") as f:
+        header = f.read(128)
+        endian = "<" if header[126:128] == b"IM" else ">"
+        while True:
+            tag = f.read(8)
+            if len(tag) < 8:
+                break
+            mi_type, nbytes = struct.unpack(endian + "II", tag)
+            start = f.tell()
+            if mi_type == _MI_MATRIX:
+                # Drapeaux, dimensions et nom sont petits : on ne lit que l'en-tête de la variable
+                buf = f.read(min(nbytes, 512))
+                _, _, flags_pos, pos = _read_tag(buf, 0, endian)
+                flags = struct.unpack_from(endian + "I", buf, flags_pos)[0]
+                _, dims_bytes, dims_pos, pos = _read_tag(buf, pos, endian)
+                shape = struct.unpack_from(endian + f"{dims_bytes // 4}i", buf, dims_pos)
+                _, name_bytes, name_pos, pos = _read_tag(buf, pos, endian)
+                name = buf[name_pos:name_pos + name_bytes].decode("ascii")
+                data_type, _, data_pos, _ = _read_tag(buf, pos, endian)
+                mx_class = flags & 0xFF
+                complexe = flags & 0x800
+                if (not complexe and mx_class in _MX_CLASSES
+                        and _MI_TYPES.get(data_type) == _MX_CLASSES[mx_class]):
+                    layout[name] = (start + data_pos, np.dtype(endian + _MX_CLASSES[mx_class]), shape)
+            f.seek(start + nbytes + (-nbytes % 8))
+    return layout
+
+
+# Variables d'un fichier .mat sans charger leurs données : [(nom, forme, classe)]
+def list_variables(path):
+    if not is_v73(path):
+        return sio.whosmat(path)
+    h5py = _h5py()
+    variables = []
+    with h5py.File(path, "r") as f:
+        for name, obj in f.items():
+            if name.startswith("#"):
+                continue
+            classe = obj.attrs.get("MATLAB_class", b"")
+            classe = classe.decode() if isinstance(classe, bytes) else str(classe)
+            shape = tuple(reversed(obj.shape)) if isinstance(obj, h5py.Dataset) else ()
+            variables.append((name, shape, classe or "struct"))
+    return variables
+
+
+# Valeur MATLAB lue dans un fichier v7.3 : chaînes, tableaux (transposés, MATLAB étant
+# en ordre colonne) ou structures (dictionnaires de champs, listes pour les tableaux de structures)
+def _h5_value(f, obj, h5py):
+    if isinstance(obj, h5py.Group):
+        fields = {key: _h5_value(f, obj[key], h5py) for key in obj.keys()}
+        n = max((len(v) for v in fields.values() if isinstance(v, list)), default=0)
+        if n:
+            return [{key: v[i] if isinstance(v, list) else v for key, v in fields.items()} for i in range(n)]
+        return fields
+    if obj.dtype == h5py.ref_dtype:
+        return [_h5_value(f, f[ref], h5py) for ref in obj[()].T.ravel()]
+    classe = obj.attrs.get("MATLAB_class", b"")
+    classe = classe.decode() if isinstance(classe, bytes) else str(classe)
+    data = _h5_read(obj, h5py)
+    if classe == "char":
+        return "".join(map(chr, np.asarray(data).ravel(order="F")))
+    data = np.squeeze(data)
+    return data.item() if data.ndim == 0 else data
+
+
+# Jeu de données HDF5 : projeté en mémoire s'il est contigu et non compressé,
+# sinon lu morceau par morceau (un chunk HDF5 à la fois)
+def _h5_read(ds, h5py):
+    offset = ds.id.get_offset()
+    if ds.chunks is None and ds.compression is None and offset is not None and ds.dtype.kind in "iuf":
+        return np.memmap(ds.file.filename, dtype=ds.dtype, mode="r", offset=offset, shape=ds.shape).T
+    out = np.empty(ds.shape, dtype=ds.dtype)
+    if ds.chunks is None:
+        ds.read_direct(out)
+    else:
+        for sel in ds.iter_chunks():
+            out[sel] = ds[sel]
+    return out.T
+
+
+# Lecture sélective de variables : {nom: valeur}. Les tableaux numériques non compressés sont
+# projetés en mémoire (np.memmap) ; les autres sont décodés (scipy.io ou h5py pour la v7.3).
+def load_variables(path, names=None, mmap=True):
+    if is_v73(path):
+        h5py = _h5py()
+        with h5py.File(path, "r") as f:
+            names = names or [name for name in f.keys() if not name.startswith("#")]
+            return {name: _h5_value(f, f[name], h5py) for name in names}
+
+    values = {}
+    if mmap:
+        for name, (offset, dtype, shape) in _v5_layout(path).items():
+            if names is None or name in names:
+                # Mêmes dimensions que scipy.io.loadmat(squeeze_me=True)
+                values[name] = np.squeeze(np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=shape,
+                                                    order="F"))
+    rest = [name for name in (names or [v[0] for v in sio.whosmat(path)]) if name not in values]
+    if rest:
+        loaded = sio.loadmat(path, variable_names=rest, squeeze_me=True, struct_as_record=False)
+        values.update({name: loaded[name] for name in rest if name in loaded})
+    return values
+
+
+def _record_fields(record):
+    if isinstance(record, dict):
+        return record
+    return {name: getattr(record, name) for name in record._fieldnames}
+
+
+# Dossier de cache propre à un fichier (chemin, taille et date de modification) :
+# un fichier modifié ou remplacé n'en relit jamais un ancien cache
+def cache_directory(path, cache_dir=None):
+    info = os.stat(path)
+    key = hashlib.blake2b(f"{os.path.abspath(path)}:{info.st_size}:{info.st_mtime_ns}".encode(),
+                          digest_size=16).hexdigest()
+    cache_dir = cache_dir or os.path.join(os.path.dirname(os.path.abspath(path)), ".cache_enregistrements")
+    return os.path.join(cache_dir, key)
+
+
+# Stations d'un enregistrement au format de recording1.mat (tableau de structures « list »
+# avec les champs sismo, ID, LAT, LON, posixTime, offset). Les traces décodées sont mises
+# en cache en .npy à côté du fichier : les chargements suivants ne font que les projeter en mémoire.
+def load_stations(path, cache_dir=None, sampling_rate=KNET_SAMPLING_RATE):
+    directory = cache_directory(path, cache_dir)
+    meta_path = os.path.join(directory, "stations.json")
+
+    if not os.path.exists(meta_path):
+        records = load_variables(path, ["list"])["list"]
+        records = records if isinstance(records, (list, np.ndarray)) else [records]
+        os.makedirs(directory, exist_ok=True)
+        meta = []
+        for i, record in enumerate(records):
+            fields = _record_fields(record)
+            np.save(os.path.join(directory, f"{i}.npy"), np.asarray(fields["sismo"], dtype=np.float64))
+            meta.append({
+                "id": str(fields["ID"]).strip(),
+                "lat": float(fields["LAT"]),
+                "lon": float(fields["LON"]),
+                "posix_time": int(fields["posixTime"]),
+                "offset": float(fields["offset"]),
+            })
+        # Métadonnées écrites en dernier : un cache incomplet n'est jamais relu
+        tmp = meta_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp, meta_path)
+
+    with open(meta_path, encoding="utf-8") as f:
+        meta = json.load(f)
+    stations = []
+    for i, station in enumerate(meta):
+        # Source : fichier (son empreinte de cache) et rang dans le fichier, pour distinguer
+        # deux enregistrements d'une même station
+        station = dict(station, sampling_rate=sampling_rate, source=f"{os.path.basename(directory)}:{i}")
+        station["sismo"] = np.load(os.path.join(directory, f"{i}.npy"), mmap_mode="r")
+        stations.append(station)
+    return stations
+
+
+# Stations de recording1.mat, chargées une seule fois pour toutes les sessions
+@st.cache_resource
+def get_recording_stations(path=RECORDING_PATH):
+    return load_stations(path)
@@ -0,0 +1,131 @@
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import plotly.graph_objects as go
+import plotly.io as pio
+import streamlit as st
+
+# Backend JSON rapide pour la sérialisation des figures, s'il est installé
+try:
+    import orjson  # noqa: F401
+    pio.json.config.default_engine = "orjson"
+except ImportError:
+    pass
+
+
+# Encodage binaire d'un tableau pour plotly.js (dtype + shape + bdata en base64)
+# au lieu d'une liste de nombres JSON
+def typed_array(values, dtype=np.float32):
+    arr = np.ascontiguousarray(values, dtype=dtype)
+    if arr.dtype.byteorder == ">":
+        arr = arr.astype(arr.dtype.newbyteorder("<"))
+    spec = {"dtype": arr.dtype.str[1:], "bdata": base64.b64encode(arr.data).decode("ascii")}
+    if arr.ndim > 1:
+        spec["shape"] = ",".join(str(n) for n in arr.shape)
+    return spec
+
+
+# Trace d'un signal échantillonné régulièrement : axe implicite (x0, dx)
+# au lieu d'un vecteur x explicite (x explicite s'il a moins de deux points)
+def regular_scatter(x, y, **kwargs):
+    if len(x) < 2:
+        return go.Scatter(x=x, y=y, **kwargs)
+    return go.Scatter(x0=float(x[0]), dx=float(x[1] - x[0]), y=typed_array(y), **kwargs)
+
+
+# Empreinte des entrées d'une figure (scalaires, chaînes, tableaux NumPy, tuples...)
+def hash_inputs(*inputs):
+    h = hashlib.blake2b(digest_size=16)
+
+    def update(value):
+        if isinstance(value, np.ndarray):
+            h.update(f"nd{value.dtype.str}{value.shape}".encode())
+            h.update(np.ascontiguousarray(value).data)
+        elif isinstance(value, (list, tuple)):
+            h.update(f"seq{len(value)}(".encode())
+            for item in value:
+                update(item)
+            h.update(b")")
+        elif isinstance(value, dict):
+            h.update(f"dict{len(value)}(".encode())
+            for k in sorted(value):
+                update(k)
+                update(value[k])
+            h.update(b")")
+        else:
+            h.update(f"{type(value).__name__}:{value!r};".encode())
+
+    for value in inputs:
+        update(value)
+    return h.hexdigest()
+
+
+# Taille approchée d'une figure (octets), estimée sur ses tableaux de données sans la sérialiser
+def _figure_size(figure):
+    size = 4096  # mise en page, styles
+    for trace in figure.data:
+        for name in ("x", "y", "z", "text"):
+            value = trace[name] if name in trace else None
+            if isinstance(value, dict) and "bdata" in value:
+                size += len(value["bdata"])
+            elif value is not None:
+                size += 8 * np.size(value)
+    return size
+
+
+# Cache LRU de figures, borné en mémoire (taille estimée par _figure_size)
+class FigureCache:
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, figure, size):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.size -= self._entries.pop(key)[1]
+            self._entries[key] = (figure, size)
+            self.size += size
+            # Éviction des figures les moins récemment utilisées
+            while self.size > self.max_bytes:
+                _, (_, old_size) = self._entries.popitem(last=False)
+                self.size -= old_size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+# Cache partagé entre toutes les sessions
+@st.cache_resource
+def get_figure_cache():
+    return FigureCache()
+
+
+# Renvoie la figure associée à (name, inputs) ; build() n'est appelé qu'en cas d'absence.
+# Le cache évite la construction et la validation de la figure ; st.plotly_chart la sérialise
+# encore à chaque affichage. La figure est partagée entre les reruns et les sessions : elle
+# ne doit pas être modifiée.
+def cached_figure(name, inputs, build):
+    cache = get_figure_cache()
+    key = hash_inputs(name, inputs)
+    figure = cache.get(key)
+    if figure is None:
+        figure = build()
+        cache.put(key, figure, _figure_size(figure))
+    return figure
@@ -0,0 +1,149 @@
+import io
+from functools import lru_cache
+
+import numpy as np
+import soundfile as sf
+from scipy.signal import butter, firwin, oaconvolve, sosfilt
+
+from outils.fourier import inverse_real_fft, real_fft
+
+# Modes de filtrage : masque idéal (réponse impulsionnelle tronquée en flux),
+# RIF à fenêtre de Hamming, RII de Butterworth
+MODES = ("ideal", "fir", "iir")
+
+
+def _band(kind, cutoffs):
+    if kind == "bandpass":
+        return list(cutoffs)
+    return cutoffs[0]
+
+
+# Coefficients d'un filtre RIF à phase linéaire, calculés une fois par jeu de paramètres.
+# window="boxcar" donne la réponse impulsionnelle du filtre idéal simplement tronquée.
+@lru_cache(maxsize=32)
+def design_fir(kind, cutoffs, fs, numtaps=1001, window="hamming"):
+    numtaps = int(numtaps) | 1  # longueur impaire : obligatoire pour un passe-haut
+    taps = firwin(numtaps, _band(kind, cutoffs), fs=fs, pass_zero=kind, window=window)
+    taps.flags.writeable = False
+    return taps
+
+
+# Sections du second ordre d'un filtre de Butterworth, calculées une fois par jeu de paramètres
+@lru_cache(maxsize=32)
+def design_butterworth(kind, cutoffs, fs, order=4):
+    return butter(order, _band(kind, cutoffs), btype=kind, fs=fs, output="sos")
+
+
+# Filtre parfait sur un signal entièrement en mémoire : on annule les cases de la FFT
+# hors de la bande (le signal est vu comme périodique, d'où des effets de bord)
+def ideal_filter(y, fs, kind, cutoffs):
+    f, spectrum = real_fft(y, 1 / fs, pad=False)
+    if kind == "lowpass":
+        keep = f <= cutoffs[0]
+    elif kind == "highpass":
+        keep = f >= cutoffs[0]
+    else:
+        keep = (f >= cutoffs[0]) & (f <= cutoffs[1])
+    return inverse_real_fft(np.where(keep, spectrum, 0), len(y))
+
+
+# Filtre en flux : les blocs successifs sont filtrés comme un seul signal.
+# RIF : convolution par FFT (overlap-add) dont la queue est reportée sur le bloc suivant ;
+# RII : état interne des sections du second ordre conservé entre les blocs.
+class StreamingFilter:
+    def __init__(self, fs, kind, cutoffs, mode="fir", numtaps=1001, order=4):
+        cutoffs = tuple(float(c) for c in cutoffs)
+        self.mode = mode
+        if mode == "iir":
+            self.sos = design_butterworth(kind, cutoffs, fs, order)
+            self.state = np.zeros((len(self.sos), 2))
+            self.delay = 0
+        else:
+            window = "boxcar" if mode == "ideal" else "hamming"
+            self.taps = design_fir(kind, cutoffs, fs, numtaps, window)
+            self.tail = np.zeros(len(self.taps) - 1)
+            # Retard de groupe d'un RIF à phase linéaire
+            self.delay = (len(self.taps) - 1) // 2
+
+    def process(self, block):
+        block = np.asarray(block, dtype=np.float64)
+        if self.mode == "iir":
+            out, self.state = sosfilt(self.sos, block, zi=self.state)
+            return out
+        full = oaconvolve(block, self.taps)
+        full[:len(self.tail)] += self.tail
+        self.tail = full[len(block):].copy()
+        return full[:len(block)]
+
+    # Fin du signal : sortie restante du RIF (vide pour un RII)
+    def flush(self):
+        if self.mode == "iir":
+            return np.empty(0)
+        out, self.tail = self.tail, np.zeros_like(self.tail)
+        return out
+
+
+# Filtrage d'une suite de blocs ; pour un RIF le retard de groupe est compensé,
+# de sorte que la sortie reste alignée sur l'entrée et de même longueur
+def filter_blocks(blocks, filt):
+    to_skip = filt.delay
+    remaining = 0
+    for block in blocks:
+        remaining += len(block)
+        out = filt.process(block)
+        if to_skip:
+            skipped = min(to_skip, len(out))
+            out, to_skip = out[skipped:], to_skip - skipped
+        remaining -= len(out)
+        if len(out):
+            yield out
+    if remaining:
+        yield filt.flush()[to_skip:to_skip + remaining]
+
+
+# Filtrage d'un signal en mémoire, bloc par bloc (mémoire de travail bornée par block_size)
+def filter_signal(y, fs, kind, cutoffs, mode="fir", numtaps=1001, order=4, block_size=65536):
+    if mode == "ideal" and len(y) <= block_size:
+        return ideal_filter(y, fs, kind, cutoffs)
+    filt = StreamingFilter(fs, kind, cutoffs, mode, numtaps, order)
+    blocks = (y[i:i + block_size] for i in range(0, len(y), block_size))
+    out = np.empty(len(y))
+    pos = 0
+    for block in filter_blocks(blocks, filt):
+        out[pos:pos + len(block)] = block
+        pos += len(block)
+    return out
+
+
+# Filtrage d'un fichier audio en flux : lecture, filtrage et écriture en WAV 16 bits
+# bloc par bloc, sans jamais charger tout l'enregistrement en mémoire
+def filter_audio_file(data, kind, cutoffs, mode="fir", numtaps=1001, order=4, block_seconds=10,
+                      on_progress=None):
+    info = sf.info(io.BytesIO(data))
+    filt = StreamingFilter(info.samplerate, kind, cutoffs, mode, numtaps, order)
+    blocksize = int(block_seconds * info.samplerate)
+    blocks = (block[:, 0] for block in sf.blocks(io.BytesIO(data), blocksize=blocksize, dtype="float64",
+                                                  always_2d=True))
+    buf = io.BytesIO()
+    done = 0
+    with sf.SoundFile(buf, "w", info.samplerate, 1, format="WAV", subtype="PCM_16") as out:
+        for block in filter_blocks(blocks, filt):
+            out.write(np.clip(block, -1.0, 1.0))
+            done += len(block)
+            if on_progress is not None:
+                on_progress(min(1.0, done / max(info.frames, 1)))
+    return buf.getvalue()
+
+
+# Réponse en fréquence (gain) d'un filtre conçu par ce module, pour l'affichage
+def frequency_response(fs, kind, cutoffs, mode="fir", numtaps=1001, order=4, n_fft=8192):
+    cutoffs = tuple(float(c) for c in cutoffs)
+    if mode == "iir":
+        impulse = np.zeros(n_fft)
+        impulse[0] = 1.0
+        h = sosfilt(design_butterworth(kind, cutoffs, fs, order), impulse)
+    else:
+        h = design_fir(kind, cutoffs, fs, numtaps, "boxcar" if mode == "ideal" else "hamming")
+        h = np.pad(h, (0, max(0, n_fft - len(h))))
+    f, spectrum = real_fft(h, 1 / fs)
+    return f, np.abs(spectrum)
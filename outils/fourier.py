@@ -0,0 +1,64 @@
+from functools import lru_cache
+
+import numpy as np
+from scipy import fft as sp_fft
+from scipy.signal import ZoomFFT
+
+# Nombre de fils pour les FFT (-1 : tous les cœurs disponibles)
+WORKERS = -1
+
+
+# Longueur de FFT rapide (produit de petits facteurs premiers) pour un signal réel.
+# Le plan de pocketfft est mis en cache par longueur : en arrondissant toujours
+# vers les mêmes longueurs, les pages réutilisent les mêmes plans.
+def fast_length(n):
+    return sp_fft.next_fast_len(int(n), real=True)
+
+
+# Axe des fréquences d'une FFT réelle de longueur n, calculé une seule fois par (n, d)
+@lru_cache(maxsize=64)
+def frequency_axis(n, d=1.0):
+    f = sp_fft.rfftfreq(n, d)
+    f.flags.writeable = False
+    return f
+
+
+# FFT d'un signal réel (demi-spectre seulement), éventuellement complété par
+# des zéros jusqu'à une longueur rapide (ou jusqu'à n imposé). Renvoie (fréquences, spectre complexe).
+def real_fft(y, d=1.0, pad=True, axis=-1, n=None):
+    y = np.asarray(y)
+    if n is None:
+        n = fast_length(y.shape[axis]) if pad else y.shape[axis]
+    return frequency_axis(n, d), sp_fft.rfft(y, n, axis=axis, workers=WORKERS)
+
+
+# Transformée inverse d'un demi-spectre vers un signal réel de n échantillons
+def inverse_real_fft(spectrum, n, axis=-1):
+    return sp_fft.irfft(spectrum, n, axis=axis, workers=WORKERS)
+
+
+# Spectre d'amplitude d'un signal réel : (fréquences positives, |X| * 2 / N).
+# Le remplissage par des zéros ne change que l'espacement de la grille,
+# la normalisation reste celle de la longueur d'origine.
+def amplitude_spectrum(y, d=1.0, pad=True):
+    f, spectrum = real_fft(y, d, pad)
+    return f, np.abs(spectrum) * 2 / len(y)
+
+
+# Transformée en Z chirp préparée pour une longueur, une bande et une résolution données
+@lru_cache(maxsize=16)
+def zoom_transform(n, f_min, f_max, n_points, fs):
+    return ZoomFFT(n, [f_min, f_max], n_points, fs=fs, endpoint=True)
+
+
+# Spectre d'amplitude zoomé (transformée en Z chirp) : n_points fréquences réparties
+# sur [f_min, f_max] seulement, avec une résolution indépendante de la longueur du signal.
+# Elle fait en interne des FFT de longueur N + n_points : plus chère qu'une rfft du signal,
+# elle n'a d'intérêt que mise en cache pour un signal et une bande qui reviennent.
+# Renvoie (fréquences, |X| * 2 / N) comme amplitude_spectrum.
+def zoom_spectrum(y, d, f_min, f_max, n_points=1000):
+    fs = 1.0 / d
+    f_min, f_max = float(max(f_min, 0.0)), float(min(f_max, fs / 2))
+    transform = zoom_transform(len(y), f_min, f_max, int(n_points), fs)
+    f = np.linspace(f_min, f_max, int(n_points))
+    return f, np.abs(transform(np.asarray(y, dtype=np.float64))) * 2 / len(y)
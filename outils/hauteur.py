@@ -0,0 +1,78 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from outils.fourier import fast_length, inverse_real_fft, real_fft
+
+
+# Fonction de différence normalisée de YIN (d'), calculée pour un paquet de trames
+# à la fois via l'autocorrélation par FFT
+def _yin_cmnd(frames, tau_max):
+    n_frames, length = frames.shape
+    n_fft = fast_length(2 * length)
+    spectrum = real_fft(frames, axis=1, n=n_fft)[1]
+    r = inverse_real_fft(spectrum.real ** 2 + spectrum.imag ** 2, n_fft, axis=1)[:, :tau_max + 1]
+
+    energy = np.concatenate([np.zeros((n_frames, 1)), np.cumsum(frames ** 2, axis=1)], axis=1)
+    tau = np.arange(tau_max + 1)
+    d = energy[:, length - tau] + energy[:, [length]] - energy[:, tau] - 2 * r
+    d[:, 0] = 0
+
+    cumul = np.cumsum(d[:, 1:], axis=1)
+    cmnd = np.ones_like(d)
+    cmnd[:, 1:] = d[:, 1:] * tau[1:] / np.maximum(cumul, 1e-12)
+    return cmnd
+
+
+# Suivi de la fréquence fondamentale (YIN vectorisé sur des trames courtes).
+# Renvoie (temps des trames, f0 en Hz) ; f0 vaut NaN pour les trames non voisées ou silencieuses.
+def pitch_track(y, fs, fmin=60.0, fmax=1000.0, hop=None, threshold=0.15, silence_db=-40.0, chunk_frames=512):
+    y = np.asarray(y, dtype=np.float64)
+    tau_min = max(2, int(fs / fmax))
+    tau_max = int(np.ceil(fs / fmin))
+    frame_length = 2 * tau_max
+    hop = hop or max(1, frame_length // 4)
+    if len(y) < frame_length:
+        return np.empty(0), np.empty(0)
+
+    frames = sliding_window_view(y, frame_length)[::hop]
+    times = (np.arange(len(frames)) * hop + frame_length / 2) / fs
+    f0 = np.full(len(frames), np.nan)
+
+    # Trames trop faibles par rapport au maximum : silence
+    rms = np.sqrt(np.mean(frames ** 2, axis=1))
+    voiced = 20 * np.log10(rms / max(rms.max(), 1e-12) + 1e-12) > silence_db
+
+    lags = np.arange(tau_max + 1)
+    for start in range(0, len(frames), chunk_frames):
+        block = frames[start:start + chunk_frames]
+        block = block - block.mean(axis=1, keepdims=True)
+        cmnd = _yin_cmnd(block, tau_max)
+        cmnd[:, :tau_min] = np.inf
+
+        # Premier retard sous le seuil, puis descente jusqu'au minimum local
+        below = cmnd < threshold
+        has_dip = below.any(axis=1)
+        first = np.where(has_dip, np.argmax(below, axis=1), np.argmin(cmnd, axis=1))
+        rising = np.ones_like(below)
+        rising[:, :-1] = cmnd[:, 1:] >= cmnd[:, :-1]
+        tau = np.argmax(rising & (lags >= first[:, None]), axis=1)
+
+        # Interpolation parabolique autour du minimum pour une précision sous l'échantillon
+        rows = np.arange(len(block))
+        t_prev = np.clip(tau - 1, 0, tau_max)
+        t_next = np.clip(tau + 1, 0, tau_max)
+        a, b, c = cmnd[rows, t_prev], cmnd[rows, tau], cmnd[rows, t_next]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            denom = a - 2 * b + c
+            shift = np.where(np.isfinite(denom) & (denom > 0), 0.5 * (a - c) / denom, 0.0)
+        period = tau + np.clip(shift, -1, 1)
+
+        ok = has_dip & voiced[start:start + len(block)] & (tau > tau_min) & (tau < tau_max)
+        f0[start:start + len(block)] = np.where(ok, fs / period, np.nan)
+    return times, f0
+
+
+# Fréquence fondamentale robuste d'un enregistrement : médiane des trames voisées (NaN si aucune)
+def median_f0(f0):
+    voiced = f0[np.isfinite(f0)]
+    return float(np.median(voiced)) if len(voiced) else float("nan")
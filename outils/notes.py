@@ -0,0 +1,136 @@
+from functools import lru_cache
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.signal import find_peaks
+
+# Gamme tempérée : noms des 12 demi-tons (notation française), La4 = 440 Hz
+NOTE_NAMES = ["Do", "Do#", "Ré", "Ré#", "Mi", "Fa", "Fa#", "Sol", "Sol#", "La", "La#", "Si"]
+
+# Les 88 touches du piano (La0 à Do8) en numéros MIDI
+PIANO_KEYS = tuple(range(21, 109))
+
+
+# Numéro MIDI de la note la plus proche d'une fréquence
+def midi_number(freq):
+    return int(round(69 + 12 * np.log2(freq / 440.0)))
+
+
+# Fréquence d'une note à partir de son numéro MIDI
+def midi_frequency(midi):
+    return 440.0 * 2 ** ((np.asarray(midi) - 69) / 12)
+
+
+# Nom d'une note à partir de son numéro MIDI, par exemple 60 -> "Do4"
+def midi_name(midi):
+    return f"{NOTE_NAMES[midi % 12]}{midi // 12 - 1}"
+
+
+# Nom de la note la plus proche d'une fréquence, par exemple 262 Hz -> "Do4"
+def note_name(freq):
+    return midi_name(midi_number(freq))
+
+
+# Flux spectral : somme des hausses de log-amplitude d'une trame à la suivante,
+# calculé sur le spectrogramme en dB déjà en cache (bande limitée à f_max)
+def spectral_flux(f, Sdb, f_max=None):
+    if f_max is not None:
+        Sdb = Sdb[:np.searchsorted(f, f_max, side="right")]
+    rise = np.maximum(np.diff(Sdb / 20.0, axis=1), 0)
+    return np.concatenate([[0.0], rise.sum(axis=0)])
+
+
+# Débuts de notes : pics du flux spectral au-dessus d'un seuil adaptatif (médiane + k * MAD,
+# et au moins `relative` fois le plus grand pic), espacés d'au moins min_gap secondes
+def detect_onsets(t, flux, min_gap=0.15, k=5.0, relative=0.2):
+    if len(t) < 2:
+        return np.empty(0, dtype=int)
+    median = np.median(flux)
+    mad = np.median(np.abs(flux - median))
+    distance = max(1, int(round(min_gap / (t[1] - t[0]))))
+    height = max(median + k * max(mad, 1e-6), relative * flux.max())
+    onsets, _ = find_peaks(flux, height=height, distance=distance)
+    return onsets
+
+
+# Détection automatique des notes jouées : segmentation par le flux spectral
+# puis hauteur médiane (suivi YIN) sur chaque segment.
+# Renvoie une liste de (début, fin, fréquence, nom de la note).
+def detect_notes(f, t, Sdb, t_f0, f0, f_max=3000, min_gap=0.15, silence_db=-40.0):
+    band = Sdb[:np.searchsorted(f, f_max, side="right")]
+    energy_db = 10 * np.log10(np.mean(10 ** (band / 10.0), axis=0))
+    active = energy_db > energy_db.max() + silence_db
+    if not active.any():
+        return []
+
+    onsets = list(detect_onsets(t, spectral_flux(f, Sdb, f_max), min_gap))
+    # Une note qui démarre dès le début de l'enregistrement ne crée pas de flux : on l'ajoute
+    first_active = int(np.argmax(active))
+    if not onsets or t[onsets[0]] - t[first_active] > min_gap:
+        onsets.insert(0, first_active)
+    last_active = len(active) - 1 - int(np.argmax(active[::-1]))
+
+    notes = []
+    bounds = [t[i] for i in onsets] + [t[last_active]]
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        segment = f0[(t_f0 >= start) & (t_f0 < end)]
+        segment = segment[np.isfinite(segment)]
+        if len(segment) == 0:
+            continue
+        freq = float(np.median(segment))
+        notes.append((float(start), float(end), freq, note_name(freq)))
+    return notes
+
+
+# Noyaux de la DFT fenêtrée (Hann) aux fréquences exactes des notes, en float32 :
+# colonnes cos puis sin, normalisées pour qu'un cosinus pur ait son amplitude
+@lru_cache(maxsize=16)
+def _note_kernels(frame_length, fs, midi):
+    window = np.hanning(frame_length)
+    phase = np.outer(np.arange(frame_length), 2 * np.pi * midi_frequency(midi) / fs)
+    gain = 2.0 / window.sum()
+    kernels = np.concatenate([np.cos(phase), np.sin(phase)], axis=1) * (window * gain)[:, None]
+    kernels = kernels.astype(np.float32)
+    kernels.flags.writeable = False
+    return kernels
+
+
+# Activité des notes trame par trame : amplitude de la DFT fenêtrée évaluée seulement aux
+# fréquences des notes de la gamme tempérée (la valeur qu'une récursion de Goertzel donnerait
+# pour chaque note), calculée pour un lot de trames et toutes les notes par un seul produit
+# matriciel en float32. Le coût est proportionnel au nombre de notes : pour les 88 touches,
+# il est du même ordre qu'une STFT float32 sur les mêmes trames, mais chaque note est mesurée
+# à sa fréquence exacte ; il ne devient une fraction de la STFT que pour quelques notes
+# (midi restreint). Renvoie (temps des trames, amplitudes de forme (notes, trames)).
+def note_activity(y, fs, midi=PIANO_KEYS, frame_length=4096, hop=None, chunk_frames=256):
+    y = np.asarray(y, dtype=np.float32)
+    frame_length = min(frame_length, len(y))
+    hop = hop or frame_length // 2
+    kernels = _note_kernels(frame_length, fs, tuple(midi))
+    n_notes = len(midi)
+
+    frames = sliding_window_view(y, frame_length)[::hop]
+    times = (np.arange(len(frames)) * hop + frame_length / 2) / fs
+    activity = np.empty((n_notes, len(frames)))
+    for start in range(0, len(frames), chunk_frames):
+        parts = frames[start:start + chunk_frames] @ kernels
+        activity[:, start:start + len(parts)] = np.hypot(parts[:, :n_notes], parts[:, n_notes:]).T
+    return times, activity
+
+
+# Notes présentes : maximum local le long des notes (élimine les fuites vers les
+# demi-tons voisins), à moins de threshold_db du plus fort, sur au moins min_frames trames.
+# Avec suppress_harmonics, une note dont l'octave ou la quinte en dessous est plus forte
+# est considérée comme une harmonique.
+def present_notes(activity, midi=PIANO_KEYS, threshold_db=-20.0, min_frames=1, suppress_harmonics=False):
+    midi = np.asarray(midi)
+    level = 20 * np.log10(activity / max(activity.max(), 1e-12) + 1e-12)
+    padded = np.pad(activity, ((1, 1), (0, 0)))
+    active = (level > threshold_db) & (activity >= padded[:-2]) & (activity >= padded[2:])
+    if suppress_harmonics:
+        for interval in (12, 19, 24):
+            below = np.zeros_like(active)
+            below[interval:] = active[:-interval] & (activity[:-interval] > activity[interval:])
+            active &= ~below
+    counts = active.sum(axis=1)
+    return [midi_name(int(m)) for m in midi[counts >= min_frames]]
@@ -0,0 +1,92 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import streamlit as st
+
+from outils.spectre import estimate_peaks
+
+
+# Table de réponses d'un curseur : chaque valeur de son domaine (fini) n'est calculée qu'une fois,
+# soit d'un bloc sur tout le domaine (compute_all), soit à la demande (compute), puis simplement relue.
+# max_entries borne la table (éviction des valeurs les moins récemment relues).
+class ResponseTable:
+    def __init__(self, compute=None, compute_all=None, domain=None, max_entries=None):
+        self._compute = compute
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._values = OrderedDict()
+        if compute_all is not None:
+            self._values.update(zip(domain, compute_all(domain)))
+
+    def __getitem__(self, value):
+        with self._lock:
+            if value in self._values:
+                self._values.move_to_end(value)
+                return self._values[value]
+        result = self._compute(value)
+        with self._lock:
+            self._values[value] = result
+            while self.max_entries is not None and len(self._values) > self.max_entries:
+                self._values.popitem(last=False)
+        return result
+
+    def __len__(self):
+        return len(self._values)
+
+
+# Échantillonnage d'une somme de cosinus sur une seconde pour toutes les fréquences
+# d'échantillonnage du domaine en une seule passe vectorisée : tous les échantillons sont
+# rangés bout à bout dans un tableau float32, chaque entrée de la table en est une vue.
+# Entrée : (échantillons, fréquence significative la plus haute ou None).
+def _sample_all(components, fs_values):
+    fs_values = np.asarray(fs_values, dtype=np.int64)
+    counts = fs_values  # fs échantillons sur une seconde
+    starts = np.concatenate([[0], np.cumsum(counts)])
+    fs_rep = np.repeat(fs_values, counts)
+    t = (np.arange(starts[-1]) - np.repeat(starts[:-1], counts)) / np.maximum(fs_rep, 1)
+    y = np.zeros(starts[-1])
+    for A, f, phi in components:
+        y += A * np.cos(2 * np.pi * f * t + phi)
+    y = y.astype(np.float32)
+    y.flags.writeable = False
+
+    entries = []
+    for fs, start, end in zip(fs_values, starts[:-1], starts[1:]):
+        samples = y[start:end]
+        highest = None
+        if len(samples) > 2:
+            # Tous les pics au-dessus du seuil : le plus aigu peut être faible
+            freqs, _, _ = estimate_peaks(samples, 1 / fs, relative=0.05, max_peaks=None)
+            highest = float(freqs.max()) if len(freqs) else None
+        entries.append((samples, highest))
+    return entries
+
+
+# Table du curseur d'échantillonnage de la page capteurs, pour un jeu de composantes donné
+@st.cache_resource(max_entries=16)
+def get_sampling_table(components, fs_min=0, fs_max=1000, step=10):
+    return ResponseTable(
+        compute=lambda fs: _sample_all(components, [fs])[0],
+        compute_all=lambda domain: _sample_all(components, domain),
+        domain=range(fs_min, fs_max + 1, step),
+    )
+
+
+# Pics du spectre d'un cosinus unitaire cos(2π f t + φ) ;
+# l'amplitude A n'intervient que comme facteur d'échelle
+def _unit_cosine_response(t, key):
+    f, phi = key
+    y = np.cos(2 * np.pi * f * t + phi)
+    freqs_pics, amps_pics, _ = estimate_peaks(y, t[1] - t[0])
+    response = (freqs_pics, amps_pics)
+    for arr in response:
+        arr.flags.writeable = False
+    return response
+
+
+# Table (à la demande) des curseurs fréquence et phase de la page signal
+@st.cache_resource
+def get_cosine_table(duration=3, n_samples=3000):
+    t = np.linspace(0, duration, n_samples)
+    return ResponseTable(compute=lambda key: _unit_cosine_response(t, key), max_entries=2048)
@@ -0,0 +1,35 @@
+from fractions import Fraction
+from functools import lru_cache
+
+import numpy as np
+from scipy.signal import firwin, resample_poly
+
+
+# Rapport rationnel up/down entre deux fréquences d'échantillonnage
+def resampling_ratio(fs_in, fs_out, max_denominator=1000):
+    ratio = Fraction(fs_out) / Fraction(fs_in)
+    ratio = ratio.limit_denominator(max_denominator)
+    return ratio.numerator, ratio.denominator
+
+
+# Filtre polyphase mis en cache pour chaque rapport (up, down) :
+# - avec anti-repliement : passe-bas RIF (Kaiser) coupant à la plus basse des deux fréquences de Nyquist
+# - sans anti-repliement : noyau triangulaire = interpolation linéaire, le repliement reste audible
+@lru_cache(maxsize=64)
+def design_filter(up, down, anti_alias=True):
+    if anti_alias:
+        max_rate = max(up, down)
+        h = firwin(2 * 10 * max_rate + 1, 1.0 / max_rate, window=("kaiser", 5.0))
+    else:
+        h = 1.0 - np.abs(np.arange(1 - up, up)) / up
+        h /= up  # resample_poly multiplie le filtre par up
+    h.flags.writeable = False
+    return h
+
+
+# Ré-échantillonnage de y de fs_in vers fs_out par filtrage polyphase rationnel
+def resample(y, fs_in, fs_out, anti_alias=True):
+    up, down = resampling_ratio(fs_in, fs_out)
+    if up == down:
+        return np.array(y, copy=True)
+    return resample_poly(y, up, down, window=design_filter(up, down, anti_alias))
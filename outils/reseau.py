@@ -0,0 +1,115 @@
+from functools import lru_cache
+
+import numpy as np
+
+from outils.fourier import frequency_axis, real_fft
+
+# Longueur d'un degré de latitude (km)
+KM_PER_DEGREE = 111.195
+
+
+# Position des stations (km vers l'est, km vers le nord) par rapport au centre du réseau
+def local_coordinates(lat, lon):
+    lat, lon = np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64)
+    lat0, lon0 = lat.mean(), lon.mean()
+    return (lon - lon0) * KM_PER_DEGREE * np.cos(np.radians(lat0)), (lat - lat0) * KM_PER_DEGREE
+
+
+# Grille carrée de lenteurs (s/km) de -s_max à s_max, calculée une fois par (s_max, n)
+@lru_cache(maxsize=16)
+def slowness_axis(s_max, n):
+    axis = np.linspace(-s_max, s_max, n)
+    axis.flags.writeable = False
+    return axis
+
+
+# Déphasages exp(2iπ f s·r) de chaque lenteur de la grille pour chaque station et fréquence :
+# (fréquences, lenteurs, stations). Ils ne dépendent que de la géométrie, de la grille et de la
+# fenêtre : préparés une fois, ils servent à toutes les fenêtres glissantes.
+def steering_vectors(x, y, freqs, s_max=0.5, n_slowness=81):
+    axis = slowness_axis(float(s_max), int(n_slowness))
+    sx, sy = np.meshgrid(axis, axis, indexing="xy")
+    delays = sx.ravel()[:, None] * np.asarray(x)[None, :] + sy.ravel()[:, None] * np.asarray(y)[None, :]
+    return np.exp(2j * np.pi * np.asarray(freqs)[:, None, None] * delays[None])
+
+
+# Nombre minimal de fréquences dans la bande : sur une ou deux fréquences, les lobes de repliement
+# d'un réseau clairsemé sont aussi hauts que le vrai maximum ; sommés sur plusieurs, ils s'effacent.
+MIN_FREQUENCIES = 4
+
+# Contraste minimal du maximum du faisceau, par rapport au niveau d'un signal incohérent (1 / stations)
+# et à la médiane de la grille : en dessous, le faisceau est plat et aucune direction n'est retenue.
+MIN_CONTRAST = 2.5
+
+
+# Puissance relative du faisceau (0 à 1) sur la grille de lenteurs pour une fenêtre de traces
+# (stations, n) : chaque station est ramenée en phase par son déphasage, les spectres sont sommés
+# et la puissance du faisceau, sommée sur la bande, est rapportée à celle des stations.
+# Hors du disque |s| <= s_max (coins de la grille), la puissance vaut NaN.
+def beam_power(traces, steering, band_index, s_max=None):
+    traces = np.asarray(traces, dtype=np.float64)
+    tapered = (traces - traces.mean(axis=1, keepdims=True)) * np.hanning(traces.shape[1])
+    spectra = real_fft(tapered, pad=False)[1][:, band_index]          # (stations, fréquences)
+    beam = (steering @ spectra.T[:, :, None])[..., 0]
+    total = traces.shape[0] * np.sum(np.abs(spectra) ** 2)
+    n = int(round(np.sqrt(steering.shape[1])))
+    power = (np.sum(np.abs(beam) ** 2, axis=0) / max(total, 1e-30)).reshape(n, n)
+    if s_max is not None:
+        axis = slowness_axis(float(s_max), n)
+        power[np.hypot(*np.meshgrid(axis, axis)) > s_max] = np.nan
+    return power
+
+
+# Azimut de la source (degrés depuis le nord) et vitesse apparente (km/s) d'une lenteur (sx, sy).
+# La lenteur pointe dans le sens de propagation, la source est donc dans la direction opposée.
+def slowness_direction(sx, sy):
+    slowness = np.hypot(sx, sy)
+    return float(np.degrees(np.arctan2(-sx, -sy)) % 360), float(1 / slowness) if slowness > 0 else np.inf
+
+
+# Direction d'arrivée au maximum de la puissance : (azimut de la source en degrés depuis le nord,
+# vitesse apparente en km/s, puissance relative). Si le maximum ne se détache pas (moins de
+# MIN_CONTRAST fois 1 / n_stations ou la médiane de la grille), azimut et vitesse valent NaN.
+def fk_estimate(power, n_stations, s_max=0.5):
+    axis = slowness_axis(float(s_max), power.shape[0])
+    if np.isnan(power).all():
+        return np.nan, np.nan, np.nan
+    iy, ix = np.unravel_index(np.nanargmax(power), power.shape)
+    relative = float(power[iy, ix])
+    if relative < MIN_CONTRAST * max(1 / n_stations, float(np.nanmedian(power))):
+        return np.nan, np.nan, relative
+    return (*slowness_direction(axis[ix], axis[iy]), relative)
+
+
+# Lenteur (sx, sy) en s/km de l'onde plane qui explique au mieux les écarts de temps d'arrivée
+# dt = t_i - t_j entre paires de stations (outils.correlation.differential_times) : dt = s·(r_i - r_j),
+# moindres carrés pondérés par la corrélation. Renvoie (sx, sy, résidu quadratique moyen en s).
+def plane_wave_slowness(x, y, i, j, dt, weights=None):
+    x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+    weights = np.ones(len(dt)) if weights is None else np.clip(weights, 0.0, None)
+    baselines = np.column_stack([x[i] - x[j], y[i] - y[j]])
+    slowness = np.linalg.lstsq(baselines * weights[:, None], weights * dt, rcond=None)[0]
+    residual = np.sqrt(np.mean((baselines @ slowness - dt) ** 2))
+    return float(slowness[0]), float(slowness[1]), float(residual)
+
+
+# Analyse f-k par fenêtres glissantes de window secondes (pas step) : les déphasages sont
+# calculés une seule fois. Renvoie (centres des fenêtres (s), azimuts, vitesses, puissances) ;
+# tout vaut NaN si la bande contient moins de MIN_FREQUENCIES fréquences de la fenêtre.
+def sliding_fk(traces, fs, x, y, band, window, step, s_max=0.5, n_slowness=81):
+    traces = np.asarray(traces, dtype=np.float64)
+    n_window, n_step = int(window * fs), max(1, int(step * fs))
+    freqs = frequency_axis(n_window, 1 / fs)
+    band_index = np.flatnonzero((freqs >= band[0]) & (freqs <= band[1]))
+    steering = steering_vectors(x, y, freqs[band_index], s_max, n_slowness)
+    results = []
+    for start in range(0, traces.shape[1] - n_window + 1, n_step):
+        centre = (start + n_window / 2) / fs
+        if len(band_index) < MIN_FREQUENCIES:
+            results.append((centre, np.nan, np.nan, np.nan))
+            continue
+        power = beam_power(traces[:, start:start + n_window], steering, band_index, s_max)
+        results.append((centre, *fk_estimate(power, traces.shape[0], s_max)))
+    if not results:
+        return (np.empty(0),) * 4
+    return tuple(np.array(column) for column in zip(*results))
@@ -0,0 +1,397 @@
+import datetime
+import hashlib
+import os
+import shutil
+import struct
+
+import numpy as np
+import streamlit as st
+
+from outils.enregistrements import cache_directory
+
+# Fichiers envoyés depuis l'application, rangés par contenu avec le cache des index
+UPLOAD_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                          ".cache_enregistrements", "televersements")
+
+# Taille totale au-delà de laquelle les envois les moins récemment utilisés sont supprimés
+UPLOAD_MAX_BYTES = 1024 * 1024 * 1024
+
+# Index des enregistrements : une ligne par enregistrement miniSEED (une seule par fichier SAC),
+# avec la position de ses données dans le fichier
+INDEX_DTYPE = np.dtype([
+    ("file", "i4"),
+    ("channel", "U24"),          # NET.STA.LOC.CHA
+    ("start", "f8"),             # temps POSIX du premier échantillon
+    ("sampling_rate", "f8"),
+    ("n_samples", "i8"),
+    ("offset", "i8"),            # position des données dans le fichier (octets)
+    ("nbytes", "i8"),
+    ("encoding", "i1"),          # codage SEED : 1 int16, 3 int32, 4 float32, 5 float64, 10 Steim1, 11 Steim2
+    ("big_endian", "?"),
+])
+
+_RAW_ENCODINGS = {1: "i2", 3: "i4", 4: "f4", 5: "f8"}
+_STEIM1, _STEIM2 = 10, 11
+_SAC_HEADER = 632
+_SAC_UNDEFINED = -12345
+
+# Composantes : dernière lettre du code de voie -> composante de l'application
+# (x : Nord-Sud, y : Est-Ouest, z : verticale)
+_COMPONENTS = {"N": "x", "1": "x", "E": "y", "2": "y", "Z": "z"}
+
+
+def _sac_layout(header):
+    for endian in "<>":
+        if struct.unpack_from(endian + "i", header, 280 + 6 * 4)[0] == 6:  # nvhdr
+            return endian
+    return None
+
+
+# En-tête SAC : une seule « ligne » d'index, les données float32 suivant l'en-tête
+def _index_sac(path, endian):
+    with open(path, "rb") as f:
+        header = f.read(_SAC_HEADER)
+    floats = struct.unpack_from(endian + "70f", header, 0)
+    ints = struct.unpack_from(endian + "40i", header, 280)
+    strings = header[440:]
+
+    def text(pos, size=8):
+        value = strings[pos:pos + size].decode("ascii", "replace").strip("\x00 ")
+        return "" if value == str(_SAC_UNDEFINED) else value
+
+    year, jday, hour, minute, sec, msec = ints[:6]
+    reference = datetime.datetime(year, 1, 1, hour, minute, sec, msec * 1000, tzinfo=datetime.timezone.utc)
+    reference += datetime.timedelta(days=jday - 1)
+    b = floats[5] if floats[5] != _SAC_UNDEFINED else 0.0
+    channel = f"{text(168)}.{text(0)}.{text(24)}.{text(160)}"
+    npts = ints[9]
+    # delta est en float32 : fréquence arrondie à sa précision (7 chiffres significatifs)
+    rate = float(f"{1 / floats[0]:.7g}")
+    return np.array([(0, channel, reference.timestamp() + b, rate, npts, _SAC_HEADER, 4 * npts, 4,
+                      endian == ">")], dtype=INDEX_DTYPE)
+
+
+def _column(headers, start, dtype):
+    size = np.dtype(dtype).itemsize
+    return np.ascontiguousarray(headers[:, start:start + size]).view(dtype)[:, 0]
+
+
+# Champs d'une blockette à une position variable d'un enregistrement à l'autre
+def _gather(headers, pos, offset, dtype):
+    size = np.dtype(dtype).itemsize
+    cols = np.clip(pos[:, None] + offset + np.arange(size), 0, headers.shape[1] - 1)
+    return np.ascontiguousarray(headers[np.arange(len(headers))[:, None], cols]).view(dtype)[:, 0]
+
+
+# Décodage vectorisé des en-têtes miniSEED : headers contient les premiers octets de chaque
+# enregistrement (en-tête fixe de 48 octets puis blockettes)
+def _parse_headers(headers, offsets, endian):
+    u2, i2, i4 = endian + "u2", endian + "i2", endian + "i4"
+    n = len(headers)
+
+    # Chaîne des blockettes : on ne garde que 1000 (codage, longueur) et 100 (fréquence exacte)
+    encoding = np.full(n, -1, dtype=np.int8)
+    word_order = np.ones(n, dtype=np.uint8)
+    length_exp = np.zeros(n, dtype=np.uint8)
+    exact_rate = np.full(n, np.nan)
+    pos = _column(headers, 46, u2).astype(np.int64)
+    for _ in range(8):
+        active = (pos >= 48) & (pos + 8 <= headers.shape[1])
+        if not active.any():
+            break
+        kind = np.where(active, _gather(headers, pos, 0, u2), 0)
+        b1000 = kind == 1000
+        encoding[b1000] = _gather(headers, pos, 4, "u1")[b1000].astype(np.int8)
+        word_order[b1000] = _gather(headers, pos, 5, "u1")[b1000]
+        length_exp[b1000] = _gather(headers, pos, 6, "u1")[b1000]
+        b100 = kind == 100
+        exact_rate[b100] = _gather(headers, pos, 4, endian + "f4")[b100]
+        pos = np.where(active, _gather(headers, pos, 2, u2), 0).astype(np.int64)
+    if (encoding < 0).any():
+        raise ValueError("enregistrement miniSEED sans blockette 1000 (codage et longueur inconnus)")
+
+    # Début : BTIME (année, jour, h, min, s, 1/10000 s) et correction de temps si non appliquée
+    years = (_column(headers, 20, u2).astype(np.int64) - 1970).astype("datetime64[Y]")
+    days = years.astype("datetime64[D]").astype(np.int64) + _column(headers, 22, u2) - 1
+    start = (days * 86400.0 + headers[:, 24] * 3600.0 + headers[:, 25] * 60.0 + headers[:, 26]
+             + _column(headers, 28, u2) * 1e-4)
+    correction = _column(headers, 40, i4) * 1e-4
+    start += np.where(headers[:, 36] & 0x02, 0.0, correction)
+
+    # Fréquence : facteur et multiplicateur (convention SEED), ou blockette 100
+    factor = _column(headers, 32, i2).astype(np.float64)
+    mult = _column(headers, 34, i2).astype(np.float64)
+    with np.errstate(divide="ignore"):
+        f = np.where(factor > 0, factor, -1 / factor)
+        m = np.where(mult > 0, mult, -1 / mult)
+    rate = np.where(np.isnan(exact_rate), np.where((factor == 0) | (mult == 0), 0.0, f * m), exact_rate)
+
+    codes = np.ascontiguousarray(headers[:, 8:20])
+    unique, inverse = np.unique(codes, axis=0, return_inverse=True)
+    names = []
+    for row in unique:
+        raw = bytes(row).decode("ascii", "replace")
+        sta, loc, cha, net = raw[0:5].strip(), raw[5:7].strip(), raw[7:10].strip(), raw[10:12].strip()
+        names.append(f"{net}.{sta}.{loc}.{cha}")
+
+    index = np.empty(n, dtype=INDEX_DTYPE)
+    index["file"] = 0
+    index["channel"] = np.array(names)[inverse.ravel()]
+    index["start"] = start
+    index["sampling_rate"] = rate
+    index["n_samples"] = _column(headers, 30, u2)
+    data_offset = _column(headers, 44, u2).astype(np.int64)
+    index["offset"] = offsets + data_offset
+    index["nbytes"] = (np.int64(1) << length_exp.astype(np.int64)) - data_offset
+    index["encoding"] = encoding
+    index["big_endian"] = word_order == 1
+    return index, length_exp
+
+
+# Index d'un fichier miniSEED. Cas courant : enregistrements de longueur fixe, lus d'un
+# coup par projection en mémoire (aucune boucle Python sur les millions d'enregistrements
+# d'un volume journalier) ; sinon, parcours enregistrement par enregistrement.
+def _index_miniseed(path):
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        first = f.read(256)
+    endian = ">" if 1900 <= struct.unpack_from(">H", first, 20)[0] <= 2500 else "<"
+    index, length_exp = _parse_headers(np.frombuffer(first, dtype=np.uint8)[None, :], np.zeros(1, np.int64),
+                                       endian)
+    length = 1 << int(length_exp[0])
+    width = min(length, 256)
+
+    if size % length == 0:
+        records = np.memmap(path, dtype=np.uint8, mode="r", shape=(size // length, length))
+        # Chaque tranche doit bien commencer par un en-tête (indicateur de qualité D, R, Q ou M)
+        if np.isin(records[:, 6], np.frombuffer(b"DRQM", dtype=np.uint8)).all():
+            try:
+                index, length_exp = _parse_headers(records[:, :width], np.arange(len(records)) * length, endian)
+            except ValueError:
+                length_exp = None
+            if length_exp is not None and (length_exp == length_exp[0]).all():
+                return index
+
+    headers, offsets = [], []
+    with open(path, "rb") as f:
+        pos = 0
+        while pos < size:
+            f.seek(pos)
+            header = np.frombuffer(f.read(256).ljust(256, b"\0"), dtype=np.uint8)
+            _, exp = _parse_headers(header[None, :], np.zeros(1, np.int64), endian)
+            headers.append(header)
+            offsets.append(pos)
+            pos += 1 << int(exp[0])
+    return _parse_headers(np.stack(headers), np.array(offsets, dtype=np.int64), endian)[0]
+
+
+# Index d'un fichier miniSEED ou SAC, construit une seule fois puis relu depuis le cache
+def build_index(path, cache_dir=None):
+    directory = cache_directory(path, cache_dir)
+    index_path = os.path.join(directory, "index.npy")
+    if os.path.exists(index_path):
+        return np.load(index_path)
+
+    with open(path, "rb") as f:
+        header = f.read(_SAC_HEADER)
+    endian = _sac_layout(header) if len(header) == _SAC_HEADER else None
+    if endian is not None and os.path.getsize(path) == _SAC_HEADER + 4 * struct.unpack_from(
+            endian + "i", header, 280 + 9 * 4)[0]:
+        index = _index_sac(path, endian)
+    else:
+        index = _index_miniseed(path)
+    index = index[np.lexsort((index["start"], index["channel"]))]
+
+    os.makedirs(directory, exist_ok=True)
+    with open(index_path + ".tmp", "wb") as f:
+        np.save(f, index)
+    os.replace(index_path + ".tmp", index_path)
+    return index
+
+
+def _sign_extend(values, bits):
+    return values - (((values >> (bits - 1)) & 1) << bits)
+
+
+# Champs signés de bits bits, count par mot, lus depuis les poids forts de la zone utile
+def _fields(words, bits, count):
+    shifts = bits * np.arange(count - 1, -1, -1, dtype=np.int64)
+    return _sign_extend((words[:, None] >> shifts) & ((1 << bits) - 1), bits)
+
+
+# Décompression Steim 1 ou 2 d'un enregistrement : trames de 16 mots de 32 bits,
+# le premier mot donnant le découpage (« nibbles ») des 15 autres en différences
+def decode_steim(data, n_samples, level, big_endian=True):
+    words = np.frombuffer(data, dtype=">u4" if big_endian else "<u4")
+    frames = words[:len(words) // 16 * 16].reshape(-1, 16).astype(np.int64)
+    if not len(frames) or not n_samples:
+        return np.empty(0, dtype=np.int32)
+    nibbles = (frames[:, :1] >> (30 - 2 * np.arange(16))) & 3
+    words, nibbles = frames.ravel(), nibbles.ravel()
+    dnib = words >> 30
+
+    cases = [(nibbles == 1, 8, 4)]
+    if level == 1:
+        cases += [(nibbles == 2, 16, 2), (nibbles == 3, 32, 1)]
+    else:
+        cases += [
+            ((nibbles == 2) & (dnib == 1), 30, 1), ((nibbles == 2) & (dnib == 2), 15, 2),
+            ((nibbles == 2) & (dnib == 3), 10, 3), ((nibbles == 3) & (dnib == 0), 6, 5),
+            ((nibbles == 3) & (dnib == 1), 5, 6), ((nibbles == 3) & (dnib == 2), 4, 7),
+        ]
+    values = np.zeros((len(words), 7), dtype=np.int64)
+    counts = np.zeros(len(words), dtype=np.int64)
+    for mask, bits, count in cases:
+        values[mask, :count] = _fields(words[mask], bits, count)
+        counts[mask] = count
+    diffs = values[np.arange(7) < counts[:, None]]
+    if len(diffs) < n_samples:
+        raise ValueError("enregistrement Steim incomplet")
+
+    # X0 (mot 1 de la première trame) puis sommes des différences ; la première
+    # différence se rapporte à l'enregistrement précédent et est ignorée
+    x0 = _sign_extend(frames[0, 1], 32)
+    samples = np.empty(n_samples, dtype=np.int64)
+    samples[0] = x0
+    samples[1:] = x0 + np.cumsum(diffs[1:n_samples])
+    return samples.astype(np.int32)
+
+
+# Échantillons [i0, i1) d'un enregistrement : lecture directe pour les codages non compressés,
+# décompression de l'enregistrement (quelques kilo-octets) sinon
+def _decode(f, entry, i0, i1):
+    encoding = int(entry["encoding"])
+    endian = ">" if entry["big_endian"] else "<"
+    if encoding in _RAW_ENCODINGS:
+        dtype = np.dtype(endian + _RAW_ENCODINGS[encoding])
+        f.seek(int(entry["offset"]) + i0 * dtype.itemsize)
+        return np.frombuffer(f.read((i1 - i0) * dtype.itemsize), dtype=dtype)
+    if encoding in (_STEIM1, _STEIM2):
+        f.seek(int(entry["offset"]))
+        data = f.read(int(entry["nbytes"]))
+        return decode_steim(data, int(entry["n_samples"]), 1 if encoding == _STEIM1 else 2,
+                            bool(entry["big_endian"]))[i0:i1]
+    raise ValueError(f"codage miniSEED {encoding} non pris en charge")
+
+
+# Ensemble de fichiers miniSEED / SAC indexés. Une fenêtre (voie, t0, t1) est localisée par
+# recherche dichotomique dans l'index, et seuls les enregistrements qui la recouvrent sont lus.
+class WaveformArchive:
+    def __init__(self, paths, cache_dir=None):
+        self.paths = list(paths)
+        indexes = []
+        for i, path in enumerate(self.paths):
+            index = build_index(path, cache_dir).copy()
+            index["file"] = i
+            indexes.append(index)
+        index = np.concatenate(indexes) if indexes else np.empty(0, dtype=INDEX_DTYPE)
+        self.index = index[np.lexsort((index["start"], index["channel"]))]
+        self.ends = self.index["start"] + self.index["n_samples"] / self.index["sampling_rate"]
+        names, first = np.unique(self.index["channel"], return_index=True)
+        bounds = list(first) + [len(self.index)]
+        self._slices = {str(name): slice(bounds[i], bounds[i + 1]) for i, name in enumerate(names)}
+
+    def channels(self):
+        return [str(name) for name in self._slices]
+
+    # Capteurs (NET.STA.LOC.bande) dont au moins une composante est reconnue
+    def stations(self):
+        return sorted({name[:-1] for name in self._slices if name[-1:] in _COMPONENTS})
+
+    # Début et fin (temps POSIX) des données d'une voie ou d'un capteur
+    def span(self, name):
+        parts = [s for channel, s in self._slices.items() if channel == name or channel[:-1] == name]
+        return (min(self.index["start"][s][0] for s in parts), max(self.ends[s][-1] for s in parts))
+
+    # Fenêtre [t_start, t_end) d'une voie : (temps du premier échantillon, fréquence, échantillons).
+    # Les trous entre enregistrements sont remplis de NaN.
+    def read(self, channel, t_start=None, t_end=None):
+        s = self._slices[channel]
+        entries, ends = self.index[s], self.ends[s]
+        first = 0 if t_start is None else int(np.searchsorted(ends, t_start, side="right"))
+        last = len(entries) if t_end is None else int(np.searchsorted(entries["start"], t_end, side="left"))
+        fs = float(entries["sampling_rate"][0])
+        if last <= first:
+            return (t_start if t_start is not None else entries["start"][0]), fs, np.empty(0)
+
+        selected = entries[first:last]
+        t0 = float(selected["start"][0])
+        if t_start is not None and t_start > t0:
+            # Premier échantillon de la fenêtre (tolérance : précision des temps POSIX en float64)
+            t0 += np.ceil((t_start - t0) * fs - 1e-3) / fs
+        t1 = float(ends[last - 1] if t_end is None else min(t_end, ends[last - 1]))
+        out = np.full(max(int(round((t1 - t0) * fs)), 0), np.nan)
+
+        handles = {}
+        try:
+            for entry in selected:
+                pos = int(round((entry["start"] - t0) * fs))
+                i0, i1 = max(0, -pos), min(int(entry["n_samples"]), len(out) - pos)
+                if i1 <= i0:
+                    continue
+                f = handles.get(entry["file"])
+                if f is None:
+                    f = handles[entry["file"]] = open(self.paths[entry["file"]], "rb")
+                out[pos + i0:pos + i1] = _decode(f, entry, i0, i1)
+        finally:
+            for f in handles.values():
+                f.close()
+        return t0, fs, out
+
+    # Fenêtre des trois composantes d'un capteur, en secondes depuis t_start :
+    # (temps, signal_x, signal_y, signal_z). Trous et composantes absentes valent zéro.
+    def read_station(self, station, t_start, t_end):
+        traces = {}
+        for channel in self._slices:
+            if channel[:-1] == station and channel[-1:] in _COMPONENTS:
+                traces[_COMPONENTS[channel[-1]]] = self.read(channel, t_start, t_end)
+        t0, fs, _ = next(iter(traces.values()))
+        n = min(len(data) for _, _, data in traces.values())
+        signals = [np.nan_to_num(traces[c][2][:n]) if c in traces else np.zeros(n) for c in "xyz"]
+        return ((t0 - t_start) + np.arange(n) / fs, *signals)
+
+
+# Fichier envoyé depuis l'application, écrit une fois sous un nom dérivé de son contenu.
+# Sa date de modification sert de date de dernière utilisation pour l'éviction.
+def save_upload(data, name, max_bytes=UPLOAD_MAX_BYTES):
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    key = hashlib.blake2b(data, digest_size=16).hexdigest()
+    path = os.path.join(UPLOAD_DIR, f"{key}_{os.path.basename(name)}")
+    if os.path.exists(path):
+        os.utime(path)
+    else:
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(path + ".tmp", path)
+        _evict_uploads(max_bytes, keep=path)
+    return path
+
+
+# Supprime les envois les moins récemment utilisés (et le cache de leur index) jusqu'à
+# repasser sous max_bytes. Les fichiers d'une session active sont réenregistrés à chaque
+# exécution de la page, donc récents : ce sont les derniers à partir.
+def _evict_uploads(max_bytes, keep):
+    files = []
+    for entry in os.scandir(UPLOAD_DIR):
+        if entry.is_file() and not entry.name.endswith(".tmp"):
+            info = entry.stat()
+            files.append((info.st_mtime_ns, info.st_size, entry.path))
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        try:
+            index_dir = cache_directory(path, os.path.dirname(UPLOAD_DIR))
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+        shutil.rmtree(index_dir, ignore_errors=True)
+        total -= size
+
+
+# Archive partagée entre les sessions pour un ensemble de fichiers
+@st.cache_resource(max_entries=8)
+def get_archive(paths):
+    return WaveformArchive(paths, cache_dir=os.path.dirname(UPLOAD_DIR))
@@ -0,0 +1,83 @@
+import numpy as np
+import plotly.graph_objects as go
+from scipy.signal import find_peaks, get_window
+
+from outils.fourier import real_fft
+
+
+# Détection des pics du spectre : vrais maxima locaux au-dessus d'un seuil,
+# limités aux max_peaks plus hauts (tous si None), renvoyés dans l'ordre des fréquences
+def find_spectrum_peaks(amplitude, height, max_peaks=20):
+    peaks, props = find_peaks(amplitude, height=height)
+    if max_peaks is not None and len(peaks) > max_peaks:
+        plus_hauts = np.argsort(props["peak_heights"])[::-1][:max_peaks]
+        peaks = np.sort(peaks[plus_hauts])
+    return peaks
+
+
+# Traces des pics : une seule ligne pour toutes les tiges (séparées par des NaN)
+# et une seule trace texte pour les marqueurs et les étiquettes
+def peak_traces(freqs, amps, color="red"):
+    n = len(freqs)
+    x_tiges = np.empty(3 * n)
+    y_tiges = np.empty(3 * n)
+    x_tiges[0::3] = freqs
+    x_tiges[1::3] = freqs
+    x_tiges[2::3] = np.nan
+    y_tiges[0::3] = 0
+    y_tiges[1::3] = amps
+    y_tiges[2::3] = np.nan
+
+    tiges = go.Scatter(
+        x=x_tiges, y=y_tiges,
+        mode="lines",
+        line=dict(color=color, width=1.5),
+        opacity=0.8,
+        hoverinfo="skip",
+    )
+    etiquettes = go.Scatter(
+        x=freqs, y=amps,
+        mode="markers+text",
+        marker=dict(color=color, size=4),
+        text=[f"{freq:.1f} Hz" for freq in freqs],
+        textposition="top center",
+        textfont=dict(size=10),
+    )
+    return [tiges, etiquettes]
+
+
+# Estimation des pics à une fraction de case près, pour tous les pics à la fois.
+# Le signal est fenêtré (Hann) pour limiter les fuites, puis la position du pic entre
+# deux cases est interpolée : estimateur de Jacobsen (rapport des cases complexes voisines,
+# facteur 2 pour la fenêtre de Hann) ou parabole sur le log-amplitude ("quadratic").
+# Amplitude et phase sont corrigées de la réponse de la fenêtre à ce décalage.
+# height est un seuil absolu, relative un seuil en fraction du plus grand pic.
+# Renvoie (fréquences, amplitudes, phases à t = 0), triées par fréquence.
+def estimate_peaks(y, d, height=None, relative=None, max_peaks=20, method="jacobsen"):
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    window = get_window("hann", n)
+    gain = 2.0 / window.sum()
+    f, spectrum = real_fft(y * window, d, pad=False)
+    amplitude = np.abs(spectrum) * gain
+
+    seuil = 0.0 if height is None else height
+    if relative is not None:
+        seuil = max(seuil, relative * amplitude.max())
+    k = find_spectrum_peaks(amplitude, height=seuil, max_peaks=max_peaks)
+    k = k[(k > 0) & (k < len(spectrum) - 1)]
+
+    a, b, c = spectrum[k - 1], spectrum[k], spectrum[k + 1]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        if method == "quadratic":
+            la, lb, lc = np.log(np.abs(a)), np.log(np.abs(b)), np.log(np.abs(c))
+            delta = 0.5 * (la - lc) / (la - 2 * lb + lc)
+        else:
+            delta = 2 * np.real((a - c) / (2 * b - a - c))
+    delta = np.clip(np.nan_to_num(delta), -0.5, 0.5)
+    freqs = (k + delta) / (n * d)
+
+    # Correction de la fenêtre de Hann pour un pic décalé de delta case :
+    # gain |sinc(delta)| / (1 - delta²) et déphasage de pi * delta
+    attenuation = np.sinc(delta) / (1 - delta ** 2)
+    return freqs, np.abs(b) * gain / attenuation, np.angle(b * np.exp(-1j * np.pi * delta))
@@ -0,0 +1,67 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.signal import get_window
+
+from outils.fourier import frequency_axis, real_fft
+
+
+# Spectrogramme en dB (float32), mêmes conventions que scipy.signal.spectrogram
+# (fenêtre de Tukey, détendance constante, densité spectrale unilatérale).
+# Les trames sont traitées par paquets de chunk_frames pour borner la mémoire
+# sur les longs enregistrements ; f_max permet de ne garder que la bande utile.
+def compute_spectrogram_db(y, fs, nperseg=2048, noverlap=1024, f_max=None, chunk_frames=256):
+    y = np.asarray(y, dtype=np.float64)
+    if len(y) < nperseg:
+        nperseg, noverlap = len(y), len(y) // 2
+    step = nperseg - noverlap
+    window = get_window(("tukey", 0.25), nperseg)
+    scale = 1.0 / (fs * np.sum(window ** 2))
+
+    f = frequency_axis(nperseg, 1 / fs)
+    n_freqs = len(f) if f_max is None else int(np.searchsorted(f, f_max, side="right"))
+    f = f[:n_freqs]
+    # Spectre unilatéral : on double tout sauf la composante continue (et Nyquist)
+    last_doubled = min(n_freqs, nperseg // 2 if nperseg % 2 == 0 else nperseg // 2 + 1)
+
+    frames = sliding_window_view(y, nperseg)[::step]
+    n_frames = len(frames)
+    t = (np.arange(n_frames) * step + nperseg / 2) / fs
+
+    Sdb = np.empty((n_freqs, n_frames), dtype=np.float32)
+    for start in range(0, n_frames, chunk_frames):
+        block = frames[start:start + chunk_frames]
+        block = (block - block.mean(axis=1, keepdims=True)) * window
+        power = np.abs(real_fft(block, pad=False, axis=1)[1][:, :n_freqs]) ** 2 * scale
+        power[:, 1:last_doubled] *= 2
+        Sdb[:, start:start + len(block)] = (10 * np.log10(power + 1e-10)).T
+    return f, t, Sdb
+
+
+# Moyenne par paquets le long d'un axe pour ne garder qu'au plus n_bins valeurs
+def _bin_average(values, n_bins, axis):
+    n = values.shape[axis]
+    if n <= n_bins:
+        return values
+    edges = np.linspace(0, n, n_bins + 1).astype(int)
+    sums = np.add.reduceat(values, edges[:-1], axis=axis)
+    counts = np.diff(edges)
+    shape = [1] * values.ndim
+    shape[axis] = len(counts)
+    return (sums / counts.reshape(shape)).astype(values.dtype)
+
+
+# Tuile d'affichage : bande [f_min, f_max] moyennée sur une grille de n_rows x n_cols pixels.
+# La moyenne porte sur les puissances, reconverties ensuite en dB : moyenner des dB
+# sous-estimerait les cases et étalerait les pics.
+def display_tile(f, t, Sdb, f_min=0.0, f_max=None, n_rows=300, n_cols=800):
+    f_max = f[-1] if f_max is None else f_max
+    i0 = np.searchsorted(f, f_min, side="left")
+    i1 = np.searchsorted(f, f_max, side="right")
+    f, Sdb = f[i0:i1], Sdb[i0:i1]
+    if Sdb.shape[0] > n_rows or Sdb.shape[1] > n_cols:
+        power = np.power(np.float32(10.0), Sdb / np.float32(10.0))
+        power = _bin_average(_bin_average(power, n_rows, axis=0), n_cols, axis=1)
+        Sdb = (10 * np.log10(power)).astype(np.float32)
+    f = _bin_average(f, n_rows, axis=0)
+    t = _bin_average(t, n_cols, axis=0)
+    return f, t, Sdb
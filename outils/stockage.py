@@ -0,0 +1,240 @@
+import hashlib
+import json
+import os
+import threading
+import types
+from collections import OrderedDict
+
+import numpy as np
+import streamlit as st
+
+# Dossier par défaut du stock de formes d'onde (WAVEFORM_STORE_DIR pour le changer)
+STORE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                         ".cache_enregistrements", "formes_onde")
+
+
+# Stock de formes d'onde sur disque, par station et par composante :
+#   <racine>/<station>/<composante>/meta.json   (t0, fs, dtype, taille des morceaux, nombre d'échantillons)
+#   <racine>/<station>/<composante>/000000.npy  (morceaux de chunk_samples échantillons)
+# L'échantillonnage étant régulier, l'index temporel est implicite : l'échantillon du temps t
+# est round((t - t0) * fs), dans le morceau numéro // chunk_samples. Une fenêtre (t0, t1) ne
+# touche donc que les morceaux qui la recouvrent. Les morceaux .npy sont projetés en mémoire ;
+# une composante peut être compressée (.npz), ses morceaux décompressés restant en cache LRU.
+class WaveformStore:
+    def __init__(self, root, chunk_samples=360_000, max_cached_chunks=16):
+        self.root = root
+        self.chunk_samples = chunk_samples
+        self.max_cached_chunks = max_cached_chunks
+        self._chunks = OrderedDict()
+        self._lock = threading.Lock()
+        self._station_locks = {}
+
+    def _dir(self, station, component):
+        return os.path.join(self.root, str(station), str(component))
+
+    def _chunk_path(self, station, component, index, compressed):
+        return os.path.join(self._dir(station, component), f"{index:06d}.{'npz' if compressed else 'npy'}")
+
+    # Verrou d'écriture d'une station : sérialise les sessions qui la créent en même temps
+    def station_lock(self, station):
+        with self._lock:
+            return self._station_locks.setdefault(str(station), threading.Lock())
+
+    # Composantes présentes : [(station, composante)]
+    def channels(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(
+            (station, component)
+            for station in os.listdir(self.root)
+            for component in os.listdir(os.path.join(self.root, station))
+            if os.path.exists(os.path.join(self.root, station, component, "meta.json"))
+        )
+
+    def has(self, station, component):
+        return os.path.exists(os.path.join(self._dir(station, component), "meta.json"))
+
+    # Métadonnées d'une composante (KeyError si elle n'existe pas)
+    def info(self, station, component):
+        path = os.path.join(self._dir(station, component), "meta.json")
+        if not os.path.exists(path):
+            raise KeyError((station, component))
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_info(self, station, component, meta):
+        path = os.path.join(self._dir(station, component), "meta.json")
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, path)
+
+    def _read_chunk(self, station, component, index, meta):
+        if not meta["compressed"]:
+            return np.load(self._chunk_path(station, component, index, False), mmap_mode="r")
+        key = (station, component, index)
+        with self._lock:
+            if key in self._chunks:
+                self._chunks.move_to_end(key)
+                return self._chunks[key]
+        with np.load(self._chunk_path(station, component, index, True)) as archive:
+            chunk = archive["data"]
+        chunk.flags.writeable = False
+        with self._lock:
+            self._chunks[key] = chunk
+            while len(self._chunks) > self.max_cached_chunks:
+                self._chunks.popitem(last=False)
+        return chunk
+
+    # Ajout d'échantillons à la fin d'une composante (créée au premier ajout). Un trou entre
+    # la fin actuelle et start_time est comblé par des NaN ; un recouvrement est refusé.
+    def append(self, station, component, data, sampling_rate=None, start_time=None, compressed=False):
+        data = np.asarray(data)
+        if self.has(station, component):
+            meta = self.info(station, component)
+            if start_time is not None:
+                gap = int(round((start_time - meta["t0"]) * meta["sampling_rate"])) - meta["n_samples"]
+                if gap < 0:
+                    raise ValueError(f"{station}/{component} : les données recouvrent celles déjà stockées")
+                if gap:
+                    data = np.concatenate([np.full(gap, np.nan, dtype=meta["dtype"]), data])
+        else:
+            if sampling_rate is None:
+                raise ValueError("sampling_rate est obligatoire pour une nouvelle composante")
+            os.makedirs(self._dir(station, component), exist_ok=True)
+            meta = {
+                "t0": float(start_time or 0.0),
+                "sampling_rate": float(sampling_rate),
+                "dtype": np.dtype(data.dtype).str,
+                "chunk_samples": self.chunk_samples,
+                "n_samples": 0,
+                "compressed": bool(compressed),
+            }
+        data = data.astype(meta["dtype"], copy=False)
+        chunk_samples = meta["chunk_samples"]
+
+        pos = meta["n_samples"]
+        done = 0
+        while done < len(data):
+            index, offset = divmod(pos, chunk_samples)
+            n = min(chunk_samples - offset, len(data) - done)
+            self._write_chunk(station, component, index, offset, data[done:done + n], meta)
+            pos += n
+            done += n
+        meta["n_samples"] = pos
+        # Métadonnées mises à jour en dernier : une écriture interrompue reste invisible
+        self._write_info(station, component, meta)
+
+    def _write_chunk(self, station, component, index, offset, values, meta):
+        path = self._chunk_path(station, component, index, meta["compressed"])
+        if meta["compressed"]:
+            previous = self._read_chunk(station, component, index, meta)[:offset] if offset else values[:0]
+            with open(path + ".tmp", "wb") as f:
+                np.savez_compressed(f, data=np.concatenate([previous, values]))
+            os.replace(path + ".tmp", path)
+            with self._lock:
+                self._chunks.pop((station, component, index), None)
+            return
+        end = offset + len(values)
+        chunk = np.load(path, mmap_mode="r+") if os.path.exists(path) else None
+        if chunk is not None and len(chunk) >= end:
+            chunk[offset:end] = values
+            chunk.flush()
+            return
+        # Morceau créé (ou agrandi) juste à la taille des données : le dernier morceau
+        # n'occupe pas chunk_samples échantillons sur le disque
+        grown = np.lib.format.open_memmap(path + ".tmp", mode="w+", dtype=meta["dtype"], shape=(end,))
+        if chunk is not None:
+            grown[:offset] = chunk[:offset]
+        grown[offset:end] = values
+        grown.flush()
+        del grown, chunk
+        os.replace(path + ".tmp", path)
+
+    # Fenêtre [t_start, t_end) d'une composante (bornes None : début / fin des données).
+    # Renvoie (temps du premier échantillon, échantillons) ; une fenêtre contenue dans un
+    # seul morceau non compressé est une vue projetée en mémoire, sans copie.
+    def read(self, station, component, t_start=None, t_end=None):
+        meta = self.info(station, component)
+        fs, chunk_samples = meta["sampling_rate"], meta["chunk_samples"]
+        i0 = 0 if t_start is None else int(round((t_start - meta["t0"]) * fs))
+        i1 = meta["n_samples"] if t_end is None else int(round((t_end - meta["t0"]) * fs))
+        i0, i1 = max(i0, 0), min(max(i1, 0), meta["n_samples"])
+        if i1 <= i0:
+            return meta["t0"] + i0 / fs, np.empty(0, dtype=meta["dtype"])
+
+        parts = []
+        for index in range(i0 // chunk_samples, (i1 - 1) // chunk_samples + 1):
+            chunk = self._read_chunk(station, component, index, meta)
+            start = max(i0 - index * chunk_samples, 0)
+            end = min(i1 - index * chunk_samples, chunk_samples)
+            parts.append(chunk[start:end])
+        data = parts[0] if len(parts) == 1 else np.concatenate(parts)
+        return meta["t0"] + i0 / fs, data
+
+
+# Composantes d'une station sismique dans le stock
+COMPONENTS = ("x", "y", "z")
+
+
+# Écrit les trois composantes d'une station si elles n'y sont pas encore ; compute() n'est
+# appelé qu'à ce moment-là et renvoie (signal_x, signal_y, signal_z). Deux sessions qui
+# ouvrent la page en même temps : la seconde attend la première puis relit ses données.
+def ensure_station(store, station, compute, sampling_rate, start_time=0.0, compressed=False):
+    if all(store.has(station, component) for component in COMPONENTS):
+        return
+    with store.station_lock(station):
+        if all(store.has(station, component) for component in COMPONENTS):
+            return
+        for component, data in zip(COMPONENTS, compute()):
+            if not store.has(station, component):
+                store.append(station, component, data, sampling_rate, start_time, compressed)
+
+
+def _hash_code(h, code):
+    h.update(code.co_code)
+    h.update(repr(code.co_names).encode())
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            _hash_code(h, const)
+        else:
+            h.update(repr(const).encode())
+
+
+# Nom de station pour des données générées : name suivi d'une empreinte du code des fonctions
+# qui les produisent et de leurs paramètres. Modifier le générateur crée une nouvelle station
+# au lieu de relire les anciennes traces depuis le disque.
+def generated_station(name, *functions, params=()):
+    h = hashlib.blake2b(digest_size=6)
+    for function in functions:
+        _hash_code(h, function.__code__)
+    h.update(repr(params).encode())
+    return f"{name}_{h.hexdigest()}"
+
+
+# Nom de station pour des données lues d'une source (fichier, rang dans le fichier...) :
+# name suivi d'une empreinte de la source. Deux enregistrements qui partagent un code de
+# station ne réutilisent ni n'écrasent les morceaux l'un de l'autre.
+def source_station(name, source):
+    return f"{name}_{hashlib.blake2b(str(source).encode(), digest_size=6).hexdigest()}"
+
+
+# Fenêtre [t_start, t_end) des trois composantes d'une station, en secondes depuis le début
+# de l'enregistrement : (temps, signal_x, signal_y, signal_z)
+def read_station(store, station, t_start=None, t_end=None):
+    meta = store.info(station, COMPONENTS[0])
+    t0 = meta["t0"]
+    traces = [store.read(station, component,
+                         None if t_start is None else t0 + t_start,
+                         None if t_end is None else t0 + t_end)
+              for component in COMPONENTS]
+    first = traces[0][0] - t0
+    n = min(len(data) for _, data in traces)
+    time = first + np.arange(n) / meta["sampling_rate"]
+    return (time, *(data[:n] for _, data in traces))
+
+
+# Stock partagé entre toutes les sessions
+@st.cache_resource
+def get_waveform_store():
+    return WaveformStore(os.environ.get("WAVEFORM_STORE_DIR", STORE_DIR))
@@ -0,0 +1,130 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import streamlit as st
+
+from outils.fourier import fast_length, frequency_axis, real_fft, zoom_transform
+
+
+# Synthétiseur de sommes de cosinus A cos(2π f t + φ) sur une grille de temps fixe.
+# Chaque forme d'onde unitaire cos(2π f t + φ), ainsi que son spectre, est mémorisée séparément
+# (LRU borné en mémoire) : changer une amplitude ne recalcule rien, ajouter ou modifier une
+# composante ne calcule qu'elle. Le spectre d'une somme est la somme pondérée des spectres.
+class Synthesizer:
+    def __init__(self, time, max_bytes=256 * 1024 * 1024, chunk_components=8):
+        self.time = np.array(time, dtype=np.float64)
+        self.time.flags.writeable = False
+        self.max_bytes = max_bytes
+        self.chunk_components = chunk_components
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    # Formes d'onde manquantes calculées d'un bloc (chunk_components lignes à la fois)
+    def _compute_waves(self, keys):
+        params = np.array(keys, dtype=np.float64).reshape(-1, 2)
+        for start in range(0, len(params), self.chunk_components):
+            f, phi = params[start:start + self.chunk_components].T
+            yield from np.cos(2 * np.pi * f[:, None] * self.time + phi[:, None])
+
+    # Spectres manquants : FFT réelles d'un bloc de formes d'onde
+    def _compute_spectra(self, keys):
+        for start in range(0, len(keys), self.chunk_components):
+            waves = np.stack(self.waves(*zip(*keys[start:start + self.chunk_components])))
+            yield from real_fft(waves, self.time[1] - self.time[0], axis=1)[1]
+
+    def _lookup(self, kind, keys, compute):
+        found = {}
+        with self._lock:
+            for key in keys:
+                if (kind, key) in self._entries:
+                    self._entries.move_to_end((kind, key))
+                    found[key] = self._entries[(kind, key)]
+        missing = list(dict.fromkeys(key for key in keys if key not in found))
+        if missing:
+            computed = dict(zip(missing, compute(missing)))
+            with self._lock:
+                for key, value in computed.items():
+                    value.flags.writeable = False
+                    if (kind, key) not in self._entries:
+                        self._entries[(kind, key)] = value
+                        self.size += value.nbytes
+                # Éviction des entrées les moins récemment utilisées
+                while self.size > self.max_bytes and self._entries:
+                    _, old = self._entries.popitem(last=False)
+                    self.size -= old.nbytes
+            found.update(computed)
+        return [found[key] for key in keys]
+
+    # Formes d'onde unitaires pour une liste de (fréquence, phase)
+    def waves(self, frequencies, phases):
+        keys = [(float(f), float(phi)) for f, phi in zip(frequencies, phases)]
+        return self._lookup("onde", keys, self._compute_waves)
+
+    # Signal somme des composantes (tableaux ou listes de même longueur)
+    def signal(self, amplitudes, frequencies, phases):
+        x = np.zeros_like(self.time)
+        for amplitude, wave in zip(amplitudes, self.waves(frequencies, phases)):
+            if amplitude:
+                x += amplitude * wave
+        return x
+
+    # Spectre complexe (FFT réelle, longueur rapide) du signal somme, sans nouvelle FFT
+    # dès que les composantes ont déjà été vues : (fréquences, spectre)
+    def spectrum(self, amplitudes, frequencies, phases):
+        keys = [(float(f), float(phi)) for f, phi in zip(frequencies, phases)]
+        n = fast_length(len(self.time))
+        total = np.zeros(n // 2 + 1, dtype=complex)
+        for amplitude, spectrum in zip(amplitudes, self._lookup("spectre", keys, self._compute_spectra)):
+            if amplitude:
+                total += amplitude * spectrum
+        return frequency_axis(n, self.time[1] - self.time[0]), total
+
+    # Bruit blanc gaussien unitaire à graine fixe, et son spectre, calculés une seule fois
+    def noise(self, seed=0):
+        return self._lookup("bruit", [seed], lambda seeds: (
+            np.random.default_rng(seed).standard_normal(len(self.time)) for seed in seeds))[0]
+
+    def noise_spectrum(self, seed=0):
+        return self._lookup("spectre_bruit", [seed], lambda seeds: (
+            real_fft(self.noise(seed), self.time[1] - self.time[0])[1] for seed in seeds))[0]
+
+    # DTFT exacte des cosinus unitaires sur une grille de fréquences (noyau de Dirichlet) :
+    # quelques opérations par point, sans FFT ni transformée en Z chirp
+    def _cosine_dtft(self, frequencies, phases, f):
+        d, n = self.time[1] - self.time[0], len(self.time)
+
+        def dirichlet(mu):
+            half = np.pi * mu * d
+            den = np.sin(half)
+            ratio = np.divide(np.sin(n * half), den, out=np.full_like(half, float(n)), where=np.abs(den) > 1e-12)
+            return np.exp(-1j * half * (n - 1)) * ratio
+
+        return [0.5 * (np.exp(1j * phi) * dirichlet(f - freq) + np.exp(-1j * phi) * dirichlet(f + freq))
+                for freq, phi in zip(frequencies, phases)]
+
+    # Spectre d'amplitude zoomé du signal somme (plus le bruit d'amplitude noise) sur n_points
+    # fréquences de [f_min, f_max] : (fréquences, |X| * 2 / N) comme zoom_spectrum. Les cosinus
+    # sont calculés exactement ; seul le bruit passe par la transformée en Z chirp, une fois par
+    # bande (mémorisée) : bouger un curseur d'amplitude, de fréquence ou de phase ne coûte rien.
+    def zoom_spectrum(self, amplitudes, frequencies, phases, f_min, f_max, n_points=1000, noise=0.0, seed=0):
+        fs = 1.0 / (self.time[1] - self.time[0])
+        f_min, f_max = float(max(f_min, 0.0)), float(min(f_max, fs / 2))
+        f = np.linspace(f_min, f_max, int(n_points))
+        total = np.zeros(len(f), dtype=complex)
+        for amplitude, spectrum in zip(amplitudes, self._cosine_dtft(frequencies, phases, f)):
+            if amplitude:
+                total += amplitude * spectrum
+        if noise:
+            band = (seed, f_min, f_max, int(n_points))
+            total += noise * self._lookup("zoom_bruit", [band], lambda bands: (
+                zoom_transform(len(self.time), f_min, f_max, int(n_points), fs)(self.noise(seed))
+                for _ in bands))[0]
+        return f, np.abs(total) * 2 / len(self.time)
+
+
+# Synthétiseur partagé entre les sessions pour une grille de temps donnée
+@st.cache_resource
+def get_synthesizer(duration, n_samples):
+    return Synthesizer(np.linspace(0, duration, n_samples))
@@ -2,6 +2,13 @@ import numpy as np
 import streamlit as st
 import plotly.graph_objects as go
 import scipy as sp
+import pandas as pd
+from outils.spectre import peak_traces
+from outils.figures import regular_scatter
+from outils.audio import encode_wav
+from outils.notes import note_activity, present_notes
+from outils.synthese import get_synthesizer
+from outils.precalcul import get_cosine_table
 
 st.set_page_config(page_title="Signal Sinusoïdal", page_icon=":musical_note:", layout="wide")
 
@@ -33,7 +40,7 @@ col1, col2 = st.columns(2)
 
 with col1:
     fig = go.Figure()
-    fig.add_trace(go.Scatter(x=t, y=y, mode='lines',
+    fig.add_trace(regular_scatter(t, y, mode='lines',
                             name=fr'$A={A},\ f={f},\ \phi={phi:.2f}$'))
     fig.update_layout(
         title={
@@ -50,40 +57,20 @@ with col1:
 
 with col2:
     
-    N = len(t)
-    frequences = np.fft.fftfreq(N, d=(t[1]-t[0]))[:N//2]  
-    amplitude = np.abs(np.fft.fft(y))[:N//2] * 2/N 
-
-    # Détection des pics dans le spectre
-    peaks = (np.abs(amplitude) > 0.8)  # Seuil arbitraire
+    # Pics du cosinus unitaire, lus dans la table des curseurs (calculés une fois par
+    # couple (f, φ)) ; l'amplitude A n'est qu'un facteur d'échelle
+    freqs_pics, amps_pics = get_cosine_table()[(f, phi)]
+    frequences = np.linspace(0, 1.05 * f, 1000)
+    garde = A * amps_pics > 0.8  # Seuil arbitraire
+    freqs_pics, amps_pics = freqs_pics[garde], A * amps_pics[garde]
 
     fig_fft = go.Figure()
 
-    fig_fft.add_trace(go.Scatter(x=frequences, y=np.zeros_like(frequences),  
+    fig_fft.add_trace(regular_scatter(frequences, np.zeros_like(frequences),  
                             line=dict(color='white')))
 
     # Marquage des pics
-    fig_fft.add_trace(go.Scatter(x=frequences[peaks], y=amplitude[peaks],
-                            mode='markers',
-                            marker=dict(color='red', size=4)))
-
-    for freq, amp in zip(frequences[peaks], amplitude[peaks]):
-        fig_fft.add_shape(
-            type="line",
-            x0=freq, y0=0,  # Starts at x-axis
-            x1=freq, y1=amp,  # Ends at peak amplitude
-            line=dict(color="red", width=1.5),
-            opacity=0.8
-        )
-        # Ajouter des annotations pour les pics
-        fig_fft.add_annotation(
-            x=freq,
-            y=amp,
-            text=f"{freq:.1f} Hz",
-            showarrow=False,
-            yshift=10,
-            font=dict(size=10)
-        )
+    fig_fft.add_traces(peak_traces(freqs_pics, amps_pics))
 
     # Mise en forme
     fig_fft.update_layout(title='Spectre ',
@@ -126,7 +113,7 @@ st.write(
 )
 y2 = y**2
 fig_puissance = go.Figure()
-fig_puissance.add_trace(go.Scatter(x=t, y=y2, mode='lines', name='Puissance instantanée', line=dict(color='orange')))
+fig_puissance.add_trace(regular_scatter(t, y2, mode='lines', name='Puissance instantanée', line=dict(color='orange')))
 fig_puissance.update_layout(
     title="Puissance instantanée du signal",
     xaxis_title="Temps (t)",
@@ -149,27 +136,36 @@ f = st.slider("Fréquence (f)",0, f_max, 1000, step=10)  # Fréquence du signal
 
 
 
-time = np.linspace(0, 3, 132000)  # Temps de 0 à 3 secondes
-
-c1 = A * np.cos(2*np.pi*f*time)
+# Synthétiseur partagé : chaque composante cos(2π f t + φ) n'est calculée qu'une fois
+synthe = get_synthesizer(3, 132000)
+time = synthe.time  # Temps de 0 à 3 secondes
 
 formule = f"x(t) = {A} * cos(2π * {f} * t)"
-col1, col2, col3, col4, col5,col6 = st.columns(6)
 
-with col1:
-    comp_2=st.checkbox("Ajouter la composante 2",value=False)
-with col2:
-    comp_3=st.checkbox("Ajouter la composante 3",value=False)
-with col3:
-    comp_4=st.checkbox("Ajouter la composante 4",value=False)
-with col4:
-    comp_5=st.checkbox("Ajouter la composante 5",value=False)
-with col5:
-    comp_6=st.checkbox("Ajouter la composante 6",value=False)
-with col6:
-    comp_7=st.checkbox("Ajouter la composante 7",value=False)
-
- 
+# Composantes supplémentaires : autant de lignes que voulu, cochées pour être ajoutées
+if "composantes" not in st.session_state:
+    st.session_state["composantes"] = pd.DataFrame({
+        "Active": [False] * 6,
+        "Amplitude": [1.0] * 6,
+        "Fréquence (Hz)": [2000, 4000, 8000, 10000, 10000, 10000],
+        "Phase (rad)": [0.0] * 6,
+    })
+composantes = st.data_editor(
+    st.session_state["composantes"],
+    num_rows="dynamic",
+    use_container_width=True,
+    column_config={
+        "Active": st.column_config.CheckboxColumn("Ajouter", default=True),
+        "Amplitude": st.column_config.NumberColumn(min_value=0.0, max_value=10.0, default=1.0),
+        "Fréquence (Hz)": st.column_config.NumberColumn(min_value=0, max_value=f_max, default=1000),
+        "Phase (rad)": st.column_config.NumberColumn(min_value=0.0, max_value=float(2*np.pi), default=0.0, format="%.2f"),
+    },
+    key="editeur_composantes",
+)
+composantes = composantes.dropna()
+composantes = composantes[composantes["Active"].astype(bool)]
+for A_k, f_k, phi_k in composantes[["Amplitude", "Fréquence (Hz)", "Phase (rad)"]].itertuples(index=False):
+    formule += f" + {A_k:g} * cos(2π * {f_k:g} * t" + (f" + {phi_k:.2f})" if phi_k else ")")
 
 if "add_noise" not in st.session_state:
     st.session_state["add_noise"] = False
@@ -179,82 +175,20 @@ if st.button("Ajouter du bruit blanc"):
 
 
 
-if comp_2:
-    col1, col2 = st.columns(2)
-    with col1:
-        A2 = st.number_input("Amplitude 2", 0.0, 10.0, 1.0)
-    with col2:
-        f2 = st.number_input("Fréquence 2 (Hz)", 0, f_max, 2000)
-    c2 = A2 * np.cos(2 * np.pi * f2 * time)
-    formule += f" + {A2} * cos(2π * {f2} * t)"
-else:
-    c2 = np.zeros_like(time)
-
-if comp_3:
-    col1, col2 = st.columns(2)
-    with col1:
-        A3 = st.number_input("Amplitude 3", 0.0, 10.0, 1.0)
-    with col2:
-        f3 = st.number_input("Fréquence 3 (Hz)", 0, f_max, 4000)
-    c3 = A3 * np.cos(2 * np.pi * f3 * time)
-    formule += f" + {A3} * cos(2π * {f3} * t)"
-else:
-    c3= np.zeros_like(time)
-
-if comp_4:
-    col1, col2 = st.columns(2)
-    with col1:
-        A4 = st.number_input("Amplitude 4", 0.0, 10.0, 1.0)
-    with col2:
-        f4 = st.number_input("Fréquence 4 (Hz)", 0, f_max, 8000)
-    c4 = A4 * np.cos(2 * np.pi * f4 * time)
-    formule += f" + {A4} * cos(2π * {f4} * t)"
-else:
-    c4 = np.zeros_like(time)
-
-if comp_5:
-    col1, col2 = st.columns(2)
-    with col1:
-        A5 = st.number_input("Amplitude 5", 0.0, 10.0, 1.0)
-    with col2:
-        f5 = st.number_input("Fréquence 2 (Hz)", 0, f_max, 10000)
-    c5 = A5 * np.cos(2 * np.pi * f5 * time)
-    formule += f" + {A5} * cos(2π * {f5} * t)"
-else:
-    c5 = np.zeros_like(time)
-
-if comp_6:
-    col1, col2 = st.columns(2)
-    with col1:
-        A6 = st.number_input("Amplitude 6", 0.0, 10.0, 1.0)
-    with col2:
-        f6 = st.number_input("Fréquence 6 (Hz)", 0, f_max, 10000)
-    c6 = A6 * np.cos(2 * np.pi * f6 * time)
-    formule += f" + {A6} * cos(2π * {f6} * t)"
-else:
-    c6 = np.zeros_like(time)
-
-if comp_7:
-    col1, col2 = st.columns(2)
-    with col1:
-        A7 = st.number_input("Amplitude 7", 0.0, 10.0, 1.0)
-    with col2:
-        f7 = st.number_input("Fréquence 7 (Hz)", 0, f_max, 10000)
-    c7 = A7 * np.cos(2 * np.pi * f7 * time)
-    formule += f" + {A7} * cos(2π * {f7} * t)"
-else:
-    c7 = np.zeros_like(time)
-
-
-
 if st.session_state["add_noise"]:
     A_noise = st.slider("Amplitude du bruit", 0.0, 2.0, 0.01, step=0.01)
-    noise =  np.random.normal(0, A_noise, size=time.shape)  # Bruit blanc
+    # Bruit blanc à graine fixe : même son d'un rerun à l'autre, donc WAV réutilisé par le cache
+    noise = A_noise * synthe.noise()
     formule +=" + bruit"
 else:
+    A_noise = 0.0
     noise = np.zeros_like(time)
 
-x = c1 + c2 + c3 + c4 + c5+c6+c7 + noise
+# Somme de toutes les composantes, en réutilisant les formes d'onde déjà calculées
+amplitudes = np.concatenate([[A], composantes["Amplitude"]])
+frequences_comp = np.concatenate([[f], composantes["Fréquence (Hz)"]])
+phases = np.concatenate([[0.0], composantes["Phase (rad)"]])
+x = synthe.signal(amplitudes, frequences_comp, phases) + noise
 
 #formule de signal
 st.subheader("Formule du signal généré")
@@ -279,8 +213,8 @@ with col1:
 
     # Signal temporel (affichage selon l'intervalle choisi)
     mask = (time >= 0) & (time <= 100/f_max)  # Afficher de 0 à 1/f_max secondes
-    fig.add_trace(go.Scatter(
-        x=time[mask], y=x[mask],
+    fig.add_trace(regular_scatter(
+        time[mask], x[mask],
         mode='lines',
         name='Signal',
         line=dict(color='blue', width=1)
@@ -298,13 +232,15 @@ with col2:
     st.subheader("Spectre du signal")
     st.write("Voici le spectre du signal, montrant les fréquences présentes dans le signal généré.")
     # Spectre du signal
-    N = len(x)
-    frequences = np.fft.fftfreq(N, d=(time[1]-time[0]))[:N//2]  
-    amplitude = np.abs(np.fft.fft(x))[:N//2] * 2/N 
+    # Somme pondérée des spectres mémorisés de chaque composante : pas de FFT en déplaçant un curseur
+    frequences, spectre = synthe.spectrum(amplitudes, frequences_comp, phases)
+    if A_noise:
+        spectre = spectre + A_noise * synthe.noise_spectrum()
+    amplitude = np.abs(spectre) * 2 / len(time)
 
     fig_spectre = go.Figure()
-    fig_spectre.add_trace(go.Scatter(
-        x=frequences, y=amplitude,
+    fig_spectre.add_trace(regular_scatter(
+        frequences, amplitude,
         mode='lines',
         name='Spectre',
         line=dict(color='red', width=1)
@@ -319,10 +255,36 @@ with col2:
 
     st.plotly_chart(fig_spectre, use_container_width=True)
 
+    # Zoom sur la seule bande autour de f, sur une grille bien plus fine que celle de la FFT :
+    # spectre exact des cosinus, transformée en Z chirp du bruit mémorisée par bande
+    largeur = st.slider("Zoom autour de f : demi-largeur de la bande (Hz)", 1, 500, 20)
+    frequences_zoom, amplitude_zoom = synthe.zoom_spectrum(
+        amplitudes, frequences_comp, phases, f - largeur, f + largeur, n_points=2000, noise=A_noise)
+    fig_zoom = go.Figure()
+    fig_zoom.add_trace(regular_scatter(
+        frequences_zoom, amplitude_zoom,
+        mode='lines',
+        name='Spectre zoomé',
+        line=dict(color='red', width=1)
+    ))
+    fig_zoom.update_layout(
+        title=f"Spectre zoomé entre {max(f - largeur, 0)} et {f + largeur} Hz",
+        xaxis_title="Fréquence (Hz)",
+        yaxis_title="Amplitude",
+        template='plotly_white'
+    )
+    st.plotly_chart(fig_zoom, use_container_width=True)
+
 sample_rate = 44000
 
 if st.session_state["play_audio"]:
-    st.audio(x, sample_rate=sample_rate, loop=True)
+    st.audio(encode_wav(x, sample_rate), format="audio/wav", loop=True)
+
+if st.checkbox("Quelles notes de piano sont présentes dans le signal ?"):
+    # DFT évaluée uniquement aux fréquences des 88 touches
+    _, activite = note_activity(x, 1 / (time[1] - time[0]))
+    notes_signal = present_notes(activite, min_frames=len(activite[0]) // 2)
+    st.write("Notes détectées : " + (", ".join(notes_signal) or "aucune (fréquences hors du clavier)"))
 
 st.subheader("Caractéristisation des ondes sismiques")
 
@@ -1,9 +1,17 @@
 import streamlit as st
 import numpy as np
 import plotly.graph_objects as go
+from outils.figures import regular_scatter, typed_array
+from outils.spectrogramme import compute_spectrogram_db, display_tile
+from outils.hauteur import median_f0, pitch_track
+from outils.notes import PIANO_KEYS, detect_notes, midi_name, note_activity, present_notes
+from outils.audio import load_audio, audio_artifact, audio_duration, audio_key, magnitude_spectrum, stream_analysis
 
 st.set_page_config(page_title="Signal Sonore", layout="wide")
 
+# Au-delà de cette durée (s), l'enregistrement est analysé en flux, bloc par bloc
+LONG_RECORDING_S = 60
+
 st.title("Enregistrement et analyse d'un signal sonore")
 
 st.header("1. Enregistrez ou importez un son")
@@ -30,12 +38,20 @@ with col2:
 audio = st.session_state["audio"]
 
 if audio is not None:
-    import soundfile as sf
-    import io
-
-    data, samplerate = sf.read(io.BytesIO(audio.getvalue()))
-    y = data[:, 0] if data.ndim > 1 else data
-    t = np.arange(len(y)) / samplerate
+    # Décodage et analyses mis en cache selon le contenu du fichier (partagé entre sessions)
+    data = audio.getvalue()
+    long_recording = audio_duration(data) > LONG_RECORDING_S
+    if long_recording:
+        # Long enregistrement : analyse en flux sans charger tout le signal en mémoire
+        audio_id = audio_key(data)
+        progress = st.progress(0.0, text="Analyse de l'enregistrement...")
+        t_apercu, y_min, y_max, xf_welch, dsp, t_spec_flux, Sdb_flux = audio_artifact(
+            audio_id, "analyse_flux_2048_1024", lambda: stream_analysis(data, nperseg=2048, noverlap=1024, on_progress=progress.progress)
+        )
+        progress.empty()
+    else:
+        audio_id, y, samplerate = load_audio(data)
+        t = np.arange(len(y)) / samplerate
 
     st.audio(audio, format="audio/mp3" if hasattr(audio, "type") and audio.type == "audio/mp3" else "audio/wav")
 
@@ -48,7 +64,12 @@ if audio is not None:
         """
     )
     fig = go.Figure()
-    fig.add_trace(go.Scatter(x=t, y=y, mode='lines', name='Signal audio'))
+    if long_recording:
+        # Aperçu min/max : l'enveloppe du signal sans envoyer chaque échantillon
+        fig.add_trace(regular_scatter(t_apercu, y_max, mode='lines', name='Signal audio', line=dict(width=0.5, color='#636efa')))
+        fig.add_trace(regular_scatter(t_apercu, y_min, mode='lines', fill='tonexty', showlegend=False, line=dict(width=0.5, color='#636efa')))
+    else:
+        fig.add_trace(regular_scatter(t, y, mode='lines', name='Signal audio'))
     fig.update_layout(
         title="Signal audio enregistré",
         xaxis_title="Temps (s)",
@@ -67,13 +88,14 @@ if audio is not None:
         Les pics (les bosses) indiquent les notes jouées.
         """
     )
-    N = len(y)
-    yf = np.fft.rfft(y)
-    xf = np.fft.rfftfreq(N, 1 / samplerate)
-    amplitude = np.abs(yf)
+    if long_recording:
+        # Spectre moyen (Welch) du long enregistrement
+        xf, amplitude = xf_welch, np.sqrt(dsp)
+    else:
+        xf, amplitude = audio_artifact(audio_id, "spectre", lambda: magnitude_spectrum(y, samplerate))
 
     fig_fft = go.Figure()
-    fig_fft.add_trace(go.Scatter(x=xf, y=amplitude, mode='lines', name='Spectre'))
+    fig_fft.add_trace(regular_scatter(xf, amplitude, mode='lines', name='Spectre'))
     fig_fft.update_layout(
         title="Fréquences présentes dans le son",
         xaxis_title="Fréquence (Hz)",
@@ -153,12 +175,15 @@ if audio is not None:
     )
 
     if st.button("Afficher le spectrogramme du son"):
-        from scipy.signal import spectrogram
-
-        f, t_spec, Sxx = spectrogram(y, fs=samplerate, nperseg=2048, noverlap=1024)
+        # Seule la bande affichée (0-3000 Hz) est envoyée, moyennée à la résolution du graphique
+        if long_recording:
+            spectro = xf_welch[:len(Sdb_flux)], t_spec_flux, Sdb_flux
+        else:
+            spectro = audio_artifact(audio_id, "spectrogramme_2048_1024", lambda: compute_spectrogram_db(y, samplerate, nperseg=2048, noverlap=1024))
+        f, t_spec, Sdb = display_tile(*spectro, f_max=3000)
         fig_spec = go.Figure(
             data=go.Heatmap(
-                z=10 * np.log10(Sxx + 1e-10),
+                z=typed_array(Sdb),
                 x=t_spec,
                 y=f,
                 colorscale="Viridis",
@@ -175,6 +200,43 @@ if audio is not None:
         st.plotly_chart(fig_spec, use_container_width=True, key="spectrogramme")
         st.info("Sur le spectrogramme, chaque note apparaît comme une bande horizontale à une certaine hauteur. Repère à quel moment chaque note commence et finit.")
 
+    if not long_recording and st.checkbox("Afficher la correction (détection automatique des notes)"):
+        # Même spectrogramme en cache que le graphique ci-dessus : la détection ne coûte presque rien
+        spectro = audio_artifact(audio_id, "spectrogramme_2048_1024", lambda: compute_spectrogram_db(y, samplerate, nperseg=2048, noverlap=1024))
+        t_f0, f0 = audio_artifact(audio_id, "hauteur_60_1000", lambda: pitch_track(y, samplerate, fmin=60.0, fmax=1000.0))
+        notes = detect_notes(*spectro, t_f0, f0)
+        if notes:
+            st.table({
+                "Début (s)": [f"{debut:.2f}" for debut, _, _, _ in notes],
+                "Fin (s)": [f"{fin:.2f}" for _, fin, _, _ in notes],
+                "Fréquence fondamentale (Hz)": [f"{freq:.1f}" for _, _, freq, _ in notes],
+                "Note": [nom for _, _, _, nom in notes],
+            })
+        else:
+            st.warning("Aucune note n'a pu être détectée automatiquement dans cet enregistrement.")
+
+    if not long_recording and st.checkbox("Afficher l'activité des 88 notes du piano au fil du temps"):
+        # DFT évaluée aux seules fréquences des notes : une mesure par note, à sa fréquence exacte
+        t_notes, activite = audio_artifact(audio_id, "activite_notes_4096", lambda: note_activity(y, samplerate, frame_length=4096))
+        activite_db = 20 * np.log10(activite / max(activite.max(), 1e-12) + 1e-6)
+        fig_notes = go.Figure(data=go.Heatmap(
+            z=typed_array(np.maximum(activite_db, -60)),
+            x=typed_array(t_notes),
+            y=[midi_name(m) for m in PIANO_KEYS],
+            colorscale="Viridis",
+            colorbar=dict(title="dB")
+        ))
+        fig_notes.update_layout(
+            title="Activité des notes du piano",
+            xaxis_title="Temps (s)",
+            yaxis_title="Note",
+            height=600,
+            template="plotly_white"
+        )
+        st.plotly_chart(fig_notes, use_container_width=True, key="activite_notes")
+        notes_presentes = present_notes(activite, min_frames=3, suppress_harmonics=True)
+        st.write("Notes les plus présentes : " + (", ".join(notes_presentes) or "aucune"))
+
     st.header("6. Compare deux voix sur le même mot")
     st.write(
         """
@@ -194,22 +256,21 @@ if audio is not None:
 
     if audio1 is not None and audio2 is not None:
         # Analyse voix 1
-        data1, sr1 = sf.read(io.BytesIO(audio1.getvalue()))
-        y1 = data1[:, 0] if data1.ndim > 1 else data1
-        N1 = len(y1)
-        yf1 = np.fft.rfft(y1)
-        xf1 = np.fft.rfftfreq(N1, 1 / sr1)
-        amplitude1 = np.abs(yf1)
-        freq_dom1 = xf1[np.argmax(amplitude1)]
+        audio_id1, y1, sr1 = load_audio(audio1.getvalue())
+        xf1, amplitude1 = audio_artifact(audio_id1, "spectre", lambda: magnitude_spectrum(y1, sr1))
+        # Fréquence fondamentale : médiane du suivi de hauteur (YIN), plus robuste que le maximum du spectre
+        t_f0_1, f0_1 = audio_artifact(audio_id1, "hauteur_60_1000", lambda: pitch_track(y1, sr1, fmin=60.0, fmax=1000.0))
+        freq_dom1 = median_f0(f0_1)
+        if np.isnan(freq_dom1):
+            freq_dom1 = float(xf1[np.argmax(amplitude1)])
 
         # Analyse voix 2
-        data2, sr2 = sf.read(io.BytesIO(audio2.getvalue()))
-        y2 = data2[:, 0] if data2.ndim > 1 else data2
-        N2 = len(y2)
-        yf2 = np.fft.rfft(y2)
-        xf2 = np.fft.rfftfreq(N2, 1 / sr2)
-        amplitude2 = np.abs(yf2)
-        freq_dom2 = xf2[np.argmax(amplitude2)]
+        audio_id2, y2, sr2 = load_audio(audio2.getvalue())
+        xf2, amplitude2 = audio_artifact(audio_id2, "spectre", lambda: magnitude_spectrum(y2, sr2))
+        t_f0_2, f0_2 = audio_artifact(audio_id2, "hauteur_60_1000", lambda: pitch_track(y2, sr2, fmin=60.0, fmax=1000.0))
+        freq_dom2 = median_f0(f0_2)
+        if np.isnan(freq_dom2):
+            freq_dom2 = float(xf2[np.argmax(amplitude2)])
 
         st.write(f"**Fréquence dominante voix 1 : {freq_dom1:.1f} Hz**")
         st.write(f"**Fréquence dominante voix 2 : {freq_dom2:.1f} Hz**")
@@ -219,10 +280,21 @@ if audio is not None:
         else:
             st.info("Les fréquences dominantes sont différentes, ce qui reflète la différence de hauteur de voix.")
 
+        fig_f0 = go.Figure()
+        fig_f0.add_trace(go.Scatter(x=t_f0_1, y=f0_1, mode='lines', name='Voix 1'))
+        fig_f0.add_trace(go.Scatter(x=t_f0_2, y=f0_2, mode='lines', name='Voix 2'))
+        fig_f0.update_layout(
+            title="Hauteur des voix au cours du temps",
+            xaxis_title="Temps (s)",
+            yaxis_title="Fréquence fondamentale (Hz)",
+            template="plotly_white"
+        )
+        st.plotly_chart(fig_f0, use_container_width=True, key="f0_voix")
+
         col5, col6 = st.columns(2)
         with col5:
             fig1 = go.Figure()
-            fig1.add_trace(go.Scatter(x=xf1, y=amplitude1, mode='lines', name='Spectre voix 1'))
+            fig1.add_trace(regular_scatter(xf1, amplitude1, mode='lines', name='Spectre voix 1'))
             fig1.update_layout(
                 title="Fréquences de la voix 1",
                 xaxis_title="Fréquence (Hz)",
@@ -233,7 +305,7 @@ if audio is not None:
             st.plotly_chart(fig1, use_container_width=True, key="fft_voix1")
         with col6:
             fig2 = go.Figure()
-            fig2.add_trace(go.Scatter(x=xf2, y=amplitude2, mode='lines', name='Spectre voix 2'))
+            fig2.add_trace(regular_scatter(xf2, amplitude2, mode='lines', name='Spectre voix 2'))
             fig2.update_layout(
                 title="Fréquences de la voix 2",
                 xaxis_title="Fréquence (Hz)",
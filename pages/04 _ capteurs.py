@@ -1,6 +1,11 @@
 import numpy as np
 import plotly.graph_objects as go
 import streamlit as st
+from outils.figures import regular_scatter
+from outils.audio import load_audio, audio_artifact, encode_wav
+from outils.reechantillonnage import resample
+from outils.precalcul import get_sampling_table
+from outils.spectre import estimate_peaks
 
 # Configuration de la page
 st.set_page_config(
@@ -113,24 +118,24 @@ st.latex(r"f(t) = " + " + ".join([f"A{i} \cos(2 \pi f{i} t + φ{i})" for i in ra
 tab1, tab2 = st.tabs(["Signal resultant", "Composantes Individuelles"])
 with tab1:
     st.header("Signal Resultant")
-    st.plotly_chart(go.Figure(data=go.Scatter(x=t, y=signal_final, mode='lines', name='Signal Resultant')), use_container_width=True)
+    st.plotly_chart(go.Figure(data=regular_scatter(t, signal_final, mode='lines', name='Signal Resultant')), use_container_width=True)
 with tab2:
     st.header("Composantes Individuelles")
     fig_individual = go.Figure()
     for i, component in enumerate(individual_signals, start=0):
-        fig_individual.add_trace(go.Scatter(x=t, y=component, mode='lines', name=f'Composante {i+1}'))    
+        fig_individual.add_trace(regular_scatter(t, component, mode='lines', name=f'Composante {i+1}'))    
     st.plotly_chart(fig_individual, use_container_width=True)
 
 fs = st.slider("Fréquence d'échantillonnage (fs)", 0, 1000, 200, step=10, key="fs")
 y_continu = signal_final
-t_sampled = np.arange(0, 1, 1/fs)
-y_sampled = np.zeros_like(t_sampled)
-for sig in signals:
-    component_sampled = sig["A"] * np.cos(2 * np.pi * sig["f"] * t_sampled + sig["phi"])
-    y_sampled += component_sampled
+# Tout le domaine du curseur est échantillonné d'un coup pour ces composantes :
+# déplacer le curseur ne fait plus que lire la table
+table = get_sampling_table(tuple((sig["A"], sig["f"], sig["phi"]) for sig in signals))
+y_sampled, freq_plus_haute = table[fs]
+t_sampled = np.arange(len(y_sampled)) / max(fs, 1)
 
 fig = go.Figure()
-fig.add_trace(go.Scatter(x=t, y=y_continu, mode='lines', name='Signal Continu', line=dict(color='blue')))
+fig.add_trace(regular_scatter(t, y_continu, mode='lines', name='Signal Continu', line=dict(color='blue')))
 max_points = 200
 if len(t_sampled) > max_points:
     indices = np.linspace(0, len(t_sampled) - 1, max_points, dtype=int)
@@ -149,14 +154,8 @@ fig.update_layout(
 )
 st.plotly_chart(fig, use_container_width=True)
 
-yf = np.fft.rfft(y_sampled)
-xf = np.fft.rfftfreq(len(y_sampled), 1 / fs)
-amplitude = np.abs(yf)
-seuil = 0.05 * np.max(amplitude)
-freq_presentes = xf[amplitude > seuil]
-if len(freq_presentes) > 0:
-    freq_plus_haute = np.max(freq_presentes)
-else:
+# Fréquence la plus haute estimée à une fraction de case près, précalculée dans la table
+if freq_plus_haute is None:
     st.info("Aucune fréquence significative détectée dans le signal échantillonné.")
 
 st.write("""
@@ -190,18 +189,15 @@ with col_audio2:
 audio = audio_input if audio_input is not None else audio_uploaded
 
 if audio is not None:
-    import soundfile as sf
-    import io
-
-    data, samplerate = sf.read(io.BytesIO(audio.getvalue()))
-    y = data[:, 0] if data.ndim > 1 else data
+    # Décodage mis en cache selon le contenu du fichier (partagé entre sessions)
+    audio_id, y, samplerate = load_audio(audio.getvalue())
     t = np.arange(len(y)) / samplerate
 
     st.audio(audio, format="audio/wav")
 
     st.subheader("Visualisation du signal enregistré")
     fig_audio = go.Figure()
-    fig_audio.add_trace(go.Scatter(x=t, y=y, mode='lines', name='Signal audio'))
+    fig_audio.add_trace(regular_scatter(t, y, mode='lines', name='Signal audio'))
     fig_audio.update_layout(
         title="Signal audio enregistré",
         xaxis_title="Temps (s)",
@@ -212,8 +208,14 @@ if audio is not None:
 
     st.subheader("Échantillonne ton signal à une fréquence plus basse")
     fs_user = st.slider("Choisis une fréquence d'échantillonnage (Hz)", 3000, int(samplerate), 4000, step=500)
-    t_ech_user = np.arange(0, len(y)/samplerate, 1/fs_user)
-    y_ech_user = np.interp(t_ech_user, t, y)
+    anti_repliement = st.checkbox(
+        "Appliquer un filtre anti-repliement avant l'échantillonnage",
+        value=False,
+        help="Sans filtre, les fréquences au-dessus de fs/2 se replient : c'est l'aliasing."
+    )
+    # Ré-échantillonnage polyphase (filtre mis en cache pour chaque rapport de fréquences)
+    y_ech_user = resample(y, samplerate, fs_user, anti_alias=anti_repliement)
+    t_ech_user = np.arange(len(y_ech_user)) / fs_user
     max_points = 2000
     if len(t_ech_user) > max_points:
         indices = np.linspace(0, len(t_ech_user) - 1, max_points, dtype=int)
@@ -224,7 +226,7 @@ if audio is not None:
         y_ech_plot = y_ech_user
 
     fig_ech = go.Figure()
-    fig_ech.add_trace(go.Scatter(x=t, y=y, mode='lines', name='Signal original', line=dict(color='blue')))
+    fig_ech.add_trace(regular_scatter(t, y, mode='lines', name='Signal original', line=dict(color='blue')))
     fig_ech.add_trace(go.Scatter(x=t_ech_plot, y=y_ech_plot, mode='markers', name='Échantillons', marker=dict(color='red', size=6)))
     fig_ech.update_layout(
         title="Échantillonnage du signal audio",
@@ -233,11 +235,11 @@ if audio is not None:
     )
     st.plotly_chart(fig_ech, use_container_width=True, key="audio_ech")
 
-    yf = np.fft.fftshift(np.fft.fft(y))
-    xf = np.fft.fftshift(np.fft.fftfreq(len(y), 1 / samplerate))
-    amplitude = np.abs(yf)
-    seuil = 0.05 * np.max(amplitude)
-    freq_presentes = np.abs(xf[amplitude > seuil])
+    # Tous les pics au-dessus du seuil, pas seulement les plus forts : une composante faible
+    # mais aiguë compte pour le repliement
+    freq_presentes, _, _ = audio_artifact(
+        audio_id, "pics_0.05_tous", lambda: estimate_peaks(y, 1 / samplerate, relative=0.05, max_peaks=None)
+    )
     if len(freq_presentes) > 0:
         freq_plus_haute = np.max(freq_presentes)
         st.info(f"La fréquence la plus haute mesurée dans ton signal enregistré (FFT) est : **{freq_plus_haute:.1f} Hz**")
@@ -252,11 +254,7 @@ if audio is not None:
         )
 
     st.write("**À écouter :** Voici le son ré-échantillonné à la fréquence choisie :")
-    import soundfile as sf
-    import io
-    buf = io.BytesIO()
-    sf.write(buf, y_ech_user, fs_user, format='WAV')
-    st.audio(buf.getvalue(), format="audio/wav")
+    st.audio(encode_wav(y_ech_user, fs_user, normalize=False), format="audio/wav")
 
     st.write("""
     **Question :** Que remarques-tu si tu choisis une fréquence d'échantillonnage trop basse par rapport au son original ?
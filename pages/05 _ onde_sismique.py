@@ -1,8 +1,16 @@
 import numpy as np
+import pandas as pd
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots 
 import streamlit as st
 import scipy as sp
+from outils.figures import cached_figure, regular_scatter
+from outils.audio import encode_wav
+from outils.correlation import cut_templates, match_templates
+from outils.detection import detect_continuous
+from outils.enregistrements import get_recording_stations
+from outils.filtrage import filter_signal
+from outils.stockage import ensure_station, generated_station, get_waveform_store, read_station, source_station
 
 
 # Configuration de la page
@@ -97,72 +105,112 @@ def generate_seismic_signal(time,start_p, end_p, start_s, end_s, start_surface,
     return signal_x, signal_y, signal_z
 
 # Génération des signaux
-@st.cache_data
 def get_signal():
     time = np.linspace(0, 120, 120*100)
     signal_x, signal_y, signal_z = generate_seismic_signal(time, 15, 30, 35, 50, 60, 100)
     return signal_x, signal_y, signal_z
-signal_x, signal_y, signal_z = get_signal()
+
+source = st.radio(
+    "Source des données",
+    ("Signal synthétique", "Enregistrement réel (recording1.mat)"),
+    horizontal=True
+)
+# Les traces sont écrites une seule fois dans le stock de formes d'onde, puis relues
+# à la demande (projection en mémoire de la seule fenêtre affichée)
+store = get_waveform_store()
+if source == "Signal synthétique":
+    # Nom lié au code du générateur : le modifier régénère les traces
+    synthetique = generated_station("synthetique_onde_sismique", get_signal, generate_seismic_signal, generate_wave,
+                                    params=(len(time), float(time[-1])))
+    ensure_station(store, synthetique, get_signal, (len(time) - 1) / time[-1])
+    time, signal_x, signal_y, signal_z = read_station(store, synthetique)
+    fs_donnees = 1 / (time[1] - time[0])
+else:
+    stations = get_recording_stations()
+    noms = [station["id"] for station in stations]
+    station = stations[noms.index(st.selectbox("Station", noms))]
+    fs_donnees = station["sampling_rate"]
+    cle = source_station(station["id"], station["source"])
+    ensure_station(store, cle, lambda: station["sismo"].T, fs_donnees, station["posix_time"])
+    duree = station["sismo"].shape[0] / fs_donnees
+    debut, fin = st.slider("Fenêtre analysée (s)", 0.0, duree, (0.0, duree), step=1.0)
+    if fin - debut < 10:
+        st.warning("Choisissez une fenêtre d'au moins 10 secondes.")
+        st.stop()
+    time, signal_x, signal_y, signal_z = read_station(store, cle, debut, fin)
+    st.caption(
+        f"Station {station['id']} ({station['lat']:.3f}°N, {station['lon']:.3f}°E), "
+        f"{duree:.0f} s à {fs_donnees:.0f} Hz"
+    )
 
 # Création du graphique
 
-fig1 = go.Figure()
-fig1.add_trace(go.Scatter(x=time, y=signal_x+signal_y+signal_z, mode='lines', name='Signal combiné',line=dict(color='purple')))
-fig1.update_layout(
-    title="Signal combiné (X + Y + Z)",
-    xaxis_title="Temps (s)",
-    yaxis_title="Amplitude",
-    template="plotly_white"
-) 
+def build_fig1():
+    fig1 = go.Figure()
+    fig1.add_trace(regular_scatter(time, signal_x+signal_y+signal_z, mode='lines', name='Signal combiné',line=dict(color='purple')))
+    fig1.update_layout(
+        title="Signal combiné (X + Y + Z)",
+        xaxis_title="Temps (s)",
+        yaxis_title="Amplitude",
+        template="plotly_white"
+    )
+    return fig1
+
+# Figure mise en cache : les signaux et leur axe de temps ne changent pas d'un rerun à l'autre
+fig1 = cached_figure("signal_combine", (time[0], time[1] - time[0], signal_x, signal_y, signal_z), build_fig1)
 st.plotly_chart(fig1, use_container_width=True)
 
 st.subheader("""Comparaison le temps de depart des signaux X, Y et Z""")
 
 # Création de la figure avec subplots liés
-fig_combined = make_subplots(
-    rows=3, cols=1,
-    subplot_titles=("Composante Nord-Sud (X)", "Composante Est-Ouest (Y)", "Composante Verticale (Z)"),
-    vertical_spacing=0.1,
-    shared_xaxes=True  # Ceci synchronise le zoom horizontal
-)
+def build_fig_combined():
+    fig_combined = make_subplots(
+        rows=3, cols=1,
+        subplot_titles=("Composante Nord-Sud (X)", "Composante Est-Ouest (Y)", "Composante Verticale (Z)"),
+        vertical_spacing=0.1,
+        shared_xaxes=True  # Ceci synchronise le zoom horizontal
+    )
 
-# Ajout des traces
-fig_combined.add_trace(
-    go.Scatter(x=time, y=signal_x, mode='lines', name='X', line=dict(color='blue')),
-    row=1, col=1
-)
+    # Ajout des traces
+    fig_combined.add_trace(
+        regular_scatter(time, signal_x, mode='lines', name='X', line=dict(color='blue')),
+        row=1, col=1
+    )
 
-fig_combined.add_trace(
-    go.Scatter(x=time, y=signal_y, mode='lines', name='Y', line=dict(color='red')),
-    row=2, col=1
-)
+    fig_combined.add_trace(
+        regular_scatter(time, signal_y, mode='lines', name='Y', line=dict(color='red')),
+        row=2, col=1
+    )
 
-fig_combined.add_trace(
-    go.Scatter(x=time, y=signal_z, mode='lines', name='Z', line=dict(color='lime')),
-    row=3, col=1
-)
+    fig_combined.add_trace(
+        regular_scatter(time, signal_z, mode='lines', name='Z', line=dict(color='lime')),
+        row=3, col=1
+    )
 
-# Configuration du layout
-fig_combined.update_layout(
-    height=900,
-    showlegend=False,
-    template="plotly_white",
-    xaxis=dict(matches='x2'),
-    xaxis2=dict(matches='x3')
-)
+    # Configuration du layout
+    fig_combined.update_layout(
+        height=900,
+        showlegend=False,
+        template="plotly_white",
+        xaxis=dict(matches='x2'),
+        xaxis2=dict(matches='x3')
+    )
 
-# Configuration des axes
-fig_combined.update_xaxes(title_text="Temps (s)", row=3, col=1)
-fig_combined.update_yaxes(title_text="Amplitude X", row=1, col=1)
-fig_combined.update_yaxes(title_text="Amplitude Y", row=2, col=1)
-fig_combined.update_yaxes(title_text="Amplitude Z", row=3, col=1)
-
-fig_combined.update_layout(
-    title="Comparaison des signaux sismiques (X, Y, Z)",
-    xaxis_title="Temps (s)",
-    yaxis_title="Amplitude",
-    template="plotly_white"
-)
+    # Configuration des axes
+    fig_combined.update_xaxes(title_text="Temps (s)", row=3, col=1)
+    fig_combined.update_yaxes(title_text="Amplitude X", row=1, col=1)
+    fig_combined.update_yaxes(title_text="Amplitude Y", row=2, col=1)
+    fig_combined.update_yaxes(title_text="Amplitude Z", row=3, col=1)
+
+    fig_combined.update_layout(
+        title="Comparaison des signaux sismiques (X, Y, Z)",
+        xaxis_title="Temps (s)",
+        yaxis_title="Amplitude",
+        template="plotly_white"
+    )
+    return fig_combined
+
+fig_combined = cached_figure("signaux_xyz", (time[0], time[1] - time[0], signal_x, signal_y, signal_z), build_fig_combined)
 
 st.plotly_chart(fig_combined, use_container_width=True)
 
@@ -187,9 +235,9 @@ audio_signal =audio_signal*5
 sample_rate = 3000
 st.write("Le signal est acceleré pour qu'on puisse l'écouter .")
 
-st.audio(audio_signal, sample_rate=sample_rate)
+st.audio(encode_wav(audio_signal, sample_rate), format="audio/wav")
 
-acceleration_factor = sample_rate/ 100  # Accélération du signal pour l'écouter
+acceleration_factor = sample_rate / fs_donnees  # Accélération du signal pour l'écouter
 
 st.write(f"✅ Le signal a été accéléré d’un facteur {acceleration_factor:.1f} pour être écoutable.")
 
@@ -209,6 +257,11 @@ def compute_energy_envelope(filtered_signal, fs, window_sec=0.5):
     energy = np.convolve(np.abs(filtered_signal)**2, np.ones(window_size), mode='same')
     return energy / np.max(energy)  # normalisé
 
+# Énergie filtrée mise en cache : déplacer un curseur ne relance pas les filtres
+@st.cache_data(max_entries=32, show_spinner=False)
+def get_energy(data, lowcut, highcut, fs):
+    return compute_energy_envelope(bandpass_filter(data, lowcut, highcut, fs), fs)
+
 
 st.write(
     """    Dans cette section, nous allons détecter les ondes P et S dans les signaux sismiques captés par la station.
@@ -217,7 +270,9 @@ st.write(
     Et nous allons visualiser l'énergie du signal pour identifier les pics correspondant aux ondes P et S et détecter leur arrivée dans le signal.
     """)
 
-fs = 110  # fréquence d'échantillonnage
+fs = fs_donnees  # fréquence d'échantillonnage des signaux analysés
+# Bandes limitées sous la fréquence de Nyquist des données
+f_max_bande = float(min(50.0, np.floor(0.49 * fs)))
 
 
 st.write(
@@ -238,181 +293,253 @@ st.write(
     """
 )
 
-f_min_p, f_max_p = st.slider(
-        "Bande de fréquence pour l'onde P (en Hz)",
-        min_value=0.0,
-        max_value=50.0,
-        value=(0.1, 50.0),
-        step=0.1,
-        key='slider_p'
-    )
-
-f_min_s, f_max_s = st.slider(
-        "Bande de fréquence pour l'onde S (en Hz)",
-        min_value=0.1,
-        max_value=50.0,
-        value=(0.1, 50.0),
-        step=0.1,
-        key='slider_s'
-    )
-if st.button("Indice pour un bon choix des bandes de fréquence"):
-    st.info("la bande de fréquence pour l'onde P doit être centree autour de 10 Hz et pour l'onde S autour de 1 Hz.")
-    st.info("on peut utiliser comme bande de fréquence pour l'onde P : 8-12 Hz et pour l'onde S : 0.5-2 Hz.")
+# Section interactive isolée : ses widgets ne relancent que cette section
+@st.fragment
+def detection_ondes(signal_x, signal_y, signal_z):
+    f_min_p, f_max_p = st.slider(
+            "Bande de fréquence pour l'onde P (en Hz)",
+            min_value=0.0,
+            max_value=f_max_bande,
+            value=(0.1, f_max_bande),
+            step=0.1,
+            key='slider_p'
+        )
 
-st.write(
-    """ Choisissez le signal à analyser :
-    """)
-signal_choice = st.selectbox("Sélectionnez le signal", ("Nord-Sud", "Est-Ouest", "Vertical"))
+    f_min_s, f_max_s = st.slider(
+            "Bande de fréquence pour l'onde S (en Hz)",
+            min_value=0.1,
+            max_value=f_max_bande,
+            value=(0.1, f_max_bande),
+            step=0.1,
+            key='slider_s'
+        )
+    if st.button("Indice pour un bon choix des bandes de fréquence"):
+        st.info("la bande de fréquence pour l'onde P doit être centree autour de 10 Hz et pour l'onde S autour de 1 Hz.")
+        st.info("on peut utiliser comme bande de fréquence pour l'onde P : 8-12 Hz et pour l'onde S : 0.5-2 Hz.")
 
-if signal_choice == "Nord-Sud":
-    # Filtrage dans les bandes typiques des ondes P et S
-    fig_puissance_x = go.Figure()
-    signal_s = bandpass_filter(signal_x, f_min_s, f_max_s, fs)  # Onde S
+    st.write(
+        """ Choisissez le signal à analyser :
+        """)
+    signal_choice = st.selectbox("Sélectionnez le signal", ("Nord-Sud", "Est-Ouest", "Vertical"))
 
-    energie_s = compute_energy_envelope(signal_s, fs)
+    if signal_choice == "Nord-Sud":
+        # Filtrage dans les bandes typiques des ondes P et S
+        fig_puissance_x = go.Figure()
+        energie_s = get_energy(signal_x, f_min_s, f_max_s, fs)  # Onde S
 
     
-    #Temps d'arrivée des ondes P et S avant verification donne par l'utilisateur
-
-    t_s_x=st.slider(
-        "Temps d'arrivée de l'onde S (en secondes)",
-        min_value=float(time[0]),
-        max_value=float(time[-1]),
-        value=(float(time[0])),
-        step=0.1,
-        key='slider_ts'
-    )
-    fig_puissance_x.add_vline(x=t_s_x, line_dash="dash", line_color="cyan", annotation_text="Onde S")
-
-    if st.button("Verification des temps d'arrivée de l'onde S"):
-        signal_s = bandpass_filter(signal_x, 0.5, 2, fs)  # Onde S
+        #Temps d'arrivée des ondes P et S avant verification donne par l'utilisateur
+
+        t_s_x=st.slider(
+            "Temps d'arrivée de l'onde S (en secondes)",
+            min_value=float(time[0]),
+            max_value=float(time[-1]),
+            value=(float(time[0])),
+            step=0.1,
+            key='slider_ts'
+        )
+        fig_puissance_x.add_vline(x=t_s_x, line_dash="dash", line_color="cyan", annotation_text="Onde S")
 
-        energie_s = compute_energy_envelope(signal_s, fs)
+        if st.button("Verification des temps d'arrivée de l'onde S"):
+            energie_s = get_energy(signal_x, 0.5, 2, fs)  # Onde S
 
-        # Détection de pics
-        peaks_s, _ = sp.signal.find_peaks(energie_s, height=0.05, distance=int(0.3 * fs))
+            # Détection de pics
+            peaks_s, _ = sp.signal.find_peaks(energie_s, height=0.05, distance=int(0.3 * fs))
 
-        # Traces de l’énergie et des pics
-        fig_puissance_x.add_trace(go.Scatter(x=time, y=energie_s, mode='lines', name='Énergie onde S', line=dict(color='blue')))
+            # Traces de l’énergie et des pics
+            fig_puissance_x.add_trace(regular_scatter(time, energie_s, mode='lines', name='Énergie onde S', line=dict(color='blue')))
         
-        if  len(peaks_s) > 0:
-            t_s_x = time[peaks_s[0]]
+            if  len(peaks_s) > 0:
+                t_s_x = time[peaks_s[0]]
 
             
-            st.success(f"🟣 Onde S détectée à t = {t_s_x:.2f} s (≈1 Hz)")
+                st.success(f"🟣 Onde S détectée à t = {t_s_x:.2f} s (≈1 Hz)")
 
-            fig_puissance_x.add_vline(x=t_s_x, line_dash="dash", line_color="purple", annotation_text="Onde S")
+                fig_puissance_x.add_vline(x=t_s_x, line_dash="dash", line_color="purple", annotation_text="Onde S")
             
 
-        else:
-            st.warning("Impossible de détecter automatiquement les ondes P et S.")
+            else:
+                st.warning("Impossible de détecter automatiquement les ondes P et S.")
 
-        st.plotly_chart(fig_puissance_x, use_container_width=True)
+            st.plotly_chart(fig_puissance_x, use_container_width=True)
 
-    else:
-        # Traces de l’énergie et des pics
-        fig_puissance_x.add_trace(go.Scatter(x=time, y=energie_s, mode='lines', name='Énergie onde S', line=dict(color='blue')))
-        st.plotly_chart(fig_puissance_x, use_container_width=True)
+        else:
+            # Traces de l’énergie et des pics
+            fig_puissance_x.add_trace(regular_scatter(time, energie_s, mode='lines', name='Énergie onde S', line=dict(color='blue')))
+            st.plotly_chart(fig_puissance_x, use_container_width=True)
 
     
 
-if signal_choice == "Est-Ouest":
-    # Filtrage dans les bandes typiques des ondes P et S
-    fig_puissance_y = go.Figure()
-    signal_s = bandpass_filter(signal_y, f_min_s, f_max_s, fs)  # Onde S
-
-    energie_s = compute_energy_envelope(signal_s, fs)
+    if signal_choice == "Est-Ouest":
+        # Filtrage dans les bandes typiques des ondes P et S
+        fig_puissance_y = go.Figure()
+        energie_s = get_energy(signal_y, f_min_s, f_max_s, fs)  # Onde S
 
     
-    #Temps d'arrivée des ondes P et S avant verification donne par l'utilisateur
-
-    t_s_y=st.slider(
-        "Temps d'arrivée de l'onde S (en secondes)",
-        min_value=float(time[0]),
-        max_value=float(time[-1]),
-        value=(float(time[0])),
-        step=0.1,
-        key='slider_ts'
-    )
-    fig_puissance_y.add_vline(x=t_s_y, line_dash="dash", line_color="orange", annotation_text="Onde S")
-    if st.button("Verification des temps d'arrivée de l'onde S"):
-        signal_s = bandpass_filter(signal_y, 0.5, 2, fs)  # Onde S
+        #Temps d'arrivée des ondes P et S avant verification donne par l'utilisateur
+
+        t_s_y=st.slider(
+            "Temps d'arrivée de l'onde S (en secondes)",
+            min_value=float(time[0]),
+            max_value=float(time[-1]),
+            value=(float(time[0])),
+            step=0.1,
+            key='slider_ts'
+        )
+        fig_puissance_y.add_vline(x=t_s_y, line_dash="dash", line_color="orange", annotation_text="Onde S")
+        if st.button("Verification des temps d'arrivée de l'onde S"):
+            energie_s = get_energy(signal_y, 0.5, 2, fs)  # Onde S
 
-        energie_s = compute_energy_envelope(signal_s, fs)
+            # Détection de pics
+            peaks_s, _ = sp.signal.find_peaks(energie_s, height=0.05, distance=int(0.3 * fs))
 
-        # Détection de pics
-        peaks_s, _ = sp.signal.find_peaks(energie_s, height=0.05, distance=int(0.3 * fs))
+            # Traces de l’énergie et des pics
+            fig_puissance_y.add_trace(regular_scatter(time, energie_s, mode='lines', name='Énergie onde S', line=dict(color='red')))
 
-        # Traces de l’énergie et des pics
-        fig_puissance_y.add_trace(go.Scatter(x=time, y=energie_s, mode='lines', name='Énergie onde S', line=dict(color='red')))
+            if  len(peaks_s) > 0:
+                t_s_y = time[peaks_s[0]]
 
-        if  len(peaks_s) > 0:
-            t_s_y = time[peaks_s[0]]
 
+                st.success(f"🟣 Onde S détectée à t = {t_s_y:.2f} s (≈1 Hz)")
 
-            st.success(f"🟣 Onde S détectée à t = {t_s_y:.2f} s (≈1 Hz)")
+                fig_puissance_y.add_vline(x=t_s_y, line_dash="dash", line_color="purple", annotation_text="Onde S")
 
-            fig_puissance_y.add_vline(x=t_s_y, line_dash="dash", line_color="purple", annotation_text="Onde S")
 
+            else:
+                st.warning("Impossible de détecter automatiquement les ondes P et S.")
+
+            st.plotly_chart(fig_puissance_y, use_container_width=True)
 
         else:
-            st.warning("Impossible de détecter automatiquement les ondes P et S.")
+            # Traces de l’énergie et des pics
+            fig_puissance_y.add_trace(regular_scatter(time, energie_s, mode='lines', name='Énergie onde S', line=dict(color='red')))
+            st.plotly_chart(fig_puissance_y, use_container_width=True)
 
-        st.plotly_chart(fig_puissance_y, use_container_width=True)
 
-    else:
-        # Traces de l’énergie et des pics
-        fig_puissance_y.add_trace(go.Scatter(x=time, y=energie_s, mode='lines', name='Énergie onde S', line=dict(color='red')))
-        st.plotly_chart(fig_puissance_y, use_container_width=True)
+    if signal_choice == "Vertical":
+        # Filtrage dans les bandes typiques des ondes P et S
+        fig_puissance_z = go.Figure()
+        energie_p = get_energy(signal_z, f_min_p, f_max_p, fs)  # Onde P
 
+        #Temps d'arrivée des ondes P et S avant verification donne par l'utilisateur
 
-if signal_choice == "Vertical":
-    # Filtrage dans les bandes typiques des ondes P et S
-    fig_puissance_z = go.Figure()
-    signal_p = bandpass_filter(signal_z, f_min_p, f_max_p, fs)  # Onde S
+        t_p_z=st.slider(
+            "Temps d'arrivée de l'onde P (en secondes)",
+            min_value=float(time[0]),
+            max_value=float(time[-1]),
+            value=(float(time[0])),
+            step=0.1,
+            key='slider_ts'
+        )
+        fig_puissance_z.add_vline(x=t_p_z, line_dash="dash", line_color="yellow", annotation_text="Onde P")
+        if st.button("Verification des temps d'arrivée de l'onde P"):
+            energie_p = get_energy(signal_z, 8, 12, fs)  # Onde P
 
-    energie_p = compute_energy_envelope(signal_p, fs)
+            # Détection de pics
+            peaks_p, _ = sp.signal.find_peaks(energie_p, height=0.05, distance=int(0.3 * fs))
 
-    #Temps d'arrivée des ondes P et S avant verification donne par l'utilisateur
+            # Traces de l’énergie et des pics
+            fig_puissance_z.add_trace(regular_scatter(time, energie_p, mode='lines', name='Énergie onde P', line=dict(color='green')))
 
-    t_p_z=st.slider(
-        "Temps d'arrivée de l'onde P (en secondes)",
-        min_value=float(time[0]),
-        max_value=float(time[-1]),
-        value=(float(time[0])),
-        step=0.1,
-        key='slider_ts'
-    )
-    fig_puissance_z.add_vline(x=t_p_z, line_dash="dash", line_color="yellow", annotation_text="Onde P")
-    if st.button("Verification des temps d'arrivée de l'onde P"):
-        signal_p = bandpass_filter(signal_z, 8, 12, fs)  # Onde P
+            if  len(peaks_p) > 0:
+                t_p_x = time[peaks_p[0]]
 
-        energie_p = compute_energy_envelope(signal_p, fs)
 
-        # Détection de pics
-        peaks_p, _ = sp.signal.find_peaks(energie_p, height=0.05, distance=int(0.3 * fs))
+                st.success(f"🟢 Onde P détectée à t = {t_p_x:.2f} s (≈10 Hz)")
 
-        # Traces de l’énergie et des pics
-        fig_puissance_z.add_trace(go.Scatter(x=time, y=energie_p, mode='lines', name='Énergie onde P', line=dict(color='green')))
+                fig_puissance_z.add_vline(x=t_p_x, line_dash="dash", line_color="lime", annotation_text="Onde P")
 
-        if  len(peaks_p) > 0:
-            t_p_x = time[peaks_p[0]]
 
+            else:
+                st.warning("Impossible de détecter automatiquement les ondes P et S.")
 
-            st.success(f"🟢 Onde P détectée à t = {t_p_x:.2f} s (≈10 Hz)")
+            st.plotly_chart(fig_puissance_z, use_container_width=True)
 
-            fig_puissance_z.add_vline(x=t_p_x, line_dash="dash", line_color="lime", annotation_text="Onde P")
+        else:
+            # Traces de l’énergie et des pics
+            fig_puissance_z.add_trace(regular_scatter(time, energie_p, mode='lines', name='Énergie onde P', line=dict(color='green')))
+            st.plotly_chart(fig_puissance_z, use_container_width=True)
 
 
-        else:
-            st.warning("Impossible de détecter automatiquement les ondes P et S.")
+detection_ondes(signal_x, signal_y, signal_z)
 
-        st.plotly_chart(fig_puissance_z, use_container_width=True)
 
+st.subheader("Détection automatique en continu (STA/LTA)")
+st.write(
+    """
+    Sur un long enregistrement, on ne sait pas à l'avance où se trouvent les séismes.
+    Le détecteur parcourt tout le signal par blocs qui se recouvrent : il filtre les trois composantes,
+    compare l'énergie moyenne sur une fenêtre courte (STA) à celle sur une fenêtre longue (LTA),
+    et déclenche quand ce rapport dépasse un seuil. Les déclenchements vus dans deux blocs voisins sont fusionnés.
+    """
+)
+
+# Section interactive isolée : ses curseurs ne relancent que la détection
+@st.fragment
+def detection_continue(time, signal_x, signal_y, signal_z):
+    fs_signal = 1 / (time[1] - time[0])
+    col1, col2 = st.columns(2)
+    with col1:
+        sta = st.slider("Fenêtre courte STA (s)", 0.2, 5.0, 1.0, 0.1)
+        lta = st.slider("Fenêtre longue LTA (s)", 5.0, 60.0, 20.0, 1.0)
+    with col2:
+        seuil_on = st.slider("Seuil de déclenchement (STA/LTA)", 1.5, 10.0, 3.0, 0.1)
+        seuil_off = st.slider("Seuil de fin (STA/LTA)", 0.5, 3.0, 1.0, 0.1)
+
+    debuts, fins, rapports, debit = detect_continuous(
+        np.stack([signal_x, signal_y, signal_z]), fs_signal, band=(1.0, min(20.0, 0.45 * fs_signal)),
+        sta=sta, lta=lta, on=seuil_on, off=seuil_off, chunk_seconds=60.0
+    )
+
+    fig_detection = go.Figure()
+    fig_detection.add_trace(regular_scatter(time, signal_z, mode='lines', name='Z', line=dict(color='gray')))
+    for debut, fin in zip(debuts, fins):
+        fig_detection.add_vrect(x0=time[0] + debut, x1=time[0] + fin, fillcolor="orange", opacity=0.3, line_width=0)
+    fig_detection.update_layout(
+        title="Évènements détectés sur la composante verticale",
+        xaxis_title="Temps (s)",
+        yaxis_title="Amplitude",
+        template="plotly_white"
+    )
+    st.plotly_chart(fig_detection, use_container_width=True)
+
+    if len(debuts):
+        st.dataframe(pd.DataFrame({
+            "Début (s)": time[0] + debuts,
+            "Fin (s)": time[0] + fins,
+            "STA/LTA max": rapports,
+        }), hide_index=True)
     else:
-        # Traces de l’énergie et des pics
-        fig_puissance_z.add_trace(go.Scatter(x=time, y=energie_p, mode='lines', name='Énergie onde P', line=dict(color='green')))
-        st.plotly_chart(fig_puissance_z, use_container_width=True)
+        st.warning("Aucun évènement détecté avec ces paramètres.")
+    st.caption(f"Débit du détecteur : {debit / 1e6:.1f} millions d'échantillons par seconde")
+
+    # Filtrage adapté : les évènements détectés servent de gabarits, recherchés dans tout le signal
+    if len(debuts) and st.checkbox("Rechercher les évènements semblables aux évènements détectés (gabarits)"):
+        donnees = np.stack([
+            filter_signal(np.asarray(composante, dtype=np.float64), fs_signal, "bandpass",
+                          (1.0, min(20.0, 0.45 * fs_signal)), mode="iir")
+            for composante in (signal_x, signal_y, signal_z)
+        ])
+        gabarits, debuts_gabarits = cut_templates(donnees, fs_signal, debuts, before=0.5, after=4.5)
+        if not len(gabarits):
+            st.warning("Les évènements détectés sont trop près des bords pour servir de gabarits.")
+            return
+        numeros, instants, correlations, rapports_mad = match_templates(donnees, gabarits, fs_signal, threshold=8.0)
+        st.write(
+            """
+            Chaque gabarit (5 s autour d'un évènement détecté, sur les trois composantes) est corrélé avec tout
+            le signal ; la corrélation moyenne des trois composantes est retenue quand elle dépasse 8 fois son
+            écart absolu médian (MAD). Chaque gabarit se retrouve lui-même, avec une corrélation de 1.
+            """
+        )
+        st.dataframe(pd.DataFrame({
+            "Gabarit (début, s)": time[0] + debuts_gabarits[numeros],
+            "Instant (s)": time[0] + instants,
+            "Corrélation": correlations,
+            "Corrélation / MAD": rapports_mad,
+        }), hide_index=True)
+
+detection_continue(time, signal_x, signal_y, signal_z)
 
 
 st.write("""notez les temps d'arrivée des ondes P et S """)
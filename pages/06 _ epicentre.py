@@ -6,6 +6,13 @@ from streamlit_folium import st_folium
 import plotly.graph_objs as go
 import scipy as sp
 from plotly.subplots import make_subplots 
+from outils.correlation import differential_times, relative_arrivals
+from outils.figures import cached_figure, regular_scatter
+from outils.fourier import frequency_axis
+from outils.reseau import (KM_PER_DEGREE, beam_power, fk_estimate, local_coordinates, plane_wave_slowness,
+                           sliding_fk, slowness_axis, slowness_direction, steering_vectors)
+from outils.sismogrammes import get_archive, save_upload
+from outils.stockage import ensure_station, generated_station, get_waveform_store, read_station
 
 def bandpass_filter(data, lowcut, highcut, fs, order=1):
     nyq = 0.5 * fs
@@ -20,6 +27,11 @@ def compute_energy_envelope(filtered_signal, fs, window_sec=0.5):
     energy = np.convolve(np.abs(filtered_signal)**2, np.ones(window_size), mode='same')
     return energy / np.max(energy)  # normalisé
 
+# Énergie filtrée mise en cache : déplacer un curseur ne relance pas les filtres
+@st.cache_data(max_entries=32, show_spinner=False)
+def get_energy(data, lowcut, highcut, fs):
+    return compute_energy_envelope(bandpass_filter(data, lowcut, highcut, fs), fs)
+
 
 # Exemple de données de stations
 stations = pd.DataFrame({
@@ -87,23 +99,29 @@ def generate_seismic_signal(time,start_p, end_p, start_s, end_s, start_surface,
     
     return signal_x, signal_y, signal_z
 
-# Génération des signaux sismiques
-@st.cache_data
-def get_signaux():
-    time = np.linspace(0, 180, 18000)
-    signal_A = generate_seismic_signal(time, 5, 20, 68, 90, 90, 170)
-    signal_B = generate_seismic_signal(time, 5, 22, 85, 103, 95, 170)
-    signal_C = generate_seismic_signal(time, 5, 25, 90, 108, 115, 170)
-    signal_D = generate_seismic_signal(time, 5, 22, 80, 102, 108, 170)
-    signal_E = generate_seismic_signal(time, 5, 20, 60, 80, 90, 160)
-    return time, signal_A, signal_B, signal_C, signal_D, signal_E
-
-time, signal_A, signal_B, signal_C, signal_D, signal_E = get_signaux()
-signal_A_x, signal_A_y, signal_A_z = signal_A
-signal_B_x, signal_B_y, signal_B_z = signal_B
-signal_C_x, signal_C_y, signal_C_z = signal_C
-signal_D_x, signal_D_y, signal_D_z = signal_D
-signal_E_x, signal_E_y, signal_E_z = signal_E
+# Instants (début, fin) des ondes P, S et de surface à chaque station
+PARAMETRES_ONDES = {
+    'Station A': (5, 20, 68, 90, 90, 170),
+    'Station B': (5, 22, 85, 103, 95, 170),
+    'Station C': (5, 25, 90, 108, 115, 170),
+    'Station D': (5, 22, 80, 102, 108, 170),
+    'Station E': (5, 20, 60, 80, 90, 160),
+}
+DUREE, N_ECHANTILLONS = 180, 18000
+
+# Signaux d'une station, générés à sa première consultation puis relus depuis le stock
+# de formes d'onde : seule la station affichée est lue (projetée en mémoire). Le nom
+# stocké est lié au code du générateur et aux paramètres : les modifier régénère les traces.
+def get_signaux(nom):
+    store = get_waveform_store()
+    cle = generated_station("epicentre_" + nom.replace(" ", "_"), generate_seismic_signal, generate_wave,
+                            params=(PARAMETRES_ONDES[nom], DUREE, N_ECHANTILLONS))
+    ensure_station(
+        store, cle,
+        lambda: generate_seismic_signal(np.linspace(0, DUREE, N_ECHANTILLONS), *PARAMETRES_ONDES[nom]),
+        (N_ECHANTILLONS - 1) / DUREE,
+    )
+    return read_station(store, cle)
 
 st.title("Carte des stations sismiques")
 vp = 7.3  # km/s
@@ -122,71 +140,87 @@ if "distance D" not in st.session_state:
 if "distance E" not in st.session_state:
     st.session_state["distance E"] = 0.0
 
-# Carte folium
-m = folium.Map(location=[stations['lat'].mean(), stations['lon'].mean()], zoom_start=4)
-for i, row in stations.iterrows():
-    folium.Marker(
-        location=[row['lat'], row['lon']],
-        popup=row['nom'],
-        tooltip=row['nom'],
-    ).add_to(m)
-# Ajout des cercles de distance
-if st.session_state["distance A"] > 0:
-    folium.Circle(
-        location=[stations.loc[stations['nom'] == 'Station A', 'lat'].values[0],
-                  stations.loc[stations['nom'] == 'Station A', 'lon'].values[0]],
-        radius=st.session_state["distance A"] * 1000,  # Convertir km en m
-        color='blue',
-        stroke=True,
-        weight=5,
-        opacity=0.2,
+# Carte folium, dans sa propre section : un clic sur la carte ne relance pas les graphiques
+@st.fragment
+def carte_stations():
+    m = folium.Map(location=[stations['lat'].mean(), stations['lon'].mean()], zoom_start=4)
+    for i, row in stations.iterrows():
+        folium.Marker(
+            location=[row['lat'], row['lon']],
+            popup=row['nom'],
+            tooltip=row['nom'],
+        ).add_to(m)
+    # Ajout des cercles de distance
+    if st.session_state["distance A"] > 0:
+        folium.Circle(
+            location=[stations.loc[stations['nom'] == 'Station A', 'lat'].values[0],
+                      stations.loc[stations['nom'] == 'Station A', 'lon'].values[0]],
+            radius=st.session_state["distance A"] * 1000,  # Convertir km en m
+            color='blue',
+            stroke=True,
+            weight=5,
+            opacity=0.2,
         
-    ).add_to(m)
-if st.session_state["distance B"] > 0:
-    folium.Circle(
-        location=[stations.loc[stations['nom'] == 'Station B', 'lat'].values[0],
-                  stations.loc[stations['nom'] == 'Station B', 'lon'].values[0]],
-        radius=st.session_state["distance B"] * 1000,  # Convertir km en m
-        color='blue',
-        stroke=True,
-        weight=5,
-        opacity=0.2,
-    ).add_to(m)
-if st.session_state["distance C"] > 0:
-    folium.Circle(
-        location=[stations.loc[stations['nom'] == 'Station C', 'lat'].values[0],
-                  stations.loc[stations['nom'] == 'Station C', 'lon'].values[0]],
-        radius=st.session_state["distance C"] * 1000,  # Convertir km en m
-        color='blue',
-        stroke=True,
-        weight=5,
-        opacity=0.2,
-    ).add_to(m)
-if st.session_state["distance D"] > 0:
-    folium.Circle(
-        location=[stations.loc[stations['nom'] == 'Station D', 'lat'].values[0],
-                  stations.loc[stations['nom'] == 'Station D', 'lon'].values[0]],
-        radius=st.session_state["distance D"] * 1000,  # Convertir km en m
-        color='blue',
-        stroke=True,
-        weight=5,
-        opacity=0.2,
-    ).add_to(m)
-if st.session_state["distance E"] > 0:
-    folium.Circle(
-        location=[stations.loc[stations['nom'] == 'Station E', 'lat'].values[0],
-                  stations.loc[stations['nom'] == 'Station E', 'lon'].values[0]],
-        radius=st.session_state["distance E"] * 1000,  # Convertir km en m
-        color='blue',
-        stroke=True,
-        weight=5,
-        opacity=0.2,
-    ).add_to(m)
-
-
-# Affichage de la carte et récupération du clic
-st.write("Cliquez sur une station pour afficher ses signaux sismiques.")
-map_data = st_folium(m, width=700, height=400)
+        ).add_to(m)
+    if st.session_state["distance B"] > 0:
+        folium.Circle(
+            location=[stations.loc[stations['nom'] == 'Station B', 'lat'].values[0],
+                      stations.loc[stations['nom'] == 'Station B', 'lon'].values[0]],
+            radius=st.session_state["distance B"] * 1000,  # Convertir km en m
+            color='blue',
+            stroke=True,
+            weight=5,
+            opacity=0.2,
+        ).add_to(m)
+    if st.session_state["distance C"] > 0:
+        folium.Circle(
+            location=[stations.loc[stations['nom'] == 'Station C', 'lat'].values[0],
+                      stations.loc[stations['nom'] == 'Station C', 'lon'].values[0]],
+            radius=st.session_state["distance C"] * 1000,  # Convertir km en m
+            color='blue',
+            stroke=True,
+            weight=5,
+            opacity=0.2,
+        ).add_to(m)
+    if st.session_state["distance D"] > 0:
+        folium.Circle(
+            location=[stations.loc[stations['nom'] == 'Station D', 'lat'].values[0],
+                      stations.loc[stations['nom'] == 'Station D', 'lon'].values[0]],
+            radius=st.session_state["distance D"] * 1000,  # Convertir km en m
+            color='blue',
+            stroke=True,
+            weight=5,
+            opacity=0.2,
+        ).add_to(m)
+    if st.session_state["distance E"] > 0:
+        folium.Circle(
+            location=[stations.loc[stations['nom'] == 'Station E', 'lat'].values[0],
+                      stations.loc[stations['nom'] == 'Station E', 'lon'].values[0]],
+            radius=st.session_state["distance E"] * 1000,  # Convertir km en m
+            color='blue',
+            stroke=True,
+            weight=5,
+            opacity=0.2,
+        ).add_to(m)
+    # Direction d'arrivée estimée par l'analyse f-k : flèche du centre du réseau vers la source
+    if "direction" in st.session_state:
+        azimut = np.radians(st.session_state["direction"])
+        lat0, lon0 = stations['lat'].mean(), stations['lon'].mean()
+        longueur = 600 / KM_PER_DEGREE  # 600 km
+        folium.PolyLine(
+            [[lat0, lon0],
+             [lat0 + longueur * np.cos(azimut), lon0 + longueur * np.sin(azimut) / np.cos(np.radians(lat0))]],
+            color='red',
+            weight=4,
+            tooltip=f"Direction d'arrivée : {st.session_state['direction']:.0f}°",
+        ).add_to(m)
+
+    # Affichage de la carte et récupération du clic
+    st.write("Cliquez sur une station pour afficher ses signaux sismiques.")
+    map_data = st_folium(m, width=700, height=400)
+
+
+carte_stations()
 
 # Sélection de la station (par nom ou clic)
 selected_station = st.selectbox("Ou choisissez une station :", stations['nom'])
@@ -196,238 +230,447 @@ selected_station = st.selectbox("Ou choisissez une station :", stations['nom'])
 
 st.subheader(f"Signaux sismiques collectés à {selected_station}")
 
-if selected_station == 'Station A':
-    signal_x, signal_y, signal_z = signal_A_x, signal_A_y, signal_A_z
-elif selected_station == 'Station B':
-    signal_x, signal_y, signal_z = signal_B_x, signal_B_y, signal_B_z
-elif selected_station == 'Station C':
-    signal_x, signal_y, signal_z = signal_C_x, signal_C_y, signal_C_z
-elif selected_station == 'Station D':
-    signal_x, signal_y, signal_z = signal_D_x, signal_D_y, signal_D_z
-elif selected_station == 'Station E':
-    signal_x, signal_y, signal_z = signal_E_x, signal_E_y, signal_E_z
-
-fig1 = go.Figure()
-fig1.add_trace(go.Scatter(x=time, y=signal_x+signal_y+signal_z, mode='lines', name='Signal combiné',line=dict(color='purple')))
-fig1.update_layout(
-    title="Signal combiné (X + Y + Z)",
-    xaxis_title="Temps (s)",
-    yaxis_title="Amplitude",
-    template="plotly_white"
-) 
-
+# Enregistrements réels de la station (miniSEED ou SAC) à la place des signaux synthétiques :
+# les fichiers sont indexés une fois, puis seule la fenêtre choisie est décodée
+fichiers = st.file_uploader(
+    "Vous pouvez aussi charger les enregistrements de cette station (miniSEED ou SAC)",
+    type=["mseed", "miniseed", "ms", "sac"],
+    accept_multiple_files=True,
+    key=f"enregistrements {selected_station}"
+)
+archive = get_archive(tuple(save_upload(f.getvalue(), f.name) for f in fichiers)) if fichiers else None
+if archive is not None and archive.stations():
+    capteur = st.selectbox("Capteur", archive.stations())
+    debut_donnees, fin_donnees = archive.span(capteur)
+    duree = float(fin_donnees - debut_donnees)
+    debut, fin = st.slider("Fenêtre analysée (s)", 0.0, duree, (0.0, min(duree, 180.0)), step=1.0)
+    if fin - debut < 60:
+        st.warning("Choisissez une fenêtre d'au moins 60 secondes.")
+        st.stop()
+    time, signal_x, signal_y, signal_z = archive.read_station(capteur, debut_donnees + debut, debut_donnees + fin)
+    st.caption(f"{capteur} : début de la fenêtre le "
+               f"{pd.to_datetime(debut_donnees + debut, unit='s'):%Y-%m-%d %H:%M:%S} UTC")
+else:
+    if archive is not None:
+        st.warning("Aucune voie sismique reconnue dans ces fichiers : signaux synthétiques affichés.")
+    time, signal_x, signal_y, signal_z = get_signaux(selected_station)
+# Fréquence d'échantillonnage des traces affichées (synthétiques ou enregistrements envoyés)
+fs_donnees = 1 / (time[1] - time[0])
+# Les analyses du réseau (écarts entre stations, f-k) portent toujours sur les cinq stations
+# synthétiques : les enregistrements ne sont chargés que pour la station sélectionnée
+enregistrements_charges = archive is not None and bool(archive.stations())
+
+def build_fig1():
+    fig1 = go.Figure()
+    fig1.add_trace(regular_scatter(time, signal_x+signal_y+signal_z, mode='lines', name='Signal combiné',line=dict(color='purple')))
+    fig1.update_layout(
+        title="Signal combiné (X + Y + Z)",
+        xaxis_title="Temps (s)",
+        yaxis_title="Amplitude",
+        template="plotly_white"
+    )
+    return fig1
 
 # Création de la figure avec subplots liés
-fig_combined = make_subplots(
-    rows=3, cols=1,
-    subplot_titles=("Composante Nord-Sud (X)", "Composante Est-Ouest (Y)", "Composante Verticale (Z)"),
-    vertical_spacing=0.1,
-    shared_xaxes=True  
-)
+def build_fig_combined():
+    fig_combined = make_subplots(
+        rows=3, cols=1,
+        subplot_titles=("Composante Nord-Sud (X)", "Composante Est-Ouest (Y)", "Composante Verticale (Z)"),
+        vertical_spacing=0.1,
+        shared_xaxes=True  
+    )
 
-# Ajout des traces
-fig_combined.add_trace(
-    go.Scatter(x=time, y=signal_x, mode='lines', name='X', line=dict(color='blue')),
-    row=1, col=1
-)
+    # Ajout des traces
+    fig_combined.add_trace(
+        regular_scatter(time, signal_x, mode='lines', name='X', line=dict(color='blue')),
+        row=1, col=1
+    )
 
-fig_combined.add_trace(
-    go.Scatter(x=time, y=signal_y, mode='lines', name='Y', line=dict(color='red')),
-    row=2, col=1
-)
+    fig_combined.add_trace(
+        regular_scatter(time, signal_y, mode='lines', name='Y', line=dict(color='red')),
+        row=2, col=1
+    )
 
-fig_combined.add_trace(
-    go.Scatter(x=time, y=signal_z, mode='lines', name='Z', line=dict(color='lime')),
-    row=3, col=1
-)
+    fig_combined.add_trace(
+        regular_scatter(time, signal_z, mode='lines', name='Z', line=dict(color='lime')),
+        row=3, col=1
+    )
 
-# Configuration du layout
-fig_combined.update_layout(
-    height=900,
-    showlegend=False,
-    template="plotly_white",
-    xaxis=dict(matches='x2'),
-    xaxis2=dict(matches='x3')
-)
+    # Configuration du layout
+    fig_combined.update_layout(
+        height=900,
+        showlegend=False,
+        template="plotly_white",
+        xaxis=dict(matches='x2'),
+        xaxis2=dict(matches='x3')
+    )
+
+    # Configuration des axes
+    fig_combined.update_xaxes(title_text="Temps (s)", row=3, col=1)
+    fig_combined.update_yaxes(title_text="Amplitude X", row=1, col=1)
+    fig_combined.update_yaxes(title_text="Amplitude Y", row=2, col=1)
+    fig_combined.update_yaxes(title_text="Amplitude Z", row=3, col=1)
+
+    fig_combined.update_layout(
+        title="Comparaison des signaux sismiques (X, Y, Z)",
+        xaxis_title="Temps (s)",
+        yaxis_title="Amplitude",
+        template="plotly_white"
+    )
+    return fig_combined
 
-# Configuration des axes
-fig_combined.update_xaxes(title_text="Temps (s)", row=3, col=1)
-fig_combined.update_yaxes(title_text="Amplitude X", row=1, col=1)
-fig_combined.update_yaxes(title_text="Amplitude Y", row=2, col=1)
-fig_combined.update_yaxes(title_text="Amplitude Z", row=3, col=1)
-
-fig_combined.update_layout(
-    title="Comparaison des signaux sismiques (X, Y, Z)",
-    xaxis_title="Temps (s)",
-    yaxis_title="Amplitude",
-    template="plotly_white"
-)
 if st.button("Afficher les signaux sismiques"):
     st.subheader(f"Signaux sismiques de {selected_station}")
 
+    # Figures mises en cache : reconstruites seulement si les signaux ou leur axe de temps changent
+    fig1 = cached_figure("signal_combine", (time[0], time[1] - time[0], signal_x, signal_y, signal_z), build_fig1)
+    fig_combined = cached_figure("signaux_xyz", (time[0], time[1] - time[0], signal_x, signal_y, signal_z), build_fig_combined)
+
     st.plotly_chart(fig1, use_container_width=True)
 
     st.subheader("""Comparaison le temps de depart des signaux X, Y et Z""")
     st.plotly_chart(fig_combined, use_container_width=True)
 
 
-st.write(
-    """ Choisissez le signal à analyser :
-    """)
-signal_choice = st.selectbox("Sélectionnez le signal", ("Nord-Sud", "Est-Ouest", "Vertical"))
-fs=110
-
-if signal_choice == "Nord-Sud":
-    # Filtrage dans les bandes typiques des ondes P et S
-    fig_puissance_x = go.Figure()
-    signal_s = bandpass_filter(signal_x, 0.5, 2, fs)  # Onde S
+# Section interactive isolée : ses widgets ne relancent que cette section
+@st.fragment
+def detection_ondes(signal_x, signal_y, signal_z):
+    st.write(
+        """ Choisissez le signal à analyser :
+        """)
+    signal_choice = st.selectbox("Sélectionnez le signal", ("Nord-Sud", "Est-Ouest", "Vertical"))
+    fs = fs_donnees
+    # Bande de l'onde P bornée sous la fréquence de Nyquist (enregistrements à 20 Hz...)
+    f_max_p = min(12, 0.45 * fs)
 
-    energie_s = compute_energy_envelope(signal_s, fs)
+    if signal_choice == "Nord-Sud":
+        # Filtrage dans les bandes typiques des ondes P et S
+        fig_puissance_x = go.Figure()
+        energie_s = get_energy(signal_x, 0.5, 2, fs)  # Onde S
 
     
-    #Temps d'arrivée des ondes P et S avant verification donne par l'utilisateur
-
-    t_s_x=st.slider(
-        "Temps d'arrivée de l'onde S (en secondes)",
-        min_value=float(time[0]),
-        max_value=float(time[-1]),
-        value=(float(time[0])),
-        step=0.1,
-        key='slider_ts'
-    )
-    fig_puissance_x.add_vline(x=t_s_x, line_dash="dash", line_color="cyan", annotation_text="Onde S")
-    if st.button("Verification des temps d'arrivée de l'onde S"):
-        signal_s = bandpass_filter(signal_x, 0.5, 2, fs)  # Onde S
-
-        energie_s = compute_energy_envelope(signal_s, fs)
-
-        # Détection de pics
-        peaks_s, _ = sp.signal.find_peaks(energie_s, height=0.05, distance=int(0.3 * fs))
-
-        # Traces de l’énergie et des pics
-        fig_puissance_x.add_trace(go.Scatter(x=time, y=energie_s, mode='lines', name='Énergie onde S', line=dict(color='blue')))
+        #Temps d'arrivée des ondes P et S avant verification donne par l'utilisateur
+
+        t_s_x=st.slider(
+            "Temps d'arrivée de l'onde S (en secondes)",
+            min_value=float(time[0]),
+            max_value=float(time[-1]),
+            value=(float(time[0])),
+            step=0.1,
+            key='slider_ts'
+        )
+        fig_puissance_x.add_vline(x=t_s_x, line_dash="dash", line_color="cyan", annotation_text="Onde S")
+        if st.button("Verification des temps d'arrivée de l'onde S"):
+            energie_s = get_energy(signal_x, 0.5, 2, fs)  # Onde S
+
+            # Détection de pics
+            peaks_s, _ = sp.signal.find_peaks(energie_s, height=0.05, distance=int(0.3 * fs))
+
+            # Traces de l’énergie et des pics
+            fig_puissance_x.add_trace(regular_scatter(time, energie_s, mode='lines', name='Énergie onde S', line=dict(color='blue')))
         
-        if  len(peaks_s) > 0:
-            t_s_x = time[peaks_s[0]]
+            if  len(peaks_s) > 0:
+                t_s_x = time[peaks_s[0]]
 
             
-            st.success(f"🟣 Onde S détectée à t = {t_s_x:.2f} s (≈1 Hz)")
+                st.success(f"🟣 Onde S détectée à t = {t_s_x:.2f} s (≈1 Hz)")
 
-            fig_puissance_x.add_vline(x=t_s_x, line_dash="dash", line_color="purple", annotation_text="Onde S")
+                fig_puissance_x.add_vline(x=t_s_x, line_dash="dash", line_color="purple", annotation_text="Onde S")
             
 
-        else:
-            st.warning("Impossible de détecter automatiquement les ondes P et S.")
+            else:
+                st.warning("Impossible de détecter automatiquement les ondes P et S.")
 
-        st.plotly_chart(fig_puissance_x, use_container_width=True)
+            st.plotly_chart(fig_puissance_x, use_container_width=True)
 
-    else:
-        # Traces de l’énergie et des pics
-        fig_puissance_x.add_trace(go.Scatter(x=time, y=energie_s, mode='lines', name='Énergie onde S', line=dict(color='blue')))
-        st.plotly_chart(fig_puissance_x, use_container_width=True)
+        else:
+            # Traces de l’énergie et des pics
+            fig_puissance_x.add_trace(regular_scatter(time, energie_s, mode='lines', name='Énergie onde S', line=dict(color='blue')))
+            st.plotly_chart(fig_puissance_x, use_container_width=True)
 
     
 
-if signal_choice == "Est-Ouest":
-    # Filtrage dans les bandes typiques des ondes P et S
-    fig_puissance_y = go.Figure()
-    signal_s = bandpass_filter(signal_y, 0.5, 2, fs)  # Onde S
-
-    energie_s = compute_energy_envelope(signal_s, fs)
+    if signal_choice == "Est-Ouest":
+        # Filtrage dans les bandes typiques des ondes P et S
+        fig_puissance_y = go.Figure()
+        energie_s = get_energy(signal_y, 0.5, 2, fs)  # Onde S
 
     
-    #Temps d'arrivée des ondes P et S avant verification donne par l'utilisateur
-
-    t_s_y=st.slider(
-        "Temps d'arrivée de l'onde S (en secondes)",
-        min_value=float(time[0]),
-        max_value=float(time[-1]),
-        value=(float(time[0])),
-        step=0.1,
-        key='slider_ts'
-    )
-    fig_puissance_y.add_vline(x=t_s_y, line_dash="dash", line_color="orange", annotation_text="Onde S")
-    if st.button("Verification des temps d'arrivée de l'onde S"):
-        signal_s = bandpass_filter(signal_y, 0.5, 2, fs)  # Onde S
+        #Temps d'arrivée des ondes P et S avant verification donne par l'utilisateur
 
-        energie_s = compute_energy_envelope(signal_s, fs)
+        t_s_y=st.slider(
+            "Temps d'arrivée de l'onde S (en secondes)",
+            min_value=float(time[0]),
+            max_value=float(time[-1]),
+            value=(float(time[0])),
+            step=0.1,
+            key='slider_ts'
+        )
+        fig_puissance_y.add_vline(x=t_s_y, line_dash="dash", line_color="orange", annotation_text="Onde S")
+        if st.button("Verification des temps d'arrivée de l'onde S"):
+            energie_s = get_energy(signal_y, 0.5, 2, fs)  # Onde S
 
-        # Détection de pics
-        peaks_s, _ = sp.signal.find_peaks(energie_s, height=0.05, distance=int(0.3 * fs))
+            # Détection de pics
+            peaks_s, _ = sp.signal.find_peaks(energie_s, height=0.05, distance=int(0.3 * fs))
 
-        # Traces de l’énergie et des pics
-        fig_puissance_y.add_trace(go.Scatter(x=time, y=energie_s, mode='lines', name='Énergie onde S', line=dict(color='red')))
+            # Traces de l’énergie et des pics
+            fig_puissance_y.add_trace(regular_scatter(time, energie_s, mode='lines', name='Énergie onde S', line=dict(color='red')))
 
-        if  len(peaks_s) > 0:
-            t_s_y = time[peaks_s[0]]
+            if  len(peaks_s) > 0:
+                t_s_y = time[peaks_s[0]]
 
 
-            st.success(f"🟣 Onde S détectée à t = {t_s_y:.2f} s (≈1 Hz)")
+                st.success(f"🟣 Onde S détectée à t = {t_s_y:.2f} s (≈1 Hz)")
 
-            fig_puissance_y.add_vline(x=t_s_y, line_dash="dash", line_color="purple", annotation_text="Onde S")
+                fig_puissance_y.add_vline(x=t_s_y, line_dash="dash", line_color="purple", annotation_text="Onde S")
 
 
-        else:
-            st.warning("Impossible de détecter automatiquement les ondes P et S.")
+            else:
+                st.warning("Impossible de détecter automatiquement les ondes P et S.")
 
-        st.plotly_chart(fig_puissance_y, use_container_width=True)
+            st.plotly_chart(fig_puissance_y, use_container_width=True)
 
-    else:
-        # Traces de l’énergie et des pics
-        fig_puissance_y.add_trace(go.Scatter(x=time, y=energie_s, mode='lines', name='Énergie onde S', line=dict(color='red')))
-        st.plotly_chart(fig_puissance_y, use_container_width=True)
+        else:
+            # Traces de l’énergie et des pics
+            fig_puissance_y.add_trace(regular_scatter(time, energie_s, mode='lines', name='Énergie onde S', line=dict(color='red')))
+            st.plotly_chart(fig_puissance_y, use_container_width=True)
 
 
-if signal_choice == "Vertical":
-    # Filtrage dans les bandes typiques des ondes P et S
-    fig_puissance_z = go.Figure()
-    signal_p = bandpass_filter(signal_z, 8, 12, fs)  # Onde P
+    if signal_choice == "Vertical":
+        # Filtrage dans les bandes typiques des ondes P et S
+        fig_puissance_z = go.Figure()
+        energie_p = get_energy(signal_z, 8, f_max_p, fs)  # Onde P
 
-    energie_p = compute_energy_envelope(signal_p, fs)
+        #Temps d'arrivée des ondes P et S avant verification donne par l'utilisateur
 
-    #Temps d'arrivée des ondes P et S avant verification donne par l'utilisateur
+        t_p_z=st.slider(
+            "Temps d'arrivée de l'onde P (en secondes)",
+            min_value=float(time[0]),
+            max_value=float(time[-1]),
+            value=(float(time[0])),
+            step=0.1,
+            key='slider_ts'
+        )
+        fig_puissance_z.add_vline(x=t_p_z, line_dash="dash", line_color="yellow", annotation_text="Onde P")
+        if st.button("Verification des temps d'arrivée de l'onde P"):
+            energie_p = get_energy(signal_z, 8, f_max_p, fs)  # Onde P
 
-    t_p_z=st.slider(
-        "Temps d'arrivée de l'onde P (en secondes)",
-        min_value=float(time[0]),
-        max_value=float(time[-1]),
-        value=(float(time[0])),
-        step=0.1,
-        key='slider_ts'
-    )
-    fig_puissance_z.add_vline(x=t_p_z, line_dash="dash", line_color="yellow", annotation_text="Onde P")
-    if st.button("Verification des temps d'arrivée de l'onde P"):
-        signal_p = bandpass_filter(signal_z, 8, 12, fs)  # Onde P
+            # Détection de pics
+            peaks_p, _ = sp.signal.find_peaks(energie_p, height=0.05, distance=int(0.3 * fs))
 
-        energie_p = compute_energy_envelope(signal_p, fs)
+            # Traces de l’énergie et des pics
+            fig_puissance_z.add_trace(regular_scatter(time, energie_p, mode='lines', name='Énergie onde P', line=dict(color='green')))
 
-        # Détection de pics
-        peaks_p, _ = sp.signal.find_peaks(energie_p, height=0.05, distance=int(0.3 * fs))
+            if  len(peaks_p) > 0:
+                t_p_x = time[peaks_p[0]]
 
-        # Traces de l’énergie et des pics
-        fig_puissance_z.add_trace(go.Scatter(x=time, y=energie_p, mode='lines', name='Énergie onde P', line=dict(color='green')))
 
-        if  len(peaks_p) > 0:
-            t_p_x = time[peaks_p[0]]
+                st.success(f"🟢 Onde P détectée à t = {t_p_x:.2f} s (≈10 Hz)")
 
+                fig_puissance_z.add_vline(x=t_p_x, line_dash="dash", line_color="lime", annotation_text="Onde P")
 
-            st.success(f"🟢 Onde P détectée à t = {t_p_x:.2f} s (≈10 Hz)")
 
-            fig_puissance_z.add_vline(x=t_p_x, line_dash="dash", line_color="lime", annotation_text="Onde P")
+            else:
+                st.warning("Impossible de détecter automatiquement les ondes P et S.")
 
+            st.plotly_chart(fig_puissance_z, use_container_width=True)
 
         else:
-            st.warning("Impossible de détecter automatiquement les ondes P et S.")
+            # Traces de l’énergie et des pics
+            fig_puissance_z.add_trace(regular_scatter(time, energie_p, mode='lines', name='Énergie onde P', line=dict(color='green')))
+            st.plotly_chart(fig_puissance_z, use_container_width=True)
 
-        st.plotly_chart(fig_puissance_z, use_container_width=True)
 
+detection_ondes(signal_x, signal_y, signal_z)
+
+
+st.subheader("Écarts de temps d'arrivée entre stations (corrélation croisée)")
+st.write(
+    """
+    Plutôt que de pointer à la main l'arrivée d'une onde à chaque station, on peut mesurer directement
+    de combien elle arrive plus tôt ou plus tard d'une station à l'autre : on décale un signal par rapport
+    à l'autre jusqu'à ce qu'ils se ressemblent le plus (maximum de la corrélation croisée).
+    Le maximum est affiné entre deux échantillons, ce qui donne une précision bien meilleure qu'un pointé manuel.
+    """
+)
+if enregistrements_charges:
+    st.info("Les écarts ci-dessous sont mesurés sur les signaux synthétiques des cinq stations, "
+            "pas sur les enregistrements chargés plus haut.")
+
+# Écarts pour toutes les paires de stations, dans une fenêtre et une bande données
+@st.cache_data(max_entries=16, show_spinner=False)
+def ecarts_stations(onde_p, debut, fin, enveloppes):
+    fs_signal = (N_ECHANTILLONS - 1) / DUREE
+    # Onde S limitée à 1.5 Hz : les ondes de surface (vers 2 Hz) fausseraient la corrélation
+    low, high = (8, 12) if onde_p else (0.5, 1.5)
+    traces = []
+    for nom in stations['nom']:
+        time_station, sx, sy, sz = get_signaux(nom)
+        composantes = [sz] if onde_p else [sx, sy]
+        filtrees = [bandpass_filter(np.asarray(c), low, high, fs_signal) for c in composantes]
+        if enveloppes:
+            trace = sum(compute_energy_envelope(f, fs_signal) for f in filtrees)
+        else:
+            trace = filtrees[0]
+        traces.append(trace[(time_station >= debut) & (time_station <= fin)])
+    i, j, dt, cc = differential_times(np.array(traces), fs_signal, max_lag=60)
+    return i, j, dt, cc, relative_arrivals(len(traces), i, j, dt, cc)
+
+@st.fragment
+def ecarts_entre_stations():
+    onde = st.radio(
+        "Onde étudiée",
+        ("Onde S (composantes horizontales, 0.5 – 1.5 Hz)", "Onde P (composante verticale, 8 – 12 Hz)"),
+        horizontal=True
+    )
+    debut, fin = st.slider("Fenêtre de corrélation (s)", 0.0, float(DUREE), (40.0, 130.0), step=1.0)
+    enveloppes = st.checkbox(
+        "Corréler les enveloppes d'énergie (les signaux synthétiques des stations ne sont pas des copies décalées)",
+        value=True
+    )
+    if fin - debut < 10:
+        st.warning("Choisissez une fenêtre d'au moins 10 secondes.")
+        return
+    if st.button("Mesurer les écarts entre toutes les stations"):
+        i, j, dt, cc, relatifs = ecarts_stations(onde.startswith("Onde P"), debut, fin, enveloppes)
+        noms = list(stations['nom'])
+        st.dataframe(pd.DataFrame({
+            "Station i": [noms[k] for k in i],
+            "Station j": [noms[k] for k in j],
+            "Δt = t_i - t_j (s)": dt,
+            "Corrélation": cc,
+        }), hide_index=True)
+        st.write("Temps d'arrivée relatifs ajustés sur toutes les paires (moyenne nulle) :")
+        st.dataframe(pd.DataFrame({"Station": noms, "Temps relatif (s)": relatifs}), hide_index=True)
+
+ecarts_entre_stations()
+
+
+st.subheader("Direction d'arrivée des ondes (analyse f-k du réseau)")
+st.write(
+    """
+    Les cinq stations forment un réseau : une onde qui le traverse atteint chaque station avec un retard
+    qui dépend de sa direction et de sa vitesse. Pour chaque lenteur possible (inverse de la vitesse,
+    dans chaque direction), on recale les stations les unes sur les autres et on mesure la puissance du
+    signal sommé (le « faisceau ») : elle est maximale pour la direction d'arrivée et la vitesse apparente de l'onde.
+    Le calcul se fait dans le domaine des fréquences, sur les enveloppes d'énergie de l'onde S.
+
+    Les stations sont éloignées de plusieurs centaines de kilomètres : le faisceau présente plusieurs
+    maxima, et seul un maximum bien détaché est retenu. La direction et la vitesse affichées sont alors
+    celles de l'onde plane qui explique au mieux les écarts de temps d'arrivée entre toutes les paires
+    de stations (corrélation croisée ci-dessus, moindres carrés).
+    """
+)
+if enregistrements_charges:
+    st.info("La direction d'arrivée est estimée sur les signaux synthétiques des cinq stations, "
+            "pas sur les enregistrements chargés plus haut.")
+S_MAX = 1 / vs  # lenteur maximale (s/km) : aucune onde ne traverse le réseau plus lentement que l'onde S
+BANDE_FK = (0.01, 0.1)  # fréquences des enveloppes utilisées (Hz) : au moins 6 par fenêtre
+
+# Enveloppes d'énergie de l'onde S (composantes horizontales) aux cinq stations
+@st.cache_data(show_spinner=False)
+def enveloppes_reseau():
+    fs_signal = (N_ECHANTILLONS - 1) / DUREE
+    enveloppes = []
+    for nom in stations['nom']:
+        _, sx, sy, _ = get_signaux(nom)
+        enveloppes.append(sum(compute_energy_envelope(bandpass_filter(np.asarray(c), 0.5, 1.5, fs_signal), fs_signal)
+                              for c in (sx, sy)))
+    return np.array(enveloppes)
+
+# Puissance du faisceau sur la grille de lenteurs, calculée une fois par fenêtre
+@st.cache_data(max_entries=64, show_spinner=False)
+def fk_fenetre(debut, duree):
+    fs_signal = (N_ECHANTILLONS - 1) / DUREE
+    x, y = local_coordinates(stations['lat'], stations['lon'])
+    i0, n = int(debut * fs_signal), int(duree * fs_signal)
+    freqs = frequency_axis(n, 1 / fs_signal)
+    bande = np.flatnonzero((freqs >= BANDE_FK[0]) & (freqs <= BANDE_FK[1]))
+    return beam_power(enveloppes_reseau()[:, i0:i0 + n], steering_vectors(x, y, freqs[bande], S_MAX, 101), bande,
+                      S_MAX)
+
+# Onde plane ajustée aux écarts de temps d'arrivée mesurés dans la fenêtre :
+# (azimut de la source, vitesse apparente, résidu en s)
+@st.cache_data(max_entries=64, show_spinner=False)
+def onde_plane(debut, duree):
+    fs_signal = (N_ECHANTILLONS - 1) / DUREE
+    x, y = local_coordinates(stations['lat'], stations['lon'])
+    i0, n = int(debut * fs_signal), int(duree * fs_signal)
+    ouverture = np.hypot(x[:, None] - x, y[:, None] - y).max()
+    i, j, dt, cc = differential_times(enveloppes_reseau()[:, i0:i0 + n], fs_signal, max_lag=S_MAX * ouverture)
+    sx, sy, residu = plane_wave_slowness(x, y, i, j, dt, cc)
+    return (*slowness_direction(sx, sy), residu)
+
+# Direction d'arrivée au fil du temps (fenêtres glissantes)
+@st.cache_data(max_entries=8, show_spinner=False)
+def fk_glissant(duree):
+    x, y = local_coordinates(stations['lat'], stations['lon'])
+    return sliding_fk(enveloppes_reseau(), (N_ECHANTILLONS - 1) / DUREE, x, y, BANDE_FK, duree, duree / 8,
+                      S_MAX, 101)
+
+# Section interactive isolée : déplacer la fenêtre ne relance que l'analyse f-k
+@st.fragment
+def direction_arrivee():
+    duree = st.select_slider("Longueur de la fenêtre d'analyse (s)", options=[60, 90, 120], value=120)
+    debut = st.slider("Début de la fenêtre (s)", 0.0, float(DUREE - duree), 30.0, step=5.0)
+    puissance = fk_fenetre(debut, duree)
+    azimut, vitesse, relative = fk_estimate(puissance, len(stations), S_MAX)
+    residu = np.nan
+    if np.isfinite(azimut):
+        azimut, vitesse, residu = onde_plane(debut, duree)
+        if vitesse < vs:
+            azimut = vitesse = np.nan
+
+    col1, col2, col3, col4 = st.columns(4)
+    if np.isfinite(azimut):
+        col1.metric("Direction de la source", f"{azimut:.0f}° (depuis le nord)")
+        col2.metric("Vitesse apparente", f"{vitesse:.1f} km/s")
+        col4.metric("Écart à l'onde plane", f"{residu:.1f} s")
     else:
-        # Traces de l’énergie et des pics
-        fig_puissance_z.add_trace(go.Scatter(x=time, y=energie_p, mode='lines', name='Énergie onde P', line=dict(color='green')))
-        st.plotly_chart(fig_puissance_z, use_container_width=True)
+        col1.metric("Direction de la source", "pas de direction")
+        col2.metric("Vitesse apparente", "–")
+        col4.metric("Écart à l'onde plane", "–")
+    col3.metric("Puissance relative", f"{relative:.2f}")
+    if not np.isfinite(azimut):
+        st.warning("Aucune onde plane ne se détache dans cette fenêtre : le faisceau est trop plat, ou les "
+                   "écarts mesurés demandent une onde plus lente que l'onde S. Essayez une fenêtre plus longue.")
+
+    axe = slowness_axis(S_MAX, puissance.shape[0])
+    fig_fk = go.Figure(go.Heatmap(x=axe, y=axe, z=puissance, colorscale="Viridis", colorbar=dict(title="Puissance")))
+    fig_fk.update_layout(
+        title="Puissance du faisceau selon la lenteur",
+        xaxis_title="Lenteur vers l'est (s/km)",
+        yaxis_title="Lenteur vers le nord (s/km)",
+        template="plotly_white",
+        width=550, height=500
+    )
+    fig_fk.update_yaxes(scaleanchor="x")
+
+    centres, azimuts, _, puissances = fk_glissant(duree)
+    fig_temps = go.Figure(go.Scatter(
+        x=centres, y=azimuts, mode='markers',
+        marker=dict(color=puissances, colorscale="Viridis", size=10, showscale=False)
+    ))
+    fig_temps.add_vrect(x0=debut, x1=debut + duree, fillcolor="orange", opacity=0.2, line_width=0)
+    fig_temps.update_layout(
+        title="Direction de la source au fil du temps (fenêtres glissantes)",
+        xaxis_title="Temps (s)",
+        yaxis_title="Direction (°)",
+        yaxis_range=[0, 360],
+        template="plotly_white"
+    )
 
+    col1, col2 = st.columns(2)
+    with col1:
+        st.plotly_chart(fig_fk, use_container_width=True)
+    with col2:
+        st.plotly_chart(fig_temps, use_container_width=True)
 
+    if np.isfinite(azimut) and st.button("Afficher cette direction sur la carte"):
+        st.session_state["direction"] = azimut
+        st.rerun(scope="app")
 
+direction_arrivee()
 
 
 # Sélection interactive de tp et ts
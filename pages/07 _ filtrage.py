@@ -1,6 +1,14 @@
+import io
+
 import numpy as np
+import soundfile as sf
 import streamlit as st
 import plotly.graph_objects as go
+from outils.spectre import estimate_peaks, peak_traces
+from outils.figures import regular_scatter
+from outils.fourier import frequency_axis
+from outils.filtrage import filter_audio_file, filter_signal, frequency_response
+from outils.audio import audio_artifact, audio_key
 
 st.title("Atelier : Filtrage fréquentiel d'un signal")
 
@@ -25,7 +33,7 @@ for A, f in zip(amplitudes, frequences):
 # Affichage du signal dans le temps
 st.subheader("Signal dans le temps")
 fig_filtre = go.Figure()
-fig_filtre.add_trace(go.Scatter(x=t, y=signal, mode='lines', name='Signal original'))
+fig_filtre.add_trace(regular_scatter(t, signal, mode='lines', name='Signal original'))
 
 fig_filtre.update_layout(
     title="Signal ",
@@ -37,38 +45,17 @@ st.plotly_chart(fig_filtre, use_container_width=True)
 
 st.header("2. Spectre du signal")
 N = len(t)
-freqs_fft = np.fft.fftfreq(N, d=(t[1]-t[0]))
-spectre = np.abs(np.fft.fft(signal)) * 2 / N
-mask = freqs_fft >= 0
+freqs_fft = frequency_axis(N, t[1]-t[0])
 
-peaks_fft = (np.abs(spectre) > 0.1)  # Seuil arbitraire
+# Pics estimés à une fraction de case près
+freqs_pics, amps_pics, _ = estimate_peaks(signal, t[1]-t[0], height=0.1)  # Seuil arbitraire
 
 fig_fft = go.Figure()
 fig_fft.add_trace(go.Scatter(x=freqs_fft, y=np.zeros_like(freqs_fft),  
                          line=dict(color='white')))
 
 # Marquage des pics
-fig_fft.add_trace(go.Scatter(x=freqs_fft[peaks_fft], y=spectre[peaks_fft],
-                        mode='markers',
-                        marker=dict(color='red', size=4)))
-
-for freq, amp in zip(freqs_fft[peaks_fft], spectre[peaks_fft]):
-    fig_fft.add_shape(
-        type="line",
-        x0=freq, y0=0,  # Starts at x-axis
-        x1=freq, y1=amp,  # Ends at peak amplitude
-        line=dict(color="red", width=1.5),
-        opacity=0.8
-    )
-    # Ajouter des annotations pour les pics
-    fig_fft.add_annotation(
-        x=freq,
-        y=amp,
-        text=f"{freq:.1f} Hz",
-        showarrow=False,
-        yshift=10,
-        font=dict(size=10)
-    )
+fig_fft.add_traces(peak_traces(freqs_pics, amps_pics))
 
 # Mise en forme
 fig_fft.update_layout(title='Spectre ',
@@ -79,33 +66,47 @@ fig_fft.update_layout(title='Spectre ',
 
 st.plotly_chart(fig_fft, use_container_width=True)
 
-st.header("3. Filtrage fréquentiel (filtre parfait)")
+st.header("3. Filtrage fréquentiel")
 
 filtre_type = st.radio(
     "Choisissez un type de filtre à appliquer :",
     ("Passe-bas", "Passe-bande", "Passe-haut")
 )
+TYPES_FILTRE = {"Passe-bas": "lowpass", "Passe-bande": "bandpass", "Passe-haut": "highpass"}
+
+filtre_mode = st.radio(
+    "Choisissez la réalisation du filtre :",
+    ("Filtre parfait (masque FFT)", "Filtre RIF (fenêtre de Hamming)", "Filtre de Butterworth (RII)"),
+    horizontal=True
+)
+MODES_FILTRE = {
+    "Filtre parfait (masque FFT)": "ideal",
+    "Filtre RIF (fenêtre de Hamming)": "fir",
+    "Filtre de Butterworth (RII)": "iir",
+}
+mode = MODES_FILTRE[filtre_mode]
+numtaps, order = 1001, 4
+if mode == "fir":
+    numtaps = st.slider("Nombre de coefficients du filtre RIF", 51, 3999, 1001, step=50)
+elif mode == "iir":
+    order = st.slider("Ordre du filtre de Butterworth", 1, 10, 4)
 
 if filtre_type == "Passe-bas":
     fc = st.slider("Fréquence de coupure (Hz)", min_value=min(frequences), max_value=max(frequences), value=min(frequences), step=0.1)
-    mask_filtre = np.abs(freqs_fft) <= fc
+    coupures = (fc,)
 elif filtre_type == "Passe-haut":
     fc = st.slider("Fréquence de coupure (Hz)", min_value=min(frequences), max_value=max(frequences), value=max(frequences), step=0.1)
-    mask_filtre = np.abs(freqs_fft) >= fc
+    coupures = (fc,)
 else:  # Passe-bande
     f_low = st.slider("Borne basse (Hz)", min_value=min(frequences), max_value=max(frequences)-0.1, value=min(frequences), step=0.1)
     f_high = st.slider("Borne haute (Hz)", min_value=f_low+0.1, max_value=max(frequences), value=max(frequences), step=0.1)
-    mask_filtre = (np.abs(freqs_fft) >= f_low) & (np.abs(freqs_fft) <= f_high)
+    coupures = (f_low, f_high)
 
-fft_signal = np.fft.fft(signal)
-fft_filtre = np.zeros_like(fft_signal)
-fft_filtre[mask_filtre] = fft_signal[mask_filtre]
-signal_filtre = np.fft.ifft(fft_filtre).real
+fs_signal = 1 / (t[1] - t[0])
+signal_filtre = filter_signal(signal, fs_signal, TYPES_FILTRE[filtre_type], coupures, mode, numtaps, order)
 
-# Spectre du signal filtré
-spectre_filtre = np.abs(fft_filtre) * 2 / N
-# Détection des pics dans le spectre
-peaks = (np.abs(spectre_filtre) > 0.1)  
+# Détection des pics dans le spectre filtré
+freqs_pics_filtre, amps_pics_filtre, _ = estimate_peaks(signal_filtre, t[1]-t[0], height=0.1)
 
 st.subheader("Spectre du signal filtré")
 fig_fft_filtre = go.Figure()
@@ -135,27 +136,14 @@ elif filtre_type == "Passe-bande":
 fig_fft_filtre.add_trace(go.Scatter(x=freqs_fft, y=np.zeros_like(freqs_fft),  
                          line=dict(color='white')))
 
+# Gain du filtre choisi (le filtre parfait vaut 1 dans la bande et 0 ailleurs)
+if mode != "ideal":
+    freqs_gain, gain = frequency_response(fs_signal, TYPES_FILTRE[filtre_type], coupures, mode, numtaps, order)
+    fig_fft_filtre.add_trace(regular_scatter(freqs_gain, gain, mode='lines', name='Gain du filtre',
+                                             line=dict(color='green', dash='dot')))
+
 # Marquage des pics
-fig_fft_filtre.add_trace(go.Scatter(x=freqs_fft[peaks], y=spectre_filtre[peaks],
-                        mode='markers',
-                        marker=dict(color='red', size=4)))
-
-for freq, amp in zip(freqs_fft[peaks], spectre_filtre[peaks]):
-    fig_fft_filtre.add_shape(
-        type="line",
-        x0=freq, y0=0,  # Starts at x-axis
-        x1=freq, y1=amp,  # Ends at peak amplitude
-        line=dict(color="red", width=1.5),
-        opacity=0.8
-    )
-    fig_fft_filtre.add_annotation(
-        x=freq,
-        y=amp,
-        text=f"{freq:.1f} Hz",
-        showarrow=False,
-        yshift=10,
-        font=dict(size=10)
-    )
+fig_fft_filtre.add_traces(peak_traces(freqs_pics_filtre, amps_pics_filtre))
 
 # Mise en forme
 fig_fft_filtre.update_layout(title='Spectre ',
@@ -169,10 +157,10 @@ st.plotly_chart(fig_fft_filtre, use_container_width=True)
 # Affichage du signal filtré
 st.subheader("Signal dans le temps après filtrage")
 fig_filtre = go.Figure()
-fig_filtre.add_trace(go.Scatter(x=t, y=signal, mode='lines', name='Signal original', opacity=0.4))
-fig_filtre.add_trace(go.Scatter(x=t, y=signal_filtre, mode='lines', name='Signal filtré', line=dict(color='green')))
+fig_filtre.add_trace(regular_scatter(t, signal, mode='lines', name='Signal original', opacity=0.4))
+fig_filtre.add_trace(regular_scatter(t, signal_filtre, mode='lines', name='Signal filtré', line=dict(color='green')))
 fig_filtre.update_layout(
-    title="Signal après filtrage parfait",
+    title="Signal après filtrage",
     xaxis_title="Temps (s)",
     yaxis_title="Amplitude",
     template="plotly_white"
@@ -185,3 +173,31 @@ st.write(
     Observez le spectre du signal filtré pour voir le pic de fréquence correspondant !
     """
 )
+
+st.header("4. Filtrer un long enregistrement")
+st.write(
+    """
+    Le même filtre peut s'appliquer à un enregistrement de plusieurs minutes : il est lu,
+    filtré et réécrit morceau par morceau, sans jamais être chargé entièrement en mémoire.
+    """
+)
+enregistrement = st.file_uploader("Importe un enregistrement (wav, flac, ogg)", type=["wav", "flac", "ogg"], key="filtrage_audio")
+if enregistrement is not None:
+    donnees = enregistrement.getvalue()
+    infos = sf.info(io.BytesIO(donnees))
+    nyquist = infos.samplerate / 2
+    if filtre_type == "Passe-bande":
+        coupures_audio = st.slider("Bande conservée (Hz)", 20.0, nyquist - 1, (300.0, min(3000.0, nyquist - 1)), step=10.0)
+    else:
+        coupures_audio = (st.slider("Fréquence de coupure (Hz)", 20.0, nyquist - 1, min(1000.0, nyquist - 1), step=10.0, key="fc_audio"),)
+    st.audio(donnees)
+    if st.button("Filtrer l'enregistrement"):
+        progression = st.progress(0.0, text="Filtrage en cours...")
+        nom = f"filtre_{mode}_{TYPES_FILTRE[filtre_type]}_{coupures_audio}_{numtaps}_{order}"
+        wav_filtre = audio_artifact(audio_key(donnees), nom, lambda: filter_audio_file(
+            donnees, TYPES_FILTRE[filtre_type], coupures_audio, mode, numtaps, order,
+            on_progress=lambda p: progression.progress(p, text="Filtrage en cours...")
+        ))
+        progression.empty()
+        st.write("Enregistrement filtré :")
+        st.audio(wav_filtre, format="audio/wav")
@@ -0,0 +1,35 @@
+import io
+
+import numpy as np
+import soundfile as sf
+
+from outils.audio import AudioCache, _pcm16_wav
+
+
+# WAV dont le signal finit par du silence : ses derniers octets sont nuls
+def _wav_ending_in_zeros():
+    y = np.concatenate([np.sin(np.linspace(0, 20 * np.pi, 500)), np.zeros(500)])
+    return _pcm16_wav(y, 8000, normalize=True)
+
+
+def test_bytes_round_trip_keeps_trailing_zeros(tmp_path):
+    wav = _wav_ending_in_zeros()
+    assert wav.endswith(b"\x00" * 100)
+    AudioCache(directory=str(tmp_path)).get_or_compute("cle", "wav", lambda: wav)
+
+    # Nouveau cache sur le même dossier : la valeur est relue depuis le disque
+    reloaded = AudioCache(directory=str(tmp_path)).get("cle", "wav")
+    assert isinstance(reloaded, bytes)
+    assert reloaded == wav
+    assert sf.info(io.BytesIO(reloaded)).frames == 1000
+
+
+def test_tuple_round_trip_mixes_bytes_and_arrays(tmp_path):
+    wav = _wav_ending_in_zeros()
+    value = (np.arange(5.0), wav, 44100)
+    AudioCache(directory=str(tmp_path)).get_or_compute("cle", "mixte", lambda: value)
+
+    f, data, samplerate = AudioCache(directory=str(tmp_path)).get("cle", "mixte")
+    np.testing.assert_array_equal(f, value[0])
+    assert data == wav
+    assert samplerate == 44100
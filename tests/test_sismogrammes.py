@@ -0,0 +1,113 @@
+import os
+import struct
+
+import numpy as np
+
+from outils import sismogrammes
+from outils.sismogrammes import WaveformArchive, decode_steim, save_upload
+
+T0 = 1302180000.0  # 2011-04-07 12:40:00 UTC
+FS = 100
+RECORD_LENGTH = 512
+
+
+# Données Steim d'un enregistrement (previous : dernier échantillon du précédent) n'utilisant que le cas le plus compact de chaque niveau :
+# Steim 1, quatre différences de 8 bits par mot ; Steim 2, sept différences de 4 bits par mot
+def _steim_data(samples, previous, level):
+    diffs = np.diff(np.concatenate([[previous], samples]))
+    bits, count, nibble, dnib = (8, 4, 1, 0) if level == 1 else (4, 7, 3, 2)
+    assert len(diffs) % count == 0 and np.all(np.abs(diffs) < 1 << (bits - 1))
+    words = []
+    for chunk in diffs.reshape(-1, count):
+        word = 0
+        for d in chunk:
+            word = word << bits | int(d) & ((1 << bits) - 1)
+        words.append(word | dnib << 30)
+
+    frames = []
+    for i in range((RECORD_LENGTH - 64) // 64):
+        first = 3 if i == 0 else 1
+        data = words[:16 - first]
+        words = words[16 - first:]
+        w = [0] * 16
+        if i == 0:
+            w[1], w[2] = int(samples[0]) & 0xFFFFFFFF, int(samples[-1]) & 0xFFFFFFFF
+        nibbles = 0
+        for k in range(16):
+            used = first <= k < first + len(data)
+            nibbles = nibbles << 2 | (nibble if used else 0)
+            if used:
+                w[k] = data[k - first]
+        w[0] = nibbles
+        frames.append(struct.pack(">16I", *w))
+    assert not words
+    return b"".join(frames)
+
+
+# Enregistrement miniSEED (en-tête fixe, blockette 1000, données Steim) de la voie XX.TEST..HHZ
+def _record(sequence, start, samples, previous, level):
+    seconds, fraction = divmod(round((start - T0) * 10000), 10000)
+    header = b"%06dD " % sequence + b"TEST " + b"  " + b"HHZ" + b"XX"
+    header += struct.pack(">HHBBBBH", 2011, 97, 12, 40 + seconds // 60, seconds % 60, 0, fraction)
+    header += struct.pack(">Hhh", len(samples), FS, 1)
+    header += struct.pack(">BBBBiHH", 0, 0, 0, 1, 0, 64, 48)
+    header += struct.pack(">HHBBBB", 1000, 0, 10 if level == 1 else 11, 1, 9, 0)
+    return header.ljust(64, b"\0") + _steim_data(samples, previous, level)
+
+
+def _signal(n, level):
+    rng = np.random.default_rng(level)
+    limit = 100 if level == 1 else 7
+    return 1000 + np.cumsum(rng.integers(-limit, limit + 1, n))
+
+
+def _write(path, samples, per_record, level):
+    with open(path, "wb") as f:
+        previous = samples[0]
+        for i in range(0, len(samples), per_record):
+            block = samples[i:i + per_record]
+            f.write(_record(i // per_record + 1, T0 + i / FS, block, previous, level))
+            previous = block[-1]
+
+
+def test_decode_steim1_record():
+    samples = _signal(100, 1)
+    data = _steim_data(samples, samples[0], 1)
+    np.testing.assert_array_equal(decode_steim(data, len(samples), 1), samples)
+
+
+def test_decode_steim2_record():
+    samples = _signal(280, 2)
+    data = _steim_data(samples, samples[0], 2)
+    np.testing.assert_array_equal(decode_steim(data, len(samples), 2), samples)
+
+
+def test_windowed_read_across_records(tmp_path):
+    for level, per_record in ((1, 100), (2, 280)):
+        samples = _signal(3 * per_record, level)
+        path = tmp_path / f"steim{level}.mseed"
+        _write(path, samples, per_record, level)
+
+        archive = WaveformArchive([str(path)], cache_dir=str(tmp_path / "cache"))
+        assert archive.channels() == ["XX.TEST..HHZ"]
+        np.testing.assert_allclose(archive.span("XX.TEST..HHZ"), (T0, T0 + len(samples) / FS), rtol=0, atol=1e-6)
+
+        # Fenêtre à cheval sur les trois enregistrements, bornes entre deux échantillons
+        t0, fs, data = archive.read("XX.TEST..HHZ", T0 + 0.505, T0 + 2.5 * per_record / FS)
+        first = 51
+        assert fs == FS
+        assert abs(t0 - (T0 + first / FS)) < 1e-6
+        np.testing.assert_array_equal(data, samples[first:first + len(data)])
+        assert first + len(data) == int(2.5 * per_record)
+
+
+def test_save_upload_evicts_least_recently_used(tmp_path, monkeypatch):
+    monkeypatch.setattr(sismogrammes, "UPLOAD_DIR", str(tmp_path / "televersements"))
+    first = save_upload(b"a" * 600, "a.mseed", max_bytes=1000)
+    second = save_upload(b"b" * 300, "b.mseed", max_bytes=1000)
+    save_upload(b"a" * 600, "a.mseed", max_bytes=1000)  # réutilisé : devient le plus récent
+    third = save_upload(b"c" * 300, "c.mseed", max_bytes=1000)
+
+    assert open(first, "rb").read() == b"a" * 600
+    assert open(third, "rb").read() == b"c" * 300
+    assert not os.path.exists(second)